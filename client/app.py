@@ -6,7 +6,8 @@ import base64
 import os
 from dotenv import load_dotenv
 from datetime import datetime
-import time
+import json
+import uuid
 
 # ---------------------------
 # Load environment variables
@@ -148,14 +149,42 @@ if 'analysis_results' not in st.session_state:
     st.session_state.analysis_results = None
 if 'output_image_data' not in st.session_state:
     st.session_state.output_image_data = None
+if 'client_id' not in st.session_state:
+    # One scheduling tenant per browser session on the server
+    st.session_state.client_id = f"streamlit-{uuid.uuid4().hex[:12]}"
 
 # Configuration in sidebar (collapsed by default on mobile)
 with st.sidebar:
     st.header("⚙️ Settings")
     api_url = st.text_input("API URL", value=API_BASE_URL)
 
-ANALYTICS_ENDPOINT = f"{api_url}/api/analytics/analyze"
-OUTPUT_IMAGE_ENDPOINT = f"{api_url}/api/analytics/output-image"
+ANALYTICS_ENDPOINT = f"{api_url}/api/analytics/analyze/stream"
+ARTIFACT_IMAGE_ENDPOINT = f"{api_url}/api/analytics/artifacts/{{artifact_id}}/image"
+
+# Progress shown for each server-sent analysis stage
+STAGES = {
+    "queued": (5, "⏳ Waiting for a free analyzer..."),
+    "decoded": (15, "🖼️ Image decoded"),
+    "cached": (80, "⚡ Found a previous analysis of this photo"),
+    "detection": (None, "📦 Detected {boxes} products"),
+    "ocr": (None, "🔤 Read {words} text elements"),
+    "matched": (90, "🔍 Matched {found} facings"),
+}
+
+def iter_sse(response):
+    """Yield (event, data) pairs from a text/event-stream response"""
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
 
 # ---------------------------
 # Logo Display
@@ -255,6 +284,7 @@ if st.session_state.current_image:
     # Store info
     with st.expander("📍 Store Information (Optional)"):
         store_name = st.text_input("Store Name", value="Reliance Fresh, Indore")
+        store_code = st.text_input("Store Code", value="", help="Registered store id or store code; enables planogram checks")
         col3, col4 = st.columns(2)
         with col3:
             analysis_date = st.date_input("Date", value=datetime.now().date())
@@ -278,49 +308,67 @@ if st.session_state.current_image:
             status_text = st.empty()
             
             try:
-                # Simulate progress steps
-                for i in range(20):
-                    progress_bar.progress((i + 1) * 5)
-                    status_text.text("🔄 Processing image...")
-                    time.sleep(0.05)
-                
                 # Prepare API call
                 files = {"file": (st.session_state.current_image.name, st.session_state.current_image.getvalue(), st.session_state.current_image.type)}
                 data = {
                     "expected": expected_count,
-                    "search_text": search_text
+                    "search_text": search_text,
+                    "user_id": st.session_state.client_id  # scheduling lane on the server
                 }
+                if store_code.strip():
+                    data["store_id"] = store_code.strip()
                 
                 status_text.text("📡 Sending to server...")
                 
-                # Make API call
-                response = requests.post(
+                # Stream stage events while the server works; (connect, read) timeouts
+                with requests.post(
                     ANALYTICS_ENDPOINT,
                     files=files,
                     data=data,
-                    timeout=60
-                )
-                
-                if response.status_code == 200:
-                    results = response.json()
-                    st.session_state.analysis_results = results
-                    
-                    # Try to fetch processed image
-                    try:
-                        img_response = requests.get(OUTPUT_IMAGE_ENDPOINT, timeout=30)
-                        if img_response.status_code == 200:
-                            st.session_state.output_image_data = img_response.content
-                    except Exception as img_error:
-                        st.warning(f"Could not fetch processed image: {str(img_error)}")
-                    
-                    st.session_state.analysis_complete = True
-                    progress_bar.progress(100)
-                    status_text.text("✅ Analysis complete!")
-                    time.sleep(1)  # Brief pause to show completion
-                    
-                else:
-                    st.error(f"❌ Analysis failed: {response.status_code}")
-                    st.error(f"Response: {response.text}")
+                    stream=True,
+                    timeout=(10, 60)
+                ) as response:
+                    if response.status_code != 200:
+                        st.error(f"❌ Analysis failed: {response.status_code}")
+                        st.error(f"Response: {response.text}")
+                    else:
+                        results = None
+                        progress = 0
+                        for event, payload in iter_sse(response):
+                            if event == "result":
+                                results = payload
+                                break
+                            if event == "error":
+                                st.error(f"❌ Analysis failed: {payload.get('status_code')}")
+                                st.error(f"Response: {payload.get('detail')}")
+                                break
+                            if event in STAGES:
+                                # Detection and OCR finish in either order; each adds to the bar
+                                step, message = STAGES[event]
+                                progress = step if step is not None else progress + 30
+                                progress_bar.progress(min(progress, 95))
+                                status_text.text(message.format(**payload))
+                        
+                        if results is not None:
+                            st.session_state.analysis_results = results
+                            
+                            # Try to fetch this analysis' processed image
+                            try:
+                                artifact_id = results.get("artifact_id")
+                                if artifact_id:
+                                    img_response = requests.get(
+                                        ARTIFACT_IMAGE_ENDPOINT.format(artifact_id=artifact_id),
+                                        params={"width": 1280},
+                                        timeout=30
+                                    )
+                                    if img_response.status_code == 200:
+                                        st.session_state.output_image_data = img_response.content
+                            except Exception as img_error:
+                                st.warning(f"Could not fetch processed image: {str(img_error)}")
+                            
+                            st.session_state.analysis_complete = True
+                            progress_bar.progress(100)
+                            status_text.text("✅ Analysis complete!")
                     
             except requests.exceptions.ConnectionError:
                 st.error("❌ Cannot connect to the API server. Please check if it's running.")
@@ -1,211 +1,272 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-from ultralytics import YOLO
-import boto3
-from PIL import Image
-import numpy as np
-import io
-import os
-from fuzzywuzzy import fuzz
-import re
-import base64
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from typing import Any, Dict, List, Optional
+from datetime import date
+import asyncio
+import json
+from config import settings
+from ml.inference import inference_pool
+from ml.batching import yolo_batcher
+from ml.ocr import OCRError
+from schemas.analysis import SKUResponse, parse_targets
+from services.analysis import analyze
+from services.artifacts import FORMATS, artifact_store, render_annotated
+from services.bulk import multipart_sources, open_zip, stream_results, zip_sources
+from services.near_duplicates import near_duplicates
+from services.planogram import planogram_cache
+from services.pool import PoolBusyError
+from services.geo import store_locator
+from services.jobs import job_queue
+from services.reaper import image_reaper
+from services.result_cache import result_cache
+from services.rollups import day_range, leaderboard, normalize_brand, trend
+from services.scheduler import INTERACTIVE, scheduler
+from services.write_batcher import image_writer
 
 # ---------------------------
 # Router instead of app
 # ---------------------------
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 
-# Get the current file's directory and construct the model path
-current_dir = os.path.dirname(os.path.abspath(__file__))
-model_path = os.path.join(current_dir, "..", "ml", "models", "best.pt")
-
-# Init models - LAZY LOADING
-yolo_model = None
-
-# AWS Textract client - will be initialized lazily
-textract_client = None
-
-def get_yolo_model():
-    global yolo_model
-    if yolo_model is None:
-        yolo_model = YOLO(model_path)
-    return yolo_model
-
-def get_textract_client():
-    global textract_client
-    if textract_client is None:
-        # Initialize AWS Textract client
-        # AWS credentials should be set via environment variables:
-        # AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY
-        textract_client = boto3.client(
-            'textract',
-            region_name='us-east-1',  # Change this to your preferred region
-            aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
-            aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY')
-        )
-    return textract_client
-
-def clean_text(text):
-    """Clean and preprocess text for better matching"""
-    # Remove special characters, extra spaces, and normalize
-    text = re.sub(r'[^\w\s-]', '', text)
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip().upper()
-
-def fuzzy_match_text(search_text, detected_text, threshold=60):
-    """
-    Advanced fuzzy matching with multiple methods
-    Returns (is_match, best_score, method_used)
-    """
-    search_clean = clean_text(search_text)
-    detected_clean = clean_text(detected_text)
-
-    # Method 1: Basic ratio
-    ratio_score = fuzz.ratio(search_clean, detected_clean)
-
-    # Method 2: Partial ratio (good for substrings)
-    partial_score = fuzz.partial_ratio(search_clean, detected_clean)
-
-    # Method 3: Token sort ratio (ignores word order)
-    token_sort_score = fuzz.token_sort_ratio(search_clean, detected_clean)
+@router.post("/analyze", response_model=SKUResponse)
+async def analyze_sku(
+    file: UploadFile = File(...),
+    expected: Optional[int] = Form(default=None),
+    search_text: str = Form(default="VI-JOHN"),
+    targets: Optional[str] = Form(default=None),
+    sliced: bool = Form(default=False),
+    tile_size: int = Form(default=settings.TILE_SIZE, ge=128, le=4096),
+    tile_overlap: float = Form(default=settings.TILE_OVERLAP, ge=0.0, lt=0.9),
+    store_id: Optional[str] = Form(default=None),
+    user_id: Optional[str] = Form(default=None)
+):
+    try:
+        target_specs = parse_targets(targets, expected, search_text)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    contents = await file.read()
 
-    # Method 4: Token set ratio (ignores duplicates and order)
-    token_set_score = fuzz.token_set_ratio(search_clean, detected_clean)
+    try:
+        # Interactive requests are served ahead of queued bulk jobs
+        async with scheduler.slot(store_id, user_id, INTERACTIVE):
+            response, _ = await analyze(
+                contents, target_specs, sliced, tile_size, tile_overlap, store_id=store_id
+            )
+    except PoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except ValueError as e:
+        # Not an image (raised per request, so batched neighbours are unaffected)
+        raise HTTPException(status_code=400, detail=str(e))
+    except OCRError as e:
+        print(f"Error with OCR: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # The annotated image is drawn only if the client fetches it
+    response.artifact_id = artifact_store.create(
+        contents, [box.model_dump() for box in response.detections]
+    )
+    return response
 
-    # Get the best score
-    scores = {
-        'ratio': ratio_score,
-        'partial': partial_score,
-        'token_sort': token_sort_score,
-        'token_set': token_set_score
-    }
+def sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
-    best_method = max(scores, key=scores.get)
-    best_score = scores[best_method]
+@router.post("/analyze/stream")
+async def analyze_sku_stream(
+    file: UploadFile = File(...),
+    expected: Optional[int] = Form(default=None),
+    search_text: str = Form(default="VI-JOHN"),
+    targets: Optional[str] = Form(default=None),
+    sliced: bool = Form(default=False),
+    tile_size: int = Form(default=settings.TILE_SIZE, ge=128, le=4096),
+    tile_overlap: float = Form(default=settings.TILE_OVERLAP, ge=0.0, lt=0.9),
+    store_id: Optional[str] = Form(default=None),
+    user_id: Optional[str] = Form(default=None)
+):
+    """
+    Same analysis as /analyze, reported as Server-Sent Events while it runs:
+    queued, decoded, detection (box count), ocr (word count), matched, and
+    finally `result` with the full SKUResponse, or `error`.
+    """
+    try:
+        target_specs = parse_targets(targets, expected, search_text)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    contents = await file.read()
 
-    return best_score >= threshold, best_score, best_method
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def run():
+        try:
+            events.put_nowait(("queued", {}))
+            async with scheduler.slot(store_id, user_id, INTERACTIVE):
+                response, _ = await analyze(
+                    contents, target_specs, sliced, tile_size, tile_overlap,
+                    on_event=lambda stage, data: events.put_nowait((stage, data)),
+                    store_id=store_id
+                )
+            response.artifact_id = artifact_store.create(
+                contents, [box.model_dump() for box in response.detections]
+            )
+            events.put_nowait(("result", response.model_dump()))
+        except PoolBusyError as e:
+            events.put_nowait(("error", {"status_code": 503, "detail": str(e)}))
+        except ValueError as e:
+            events.put_nowait(("error", {"status_code": 400, "detail": str(e)}))
+        except Exception as e:
+            print(f"Streamed analysis failed: {str(e)}")
+            events.put_nowait(("error", {"status_code": 500, "detail": str(e)}))
+
+    async def stream():
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                event, data = await events.get()
+                yield sse(event, data)
+                if event in ("result", "error"):
+                    break
+        finally:
+            # Client went away: stop the analysis too
+            task.cancel()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-def extract_text_with_textract(image_bytes):
+@router.post("/analyze/bulk")
+async def analyze_bulk(
+    files: List[UploadFile] = File(default=[]),
+    archive: Optional[UploadFile] = File(default=None),
+    expected: Optional[int] = Form(default=None),
+    search_text: str = Form(default="VI-JOHN"),
+    targets: Optional[str] = Form(default=None),
+    sliced: bool = Form(default=False),
+    tile_size: int = Form(default=settings.TILE_SIZE, ge=128, le=4096),
+    tile_overlap: float = Form(default=settings.TILE_OVERLAP, ge=0.0, lt=0.9),
+    store_id: Optional[str] = Form(default=None),
+    user_id: Optional[str] = Form(default=None)
+):
     """
-    Extract text from image using AWS Textract
-    Returns list of detected text strings
+    Analyze many photos, sent as `files` or as one zip `archive`. Streams
+    application/x-ndjson: one line per image ({"index", "filename",
+    "status", "result" | "error"}) as soon as it finishes, in completion
+    order, then a {"status": "done"} summary line.
     """
     try:
-        client = get_textract_client()
-        
-        # Call Textract
-        response = client.detect_document_text(
-            Document={'Bytes': image_bytes}
-        )
-        
-        # Extract text from response
-        detected_texts = []
-        
-        for item in response['Blocks']:
-            if item['BlockType'] == 'WORD':
-                text = item['Text']
-                confidence = item['Confidence']
-                
-                # Only include text with reasonable confidence
-                if confidence > 50:  # Adjust threshold as needed
-                    detected_texts.append(text)
-                    
-        print(f"Textract detected {len(detected_texts)} text elements")
-        return detected_texts
-        
-    except Exception as e:
-        print(f"Error with AWS Textract: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Textract error: {str(e)}")
-
-class SKUResponse(BaseModel):
-    OSA: float
-    SOS: float
-    found: int
-    expected: int
-    total_boxes: int
+        target_specs = parse_targets(targets, expected, search_text)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if archive is not None and archive.filename:
+        try:
+            sources = zip_sources(await open_zip(archive), settings.BULK_MAX_IMAGE_BYTES)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    elif any(file.filename for file in files):
+        sources = multipart_sources(files, settings.BULK_MAX_IMAGE_BYTES)
+    else:
+        raise HTTPException(status_code=400, detail="No files provided")
+
+    return StreamingResponse(
+        stream_results(
+            sources,
+            target_specs,
+            sliced,
+            tile_size,
+            tile_overlap,
+            store_id,
+            user_id,
+            max_in_flight=settings.BULK_MAX_IN_FLIGHT,
+            max_images=settings.BULK_MAX_IMAGES
+        ),
+        media_type="application/x-ndjson"
+    )
 
-@router.post("/analyze", response_model=SKUResponse)
-async def analyze_sku(
-    file: UploadFile = File(...),
-    expected: int = Form(...),
-    search_text: str = Form(default="VI-JOHN")
+@router.get("/artifacts/{artifact_id}")
+async def get_artifact(artifact_id: str):
+    """Detections stored for one analysis"""
+    artifact = artifact_store.get(artifact_id)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Artifact not found or expired")
+    return {"artifact_id": artifact_id, "detections": artifact.detections}
+
+@router.get("/artifacts/{artifact_id}/image")
+async def get_artifact_image(
+    artifact_id: str,
+    width: Optional[int] = Query(default=None, ge=16, le=8192),
+    format: str = Query(default="jpeg", pattern="^(jpeg|png|webp)$")
 ):
-    # Load image
-    contents = await file.read()
-    image = Image.open(io.BytesIO(contents)).convert("RGB")
-
-    # Stage 1: YOLO - Load model lazily
-    model = get_yolo_model()
-    results = model.predict(np.array(image), conf=0.2, iou=0.3)
-    res_img = results[0].plot()  # numpy array with bounding boxes drawn
-
-    # Save it with OpenCV - fix the output path as well
-    output_path = "output.jpg"
-    Image.fromarray(res_img).save(output_path)
-
-    boxes = results[0].boxes
-    num_boxes = len(boxes)
-
-    # Stage 2: AWS Textract OCR - PROCESS ENTIRE IMAGE ONCE (NOT individual boxes)
-    print("Starting AWS Textract OCR on WHOLE IMAGE...")
-    detected_texts = extract_text_with_textract(contents)
-    
-    print("Textract Results:", detected_texts)
-
-    # Enhanced fuzzy matching with lower threshold
-    count = 0
-    threshold = 60  # Lowered from 80 to 60
-
-    print(f"\n=== FUZZY MATCHING DEBUG ===")
-    print(f"Search term: '{search_text}'")
-    print(f"Threshold: {threshold}%")
-    print("=" * 40)
-
-    for text in detected_texts:
-        # Try fuzzy matching with multiple methods
-        is_match, best_score, method = fuzzy_match_text(search_text, text, threshold)
-
-        print(f"Textract Text: '{text}' | Score: {best_score}% | Method: {method} | Match: {is_match}")
-
-        if is_match:
-            count += 1
-            print(f"✅ MATCH FOUND: '{text}' (Score: {best_score}%, Method: {method})")
-
-        # Fallback: Try simple substring matching as backup
-        if not is_match and search_text.upper() in text.upper():
-            count += 1
-            print(f"✅ SUBSTRING MATCH: '{text}' contains '{search_text}'")
-
-    print(f"=" * 40)
-    print(f"Total matches found: {count}")
-    print(f"=== END DEBUG ===\n")
-
-    # Metrics
-    osa = count / expected if expected > 0 else 0.0
-    sos = count / num_boxes if num_boxes > 0 else 0.0
-
-    return SKUResponse(
-        OSA=round(osa, 3),
-        SOS=round(sos, 3),
-        found=count,
-        expected=expected,
-        total_boxes=num_boxes
+    """
+    Annotated image for one analysis, rendered on first fetch at the
+    requested width (never upscaled) and format
+    """
+    artifact = artifact_store.get(artifact_id)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Artifact not found or expired")
+
+    rendered = artifact_store.cached_render(artifact_id, width, format)
+    if rendered is None:
+        rendered, _ = await run_in_threadpool(render_annotated, artifact, width, format)
+        artifact_store.store_render(artifact_id, width, format, rendered)
+
+    return Response(
+        content=rendered,
+        media_type=FORMATS[format][1],
+        headers={"Content-Disposition": f'inline; filename="analysis_{artifact_id}.{format}"'}
     )
 
-@router.get("/output-image")
-async def get_output_image():
+@router.get("/trends")
+async def get_trends(
+    brand: str = Query(..., min_length=1),
+    city: Optional[str] = Query(default=None),
+    store_id: Optional[str] = Query(default=None),
+    start: Optional[date] = Query(default=None),
+    end: Optional[date] = Query(default=None)
+):
     """
-    Simple endpoint to serve the output.jpg file
+    Daily average OSA/SOS of a brand, optionally within one city or store,
+    from the daily rollups (defaults to the last 7 days, both ends inclusive).
+    Only analyses of uploaded images count; ad-hoc /analyze calls do not.
     """
-    output_path = "output.jpg"
-
-    # Check if file exists
-    if not os.path.exists(output_path):
-        raise HTTPException(status_code=404, detail="Output image not found")
-
-    return FileResponse(
-        path=output_path,
-        media_type="image/jpeg",
-        filename="output.jpg"
-    )
\ No newline at end of file
+    try:
+        start_at, end_at = day_range(start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    days = await trend(brand, start_at, end_at, city=city, store_id=store_id)
+    return {"brand": normalize_brand(brand), "city": city, "store_id": store_id, "days": days}
+
+@router.get("/leaderboard")
+async def get_leaderboard(
+    brand: str = Query(..., min_length=1),
+    city: Optional[str] = Query(default=None),
+    start: Optional[date] = Query(default=None),
+    end: Optional[date] = Query(default=None),
+    metric: str = Query(default="osa", pattern="^(osa|sos)$"),
+    limit: int = Query(default=10, ge=1, le=100)
+):
+    """Stores ranked by a brand's average OSA or SOS over the period, from the daily rollups"""
+    try:
+        start_at, end_at = day_range(start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    stores = await leaderboard(brand, start_at, end_at, city=city, metric=metric, limit=limit)
+    return {"brand": normalize_brand(brand), "city": city, "metric": metric, "stores": stores}
+
+@router.get("/stats")
+async def get_stats():
+    """Inference pool, batching, result cache, scheduler, job, write batching and reaper metrics"""
+    return {
+        "inference_pool": inference_pool.stats(),
+        "batching": yolo_batcher.stats(),
+        "result_cache": result_cache.stats(),
+        "artifacts": artifact_store.stats(),
+        "jobs": job_queue.stats(),
+        "scheduler": scheduler.stats(),
+        "image_writes": image_writer.stats(),
+        "reaper": image_reaper.stats(),
+        "stores": store_locator.stats(),
+        "planograms": planogram_cache.stats(),
+        "near_duplicates": near_duplicates.stats()
+    }
\ No newline at end of file
@@ -1,57 +1,132 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, status
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Query, status
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional
 from datetime import datetime
 from decimal import Decimal
-import uuid
-import os
 from beanie import PydanticObjectId
+from beanie.operators import Set
+from config import settings
+from ml.phash import perceptual_hash
+from ml.stitching import StitchError, stitch_panorama, stitch_pool
+from models.analysis_job import AnalysisJob
+from models.geo import GeoPoint
 from models.image import Image
-from schemas.image import ImageCreate, ImageUpdate, ImageResponse
+from models.shelf_analysis import ShelfAnalysis
+from schemas.analysis import parse_targets
+from schemas.analysis_job import AnalysisStatusResponse
+from schemas.image import ImageCreate, ImageUpdate, ImageResponse, ImagePage
+from services.geo import StoreResolutionError, store_locator, valid_coordinates
+from services.jobs import job_queue
+from services.near_duplicates import REUSE, analysis_params, near_duplicates
+from services.pagination import image_page
+from services.reaper import restore_deadline
+from services.pool import PoolBusyError
+from services.storage import get_blob_store
+from services.write_batcher import image_writer
 
 router = APIRouter()
 
 @router.post("/upload", response_model=ImageResponse)
 async def upload_image(
     file: UploadFile = File(...),
-    store_id: str = Form(...),
+    store_id: Optional[str] = Form(default=None),  # resolved from the coordinates when left out
     user_id: str = Form(...),
     latitude: str = Form(...),  # Accept as string first
-    longitude: str = Form(...)  # Accept as string first
+    longitude: str = Form(...),  # Accept as string first
+    analyze: bool = Form(default=False),
+    expected: Optional[int] = Form(default=None),
+    search_text: str = Form(default="VI-JOHN"),
+    targets: Optional[str] = Form(default=None),
+    sliced: bool = Form(default=False)
 ):
-    """Upload single image"""
+    """
+    Upload single image. With analyze=true an analysis job is queued for it,
+    unless a near-identical recent photo of the store already has one;
+    poll /analysis/{image_id} for the result.
+    """
     try:
         # Validate file
         if not file.filename:
             raise HTTPException(status_code=400, detail="No file provided")
         
+        # Validate analysis targets before storing anything
+        target_specs = None
+        if analyze:
+            try:
+                target_specs = parse_targets(targets, expected, search_text)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        
         # Validate and convert coordinates
         try:
             lat_decimal = Decimal(str(latitude))
             lng_decimal = Decimal(str(longitude))
-        except (ValueError, TypeError) as e:
+            if not valid_coordinates(lat_decimal, lng_decimal):
+                raise ValueError("out of range")
+        except (ValueError, TypeError, ArithmeticError) as e:
             raise HTTPException(status_code=400, detail=f"Invalid coordinates: {str(e)}")
         
         # Validate required fields
-        if not store_id or not user_id:
-            raise HTTPException(status_code=400, detail="store_id and user_id are required")
+        if not user_id:
+            raise HTTPException(status_code=400, detail="user_id is required")
         
-        # Generate unique filename/URL (in real app, upload to S3)
-        file_extension = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        image_url = f"uploads/{unique_filename}"
+        # Fill in or check store_id against the cached store locations
+        store_resolved = not store_id
+        try:
+            store_id, store_match = await store_locator.resolve(store_id, float(lat_decimal), float(lng_decimal))
+        except StoreResolutionError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        
+        # Stream the file into the blob store; identical photos share one object
+        blob = await get_blob_store().put_stream(file)
+        
+        # Re-shoots of the same shelf differ in bytes but not in perceptual hash
+        phash, duplicate = None, None
+        if target_specs is not None and near_duplicates.enabled:
+            await file.seek(0)
+            try:
+                phash = await run_in_threadpool(perceptual_hash, file.file)
+                duplicate = await near_duplicates.find(store_id, phash, target_specs, sliced)
+            except ValueError:
+                pass  # not decodable; the analysis job reports it
+        reuse = duplicate is not None and near_duplicates.action == REUSE
         
         # Create image record
         image_data = ImageCreate(
             user_id=str(user_id),
             store_id=str(store_id),
-            image_url=image_url,
+            image_url=blob.url,
             latitude=lat_decimal,
             longitude=lng_decimal
         )
         
-        # Save to database using Beanie
-        image = Image(**image_data.model_dump())
-        await image.insert()
+        # Save to database; concurrent uploads share one insert_many (which skips
+        # the model's before_event hooks, so location is set here)
+        image = Image(
+            **image_data.model_dump(),
+            location=GeoPoint.from_lat_lng(lat_decimal, lng_decimal),
+            blob_key=blob.key,
+            content_hash=blob.sha256,
+            phash=f"{phash:016x}" if phash is not None else None,
+            duplicate_of=duplicate.image_id if duplicate else None,
+            analysis_reused=reuse
+        )
+        await image_writer.insert(image)
+        
+        # A reused blob may have been purged before this row was written; store it again
+        if blob.deduplicated and not await get_blob_store().exists(blob.key):
+            await file.seek(0)
+            await get_blob_store().put_stream(file)
+        
+        # Inference runs in the background; the upload returns right away
+        job_id = None
+        if reuse:
+            job_id = duplicate.job_id
+        elif target_specs is not None:
+            job = await job_queue.enqueue(image, target_specs, sliced)
+            job_id = str(job.id)
+            if phash is not None:
+                near_duplicates.add(image.store_id, str(image.id), job_id, phash, analysis_params(target_specs, sliced))
         
         return ImageResponse(
             id=str(image.id),
@@ -61,7 +136,12 @@ async def upload_image(
             latitude=image.latitude,
             longitude=image.longitude,
             upload_time=image.upload_time,
-            is_deleted=image.is_deleted
+            is_deleted=image.is_deleted,
+            analysis_job_id=job_id,
+            store_resolved=store_resolved,
+            store_distance_m=store_match.distance_m if store_match else None,
+            duplicate_of=image.duplicate_of,
+            analysis_reused=image.analysis_reused
         )
         
     except HTTPException:
@@ -72,12 +152,12 @@ async def upload_image(
 @router.post("/stitch")
 async def stitch_images(
     files: List[UploadFile] = File(...),
-    store_id: str = Form(...),
+    store_id: Optional[str] = Form(default=None),
     user_id: str = Form(...),
     latitude: str = Form(...),
     longitude: str = Form(...)
 ):
-    """Stitch multiple images"""
+    """Stitch up to 5 overlapping shelf photos, in capture order, into one panorama"""
     try:
         if len(files) > 5:
             raise HTTPException(status_code=400, detail="Maximum 5 images allowed")
@@ -86,36 +166,73 @@ async def stitch_images(
         try:
             lat_decimal = Decimal(str(latitude))
             lng_decimal = Decimal(str(longitude))
-        except (ValueError, TypeError):
+            if not valid_coordinates(lat_decimal, lng_decimal):
+                raise ValueError("out of range")
+        except (ValueError, TypeError, ArithmeticError):
             raise HTTPException(status_code=400, detail="Invalid coordinates")
+        location = GeoPoint.from_lat_lng(lat_decimal, lng_decimal)
         
-        created_images = []
+        try:
+            store_id, _ = await store_locator.resolve(store_id, float(lat_decimal), float(lng_decimal))
+        except StoreResolutionError as e:
+            raise HTTPException(status_code=422, detail=str(e))
         
+        frames = []
         for file in files:
             if not file.filename:
                 continue
-                
-            # Generate unique filename for each image
-            file_extension = os.path.splitext(file.filename)[1]
-            unique_filename = f"stitched_{uuid.uuid4()}{file_extension}"
-            image_url = f"uploads/{unique_filename}"
-            
-            image_data = ImageCreate(
+            frames.append(await file.read())
+        if not frames:
+            raise HTTPException(status_code=400, detail="No files provided")
+        
+        # Feature matching and blending are CPU-bound; keep them off the event loop
+        try:
+            panorama, width, height = await stitch_pool.run(
+                stitch_panorama,
+                frames,
+                settings.STITCH_MATCH_WIDTH,
+                settings.STITCH_MAX_PIXELS
+            )
+        except PoolBusyError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+        except StitchError as e:
+            raise HTTPException(status_code=422, detail=f"Stitch failed: {str(e)}")
+        
+        # Keep the source frames as blobs only, so the panorama can be traced back to them
+        # without the frames showing up as images of their own
+        blob_store = get_blob_store()
+        source_blobs = [await blob_store.put_bytes(contents) for contents in frames]
+        
+        blob = await blob_store.put_bytes(panorama)
+        panorama_image = Image(
+            **ImageCreate(
                 user_id=str(user_id),
                 store_id=str(store_id),
-                image_url=image_url,
+                image_url=blob.url,
                 latitude=lat_decimal,
                 longitude=lng_decimal
-            )
-            
-            image = Image(**image_data.model_dump())
-            await image.insert()
-            created_images.append(str(image.id))
+            ).model_dump(),
+            location=location,
+            blob_key=blob.key,
+            content_hash=blob.sha256,
+            source_blob_keys=[source.key for source in source_blobs]
+        )
+        await image_writer.insert(panorama_image)
+        
+        # Reused blobs may have been purged before the row was written; store them again
+        for stored, contents in zip([blob] + source_blobs, [panorama] + frames):
+            if stored.deduplicated and not await blob_store.exists(stored.key):
+                await blob_store.put_bytes(contents)
         
         return {
-            "image_ids": created_images,
+            "image_id": str(panorama_image.id),
+            "image_url": blob.url,
+            "source_blob_keys": panorama_image.source_blob_keys,
+            "source_image_urls": [source.url for source in source_blobs],
+            "width": width,
+            "height": height,
             "status": "stitched",
-            "message": f"Successfully stitched {len(created_images)} images"
+            "message": f"Successfully stitched {len(source_blobs)} images"
         }
         
     except HTTPException:
@@ -123,9 +240,50 @@ async def stitch_images(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Stitch failed: {str(e)}")
 
-@router.get("/analysis/{image_id}")
+@router.post("/{image_id}/analyze", response_model=AnalysisStatusResponse)
+async def analyze_image(
+    image_id: str,
+    expected: Optional[int] = Form(default=None),
+    search_text: str = Form(default="VI-JOHN"),
+    targets: Optional[str] = Form(default=None),
+    sliced: bool = Form(default=False)
+):
+    """Queue an analysis job for an already uploaded image"""
+    try:
+        # Validate ObjectId format
+        try:
+            obj_id = PydanticObjectId(image_id)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid image ID format")
+        
+        try:
+            target_specs = parse_targets(targets, expected, search_text)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        image = await Image.get(obj_id)
+        if not image or image.is_deleted:
+            raise HTTPException(status_code=404, detail="Image not found")
+        if not image.blob_key:
+            raise HTTPException(status_code=409, detail="Image file is not stored on this server")
+        
+        job = await job_queue.enqueue(image, target_specs, sliced)
+        return AnalysisStatusResponse(image_id=image_id, status=job.status.value, job_id=str(job.id))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+async def latest_analysis(image_id: str):
+    """Newest analysis job and newest stored analysis of an image (either may be None)"""
+    job = await AnalysisJob.find(AnalysisJob.image_id == image_id).sort(-AnalysisJob.created_at).first_or_none()
+    analysis = await ShelfAnalysis.find(ShelfAnalysis.image_id == image_id).sort(-ShelfAnalysis.analysis_time).first_or_none()
+    return job, analysis
+
+@router.get("/analysis/{image_id}", response_model=AnalysisStatusResponse)
 async def get_analysis(image_id: str):
-    """Get image analysis results"""
+    """Latest analysis job status for an image, with the result once completed"""
     try:
         # Validate ObjectId format
         try:
@@ -138,76 +296,74 @@ async def get_analysis(image_id: str):
         if not image or image.is_deleted:
             raise HTTPException(status_code=404, detail="Image not found")
         
-        # Mock analysis results for now
-        analysis = {
-            "image_id": image_id,
-            "osa_percent": 85.5,
-            "sos_percent": 42.3,
-            "planogram_compliance": True,
-            "analysis_time": datetime.utcnow(),
-            "status": "completed"
-        }
+        job, analysis = await latest_analysis(image_id)
+        
+        # A near-duplicate upload serves the earlier photo's analysis until it gets its own
+        reused_from = None
+        if job is None and analysis is None and image.analysis_reused and image.duplicate_of:
+            reused_from = image.duplicate_of
+            job, analysis = await latest_analysis(reused_from)
+        
+        # A newer job that is still pending or failed takes precedence over an older result
+        if job is not None and job.analysis_id is None and (analysis is None or job.created_at > analysis.analysis_time):
+            return AnalysisStatusResponse(
+                image_id=image_id,
+                status=job.status.value,
+                job_id=str(job.id),
+                error=job.error,
+                reused_from=reused_from
+            )
         
-        return analysis
+        if analysis is None:
+            raise HTTPException(status_code=404, detail="No analysis for this image; POST /{image_id}/analyze to start one")
+        
+        return AnalysisStatusResponse(
+            image_id=image_id,
+            status="completed",
+            job_id=str(job.id) if job else None,
+            analysis_id=str(analysis.id),
+            reused_from=reused_from,
+            osa_percent=analysis.osa_percent,
+            sos_percent=analysis.sos_percent,
+            planogram_compliance=analysis.planogram_match,
+            analysis_time=analysis.analysis_time,
+            result=analysis.raw_output_json
+        )
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
-@router.get("/history/{user_id}")
-async def get_history(user_id: str, limit: int = 10):
-    """Get user's image history"""
+@router.get("/history/{user_id}", response_model=ImagePage)
+async def get_history(
+    user_id: str,
+    limit: int = Query(default=10, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None)
+):
+    """Get user's image history, newest first; follow next_cursor for older pages"""
     try:
-        # Find images for user, exclude soft deleted
-        images = await Image.find(
-            Image.user_id == user_id,
-            Image.is_deleted == False
-        ).sort(-Image.upload_time).limit(limit).to_list()
-        
-        # Convert to response format
-        image_responses = [
-            ImageResponse(
-                id=str(img.id),
-                user_id=img.user_id,
-                store_id=img.store_id,
-                image_url=img.image_url,
-                latitude=img.latitude,
-                longitude=img.longitude,
-                upload_time=img.upload_time,
-                is_deleted=img.is_deleted
-            ) for img in images
-        ]
-        
-        return {"images": image_responses, "total": len(image_responses)}
+        images, next_cursor = await image_page("user_id", user_id, limit, cursor)
+        return ImagePage(images=images, total=len(images), next_cursor=next_cursor)
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"History retrieval failed: {str(e)}")
 
-@router.get("/store/{store_id}")
-async def get_store_images(store_id: str, limit: int = 10):
-    """Get images for a specific store"""
+@router.get("/store/{store_id}", response_model=ImagePage)
+async def get_store_images(
+    store_id: str,
+    limit: int = Query(default=10, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None)
+):
+    """Get images for a specific store, newest first; follow next_cursor for older pages"""
     try:
-        images = await Image.find(
-            Image.store_id == store_id,
-            Image.is_deleted == False
-        ).sort(-Image.upload_time).limit(limit).to_list()
-        
-        image_responses = [
-            ImageResponse(
-                id=str(img.id),
-                user_id=img.user_id,
-                store_id=img.store_id,
-                image_url=img.image_url,
-                latitude=img.latitude,
-                longitude=img.longitude,
-                upload_time=img.upload_time,
-                is_deleted=img.is_deleted
-            ) for img in images
-        ]
-        
-        return {"images": image_responses, "total": len(image_responses)}
+        images, next_cursor = await image_page("store_id", store_id, limit, cursor)
+        return ImagePage(images=images, total=len(images), next_cursor=next_cursor)
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Store images retrieval failed: {str(e)}")
 
@@ -229,6 +385,9 @@ async def update_image(image_id: str, image_update: ImageUpdate):
         update_data = image_update.model_dump(exclude_unset=True)
         for field, value in update_data.items():
             setattr(image, field, value)
+        if image.is_deleted:
+            # Deleting through an update starts the restore window too
+            image.deleted_at = datetime.utcnow()
         
         await image.save()
         
@@ -250,7 +409,7 @@ async def update_image(image_id: str, image_update: ImageUpdate):
 
 @router.delete("/{image_id}")
 async def delete_image(image_id: str):
-    """Soft delete image (30-min window)"""
+    """Soft delete image; it can be restored until the reaper purges it"""
     try:
         # Validate ObjectId format
         try:
@@ -262,11 +421,16 @@ async def delete_image(image_id: str):
         if not image:
             raise HTTPException(status_code=404, detail="Image not found")
         
-        # Soft delete
-        image.is_deleted = True
-        await image.save()
+        # Soft delete; deleting again does not extend the window
+        if not image.is_deleted:
+            image.is_deleted = True
+            image.deleted_at = datetime.utcnow()
+            await image.save()
         
-        return {"message": "Image deleted successfully (can be restored within 30 minutes)"}
+        return {
+            "message": f"Image deleted successfully (can be restored within {settings.IMAGE_RESTORE_WINDOW_MINUTES:g} minutes)",
+            "restore_until": restore_deadline(image)
+        }
         
     except HTTPException:
         raise
@@ -290,9 +454,18 @@ async def restore_image(image_id: str):
         if not image.is_deleted:
             raise HTTPException(status_code=400, detail="Image is not deleted")
         
-        # Restore image
-        image.is_deleted = False
-        await image.save()
+        deadline = restore_deadline(image)
+        if image.purge_started_at is not None or (deadline is not None and datetime.utcnow() > deadline):
+            raise HTTPException(status_code=410, detail="Restore window has expired")
+        
+        # Restore image, unless the reaper claimed it in the meantime
+        restored = await Image.find_one(
+            Image.id == obj_id,
+            Image.is_deleted == True,
+            Image.purge_started_at == None
+        ).update(Set({Image.is_deleted: False, Image.deleted_at: None}))
+        if not restored.modified_count:
+            raise HTTPException(status_code=410, detail="Restore window has expired")
         
         return {"message": "Image restored successfully"}
         
@@ -323,7 +496,8 @@ async def get_image(image_id: str):
             latitude=image.latitude,
             longitude=image.longitude,
             upload_time=image.upload_time,
-            is_deleted=image.is_deleted
+            is_deleted=image.is_deleted,
+            source_blob_keys=image.source_blob_keys
         )
         
     except HTTPException:
@@ -0,0 +1,84 @@
+from fastapi import APIRouter, HTTPException
+from beanie import PydanticObjectId
+from ml.planogram import CompiledPlanogram
+from models.panogram import Planogram
+from schemas.panogram import PlanogramCreate, PlanogramUpdate, PlanogramResponse
+from services.planogram import current_planogram, planogram_cache
+
+router = APIRouter(prefix="/api/planograms", tags=["planograms"])
+
+def to_response(planogram: Planogram) -> PlanogramResponse:
+    return PlanogramResponse(
+        id=str(planogram.id),
+        store_id=planogram.store_id,
+        planogram_name=planogram.planogram_name,
+        layout_image=planogram.layout_image,
+        slots=planogram.slots,
+        created_by=planogram.created_by,
+        created_at=planogram.created_at
+    )
+
+def validate_slots(slots) -> None:
+    if slots:
+        try:
+            CompiledPlanogram("", slots, 0.0)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/", response_model=PlanogramResponse)
+async def create_planogram(planogram_data: PlanogramCreate):
+    """Create a planogram; with slots it becomes the store's current one"""
+    try:
+        validate_slots(planogram_data.slots)
+        planogram = Planogram(**planogram_data.model_dump())
+        await planogram.insert()
+        planogram_cache.invalidate(planogram.store_id)
+        return to_response(planogram)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Planogram creation failed: {str(e)}")
+
+@router.get("/store/{store_id}", response_model=PlanogramResponse)
+async def get_store_planogram(store_id: str):
+    """The planogram analyses of this store are checked against"""
+    try:
+        planogram = await current_planogram(store_id)
+        if planogram is None:
+            raise HTTPException(status_code=404, detail="Store has no planogram with slots")
+        return to_response(planogram)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Planogram retrieval failed: {str(e)}")
+
+@router.put("/{planogram_id}", response_model=PlanogramResponse)
+async def update_planogram(planogram_id: str, planogram_update: PlanogramUpdate):
+    """Update planogram details"""
+    try:
+        try:
+            obj_id = PydanticObjectId(planogram_id)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid planogram ID format")
+
+        planogram = await Planogram.get(obj_id)
+        if not planogram:
+            raise HTTPException(status_code=404, detail="Planogram not found")
+
+        validate_slots(planogram_update.slots)
+        update_data = planogram_update.model_dump(exclude_unset=True)
+        for field, value in update_data.items():
+            setattr(planogram, field, value)
+        if planogram_update.slots is not None:
+            planogram.slots = planogram_update.slots
+
+        await planogram.save()
+        planogram_cache.invalidate(planogram.store_id)
+        return to_response(planogram)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Planogram update failed: {str(e)}")
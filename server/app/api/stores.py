@@ -0,0 +1,23 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import List
+from schemas.store import StoreNearby
+from services.geo import stores_near
+
+router = APIRouter(prefix="/api/stores", tags=["stores"])
+
+@router.get("/nearby", response_model=List[StoreNearby])
+async def get_nearby_stores(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(default=2000, gt=0, le=50000),
+    limit: int = Query(default=10, ge=1, le=50)
+):
+    """Stores near a point, nearest first"""
+    try:
+        rows = await stores_near(latitude, longitude, radius_m, limit)
+        return [
+            StoreNearby(**{**row, "id": str(row["_id"]), "distance_m": round(row["distance_m"], 1)})
+            for row in rows
+        ]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Store lookup failed: {str(e)}")
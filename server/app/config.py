@@ -6,5 +6,97 @@ load_dotenv()
 class Settings:
     MONGODB_URL = os.getenv("MONGODB_URL")
     DATABASE_NAME = os.getenv("DATABASE_NAME", "massist_db")
-    
+
+    # Inference runtime: pytorch (best.pt) | onnx (best.onnx) | onnx-int8 (best.int8.onnx)
+    MODEL_BACKEND = os.getenv("MODEL_BACKEND", "pytorch")
+
+    # Inference worker pool
+    INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+    INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "16"))
+
+    # Micro-batching of concurrent YOLO requests (BATCH_MAX_SIZE=1 disables it)
+    BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "4"))
+    BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", "15"))
+
+    # Content-addressed analysis cache (MODEL_VERSION defaults to a hash of the weights)
+    MODEL_VERSION = os.getenv("MODEL_VERSION")
+    RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "512"))
+    RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+
+    # OCR backend: textract | easyocr | static
+    OCR_BACKEND = os.getenv("OCR_BACKEND", "textract")
+    OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "50"))
+    OCR_LANGUAGES = os.getenv("OCR_LANGUAGES", "en").split(",")
+    OCR_STATIC_WORDS = os.getenv("OCR_STATIC_WORDS", "").split()
+    AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
+
+    # Sliced inference for high-resolution and panoramic photos (analyze with sliced=true)
+    TILE_SIZE = int(os.getenv("TILE_SIZE", "640"))
+    TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))
+    TILE_MERGE_THRESHOLD = float(os.getenv("TILE_MERGE_THRESHOLD", "0.5"))
+
+    # Planogram compliance, checked on analyses of stores that have a slotted planogram
+    PLANOGRAM_MIN_COMPLIANCE = float(os.getenv("PLANOGRAM_MIN_COMPLIANCE", "0.8"))
+    PLANOGRAM_CACHE_SIZE = int(os.getenv("PLANOGRAM_CACHE_SIZE", "256"))
+    PLANOGRAM_CACHE_TTL_SECONDS = float(os.getenv("PLANOGRAM_CACHE_TTL_SECONDS", "600"))
+
+    # Near-duplicate uploads of a store (perceptual hash within PHASH_MAX_DISTANCE bits) with the
+    # same targets: reuse the earlier analysis | flag it and analyze anyway | off
+    NEAR_DUPLICATE_ACTION = os.getenv("NEAR_DUPLICATE_ACTION", "reuse")
+    PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "6"))
+    NEAR_DUPLICATE_WINDOW_SECONDS = float(os.getenv("NEAR_DUPLICATE_WINDOW_SECONDS", "600"))
+    NEAR_DUPLICATE_MAX_PER_STORE = int(os.getenv("NEAR_DUPLICATE_MAX_PER_STORE", "256"))
+
+    # Panorama stitching worker pool
+    STITCH_WORKERS = int(os.getenv("STITCH_WORKERS", "1"))
+    STITCH_QUEUE_SIZE = int(os.getenv("STITCH_QUEUE_SIZE", "4"))
+    STITCH_MATCH_WIDTH = int(os.getenv("STITCH_MATCH_WIDTH", "1000"))
+    STITCH_MAX_PIXELS = int(os.getenv("STITCH_MAX_PIXELS", "40000000"))
+
+    # Write-behind batching of Image inserts (IMAGE_WRITE_BATCH_SIZE=1 writes one at a time)
+    IMAGE_WRITE_BATCH_SIZE = int(os.getenv("IMAGE_WRITE_BATCH_SIZE", "64"))
+    IMAGE_WRITE_WINDOW_MS = float(os.getenv("IMAGE_WRITE_WINDOW_MS", "10"))
+
+    # Soft-deleted images are restorable for this long, then purged with their analyses and blobs
+    IMAGE_RESTORE_WINDOW_MINUTES = float(os.getenv("IMAGE_RESTORE_WINDOW_MINUTES", "30"))
+    REAPER_INTERVAL_SECONDS = float(os.getenv("REAPER_INTERVAL_SECONDS", "300"))
+    REAPER_BATCH_SIZE = int(os.getenv("REAPER_BATCH_SIZE", "500"))
+    # Claimed images keep their rows and blobs this long, so uploads that deduplicated against a
+    # blob meanwhile have their own Image rows written before references are checked
+    BLOB_DELETE_GRACE_SECONDS = float(os.getenv("BLOB_DELETE_GRACE_SECONDS", "300"))
+
+    # Store resolution from upload coordinates (store_id may be left out of an upload)
+    STORE_MATCH_RADIUS_METERS = float(os.getenv("STORE_MATCH_RADIUS_METERS", "150"))
+    STORE_MATCH_ENFORCE = os.getenv("STORE_MATCH_ENFORCE", "false").lower() == "true"  # reject far-off store_ids
+    STORE_CACHE_TTL_SECONDS = float(os.getenv("STORE_CACHE_TTL_SECONDS", "300"))
+
+    # Uploaded and generated images: local | s3 | memory
+    BLOB_BACKEND = os.getenv("BLOB_BACKEND", "local")
+    UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+    S3_BUCKET = os.getenv("S3_BUCKET")
+    S3_PREFIX = os.getenv("S3_PREFIX", "images")
+    S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # for S3-compatible stores such as MinIO
+
+    # Annotated output images, rendered on first fetch
+    ARTIFACT_CACHE_SIZE = int(os.getenv("ARTIFACT_CACHE_SIZE", "64"))
+    ARTIFACT_RENDER_CACHE_SIZE = int(os.getenv("ARTIFACT_RENDER_CACHE_SIZE", "128"))
+    ARTIFACT_TTL_SECONDS = float(os.getenv("ARTIFACT_TTL_SECONDS", "1800"))
+
+    # Background analysis of uploaded images
+    JOB_RETRY_DELAY_SECONDS = float(os.getenv("JOB_RETRY_DELAY_SECONDS", "5"))
+    # A running job older than this is presumed orphaned by a dead process and requeued on startup
+    JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "900"))
+
+    # Tenant-fair scheduling of analyses (tenant = store_id + user_id; weights as "store_a=2,store_b=1")
+    SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", str(INFERENCE_WORKERS * BATCH_MAX_SIZE)))
+    TENANT_MAX_CONCURRENCY = int(os.getenv("TENANT_MAX_CONCURRENCY", "2"))
+    SCHEDULER_INTERACTIVE_RESERVE = int(os.getenv("SCHEDULER_INTERACTIVE_RESERVE", "2"))
+    SCHEDULER_STORE_WEIGHTS = os.getenv("SCHEDULER_STORE_WEIGHTS", "")
+    SCHEDULER_INTERACTIVE_TARGET_MS = float(os.getenv("SCHEDULER_INTERACTIVE_TARGET_MS", "1000"))
+
+    # Bulk analysis (/api/analytics/analyze/bulk): images held in the pipeline at once
+    BULK_MAX_IN_FLIGHT = int(os.getenv("BULK_MAX_IN_FLIGHT", "4"))
+    BULK_MAX_IMAGES = int(os.getenv("BULK_MAX_IMAGES", "500"))
+    BULK_MAX_IMAGE_BYTES = int(os.getenv("BULK_MAX_IMAGE_BYTES", str(25 * 1024 * 1024)))
+
 settings = Settings()
\ No newline at end of file
@@ -3,8 +3,14 @@ from fastapi.middleware.cors import CORSMiddleware
 import motor.motor_asyncio
 from beanie import init_beanie
 from datetime import datetime
-from api import images, analytics
+from api import images, analytics, planograms, stores
 from config import settings
+from ml.batching import yolo_batcher
+from ml.inference import inference_pool
+from ml.stitching import stitch_pool
+from services.jobs import job_queue
+from services.reaper import image_reaper
+from services.write_batcher import image_writer
 
 # Import all Beanie models
 from models.user import User
@@ -12,6 +18,8 @@ from models.store import Store
 from models.image import Image
 from models.shelf_analysis import ShelfAnalysis
 from models.panogram import Planogram
+from models.analysis_job import AnalysisJob
+from models.rollup import DailyRollup
     
 app = FastAPI(title="MAssist Shelf SDK", version="1.0.0")
 
@@ -39,15 +47,37 @@ async def init_db():
             Store,
             Image,
             ShelfAnalysis,
-            Planogram
+            Planogram,
+            AnalysisJob,
+            DailyRollup
         ]
     )
 
+@app.on_event("startup")
+async def start_workers():
+    """Create the inference worker pool, resume queued analysis jobs and start the image reaper"""
+    inference_pool.start()
+    await job_queue.start()
+    image_reaper.start()
+
+@app.on_event("shutdown")
+async def stop_workers():
+    await image_reaper.stop()
+    await job_queue.stop()
+    await yolo_batcher.stop()
+    await image_writer.stop()
+    inference_pool.shutdown()
+    stitch_pool.shutdown()
+
 # Routes
 app.include_router(images.router, prefix="/api/images")
 
 app.include_router(analytics.router)  
 
+app.include_router(stores.router)
+
+app.include_router(planograms.router)
+
 
 @app.get("/")
 async def root():
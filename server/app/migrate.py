@@ -0,0 +1,255 @@
+"""
+Build the MongoDB indexes declared on the Beanie models on an existing
+deployment, before the new code starts serving.
+
+    cd server/app
+    python -m migrate            # check, build missing indexes, verify hot queries
+    python -m migrate --check    # report missing indexes and duplicates only
+
+Safe to run repeatedly: indexes that already exist are left alone,
+GeoJSON locations are only backfilled where missing, analyses rolled up
+before rolled_up_at existed are marked once, and only panoramas still
+listing source_image_ids are converted (their frame Images are
+soft-deleted; the reaper purges them and keeps the blobs the panorama
+references). Unique indexes cannot be built over duplicate values (and
+would then also fail application startup), so duplicates are reported
+first and the run stops.
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+import motor.motor_asyncio
+from beanie import init_beanie
+from bson import ObjectId
+
+from config import settings
+from models.analysis_job import AnalysisJob
+from models.image import Image
+from models.panogram import Planogram
+from models.rollup import DailyRollup
+from models.shelf_analysis import ShelfAnalysis
+from models.store import Store
+from models.user import User
+
+# Same models main.init_db registers
+DOCUMENT_MODELS = [User, Store, Image, ShelfAnalysis, Planogram, AnalysisJob, DailyRollup]
+
+# Fields declared with Indexed(..., unique=True)
+UNIQUE_FIELDS = [(Store, "store_code"), (User, "email")]
+
+# Indexes superseded by newer declarations; dropped once their replacement exists
+RETIRED_INDEXES = {
+    "images": ["user_id_upload_time_live", "store_id_upload_time_live"]
+}
+
+# GeoJSON location derived from the Decimal latitude/longitude, for the 2dsphere indexes
+LOCATION_MODELS = [Store, Image]
+LOCATION_BACKFILL = [{
+    "$set": {
+        "location": {
+            "type": "Point",
+            "coordinates": [{"$toDouble": "$longitude"}, {"$toDouble": "$latitude"}]
+        }
+    }
+}]
+
+# The query shapes the indexes exist for: (model, filter, sort)
+HOT_QUERIES = [
+    (Image, {"user_id": "<user_id>", "is_deleted": False}, [("upload_time", -1), ("_id", -1)]),
+    (Image, {"store_id": "<store_id>", "is_deleted": False}, [("upload_time", -1), ("_id", -1)]),
+    (ShelfAnalysis, {"image_id": "<image_id>"}, [("analysis_time", -1)]),
+    (Planogram, {"store_id": "<store_id>", "slots.0": {"$exists": True}}, [("created_at", -1)])
+]
+
+
+def collection_name(model) -> str:
+    return getattr(model.Settings, "name", None) or model.__name__
+
+
+def declared_keys(model) -> List[List[Tuple[str, Any]]]:
+    keys = [list(index.document["key"].items()) for index in getattr(model.Settings, "indexes", [])]
+    keys += [[(field, 1)] for unique_model, field in UNIQUE_FIELDS if unique_model is model]
+    return keys
+
+
+def plan_summary(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """Winning plan stages (e.g. LIMIT > FETCH > IXSCAN) with the index used and work done"""
+    stages, index_name = [], None
+    plan = explain["queryPlanner"]["winningPlan"]
+    plan = plan.get("queryPlan", plan)  # slot-based engine nests the classic plan
+    while plan:
+        stages.append(plan["stage"])
+        index_name = plan.get("indexName", index_name)
+        plan = plan.get("inputStage")
+    stats = explain.get("executionStats", {})
+    return {
+        "plan": " > ".join(stages),
+        "index": index_name,
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "returned": stats.get("nReturned"),
+        "ms": stats.get("executionTimeMillis")
+    }
+
+
+async def missing_indexes(database) -> Dict[str, List]:
+    missing = {}
+    for model in DOCUMENT_MODELS:
+        name = collection_name(model)
+        existing = await database[name].index_information()
+        existing_keys = {tuple(info["key"]) for info in existing.values()}
+        absent = [key for key in declared_keys(model) if tuple(key) not in existing_keys]
+        if absent:
+            missing[name] = absent
+    return missing
+
+
+async def drop_retired(database, check_only: bool) -> None:
+    for name, index_names in RETIRED_INDEXES.items():
+        existing = await database[name].index_information()
+        for index_name in index_names:
+            if index_name not in existing:
+                continue
+            if check_only:
+                print(f"retired index on {name} still present: {index_name}")
+            else:
+                await database[name].drop_index(index_name)
+                print(f"dropped retired index on {name}: {index_name}")
+
+
+async def backfill_locations(database, check_only: bool) -> None:
+    # Out-of-range coordinates stay without a location; 2dsphere indexes skip those documents
+    query = {
+        "location": None,
+        "latitude": {"$gte": -90, "$lte": 90},
+        "longitude": {"$gte": -180, "$lte": 180}
+    }
+    for model in LOCATION_MODELS:
+        name = collection_name(model)
+        if check_only:
+            count = await database[name].count_documents(query)
+            if count:
+                print(f"{count} documents in {name} without a location")
+        else:
+            result = await database[name].update_many(query, LOCATION_BACKFILL)
+            if result.modified_count:
+                print(f"backfilled location on {result.modified_count} documents in {name}")
+
+
+async def mark_rolled_up(database, check_only: bool) -> None:
+    # Analyses of stored images were added to the rollups before the marker existed;
+    # rollup buckets no longer keep the ids of subtracted analyses
+    analyses = database[collection_name(ShelfAnalysis)]
+    query = {"image_id": {"$ne": None}, "rolled_up_at": {"$exists": False}}
+    if check_only:
+        count = await analyses.count_documents(query)
+        if count:
+            print(f"{count} rolled-up analyses without rolled_up_at")
+        return
+    result = await analyses.update_many(query, [{"$set": {"rolled_up_at": "$analysis_time"}}])
+    if result.modified_count:
+        print(f"marked {result.modified_count} analyses as rolled up")
+    await database[collection_name(DailyRollup)].update_many(
+        {"removed": {"$exists": True}},
+        {"$unset": {"removed": ""}}
+    )
+
+
+async def fold_stitch_frames(database, check_only: bool) -> None:
+    # Panoramas used to keep each source frame as an Image row of its own
+    images = database[collection_name(Image)]
+    query = {"source_image_ids.0": {"$exists": True}}
+    if check_only:
+        count = await images.count_documents(query)
+        if count:
+            print(f"{count} panoramas with source frames stored as images")
+        return
+
+    folded = 0
+    async for panorama in images.find(query, {"source_image_ids": 1}):
+        frame_ids = [ObjectId(frame_id) for frame_id in panorama["source_image_ids"] if ObjectId.is_valid(frame_id)]
+        frames = {frame["_id"]: frame.get("blob_key") async for frame in images.find({"_id": {"$in": frame_ids}}, {"blob_key": 1})}
+        keys = [frames[frame_id] for frame_id in frame_ids if frames.get(frame_id)]
+        await images.update_one(
+            {"_id": panorama["_id"]},
+            {"$set": {"source_blob_keys": keys}, "$unset": {"source_image_ids": ""}}
+        )
+        await images.update_many(
+            {"_id": {"$in": frame_ids}, "is_deleted": False},
+            {"$set": {"is_deleted": True, "deleted_at": datetime.utcnow()}}
+        )
+        folded += 1
+    if folded:
+        print(f"moved source frames of {folded} panoramas to source_blob_keys")
+
+
+async def duplicates(database, limit: int = 10) -> Dict[str, List]:
+    found = {}
+    for model, field in UNIQUE_FIELDS:
+        name = collection_name(model)
+        pipeline = [
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+            {"$limit": limit}
+        ]
+        rows = await database[name].aggregate(pipeline, allowDiskUse=True).to_list(length=limit)
+        if rows:
+            found[f"{name}.{field}"] = [(row["_id"], row["count"]) for row in rows]
+    return found
+
+
+async def explain_hot_queries(database) -> None:
+    for model, query, sort in HOT_QUERIES:
+        explain = await database[collection_name(model)].find(query).sort(sort).limit(10).explain()
+        summary = plan_summary(explain)
+        print(f"  {collection_name(model)} {list(query)} sort {sort}: {summary['plan']} (index {summary['index']})")
+
+
+async def main(check_only: bool) -> int:
+    client = motor.motor_asyncio.AsyncIOMotorClient(settings.MONGODB_URL)
+    database = client[settings.DATABASE_NAME]
+
+    missing = await missing_indexes(database)
+    for name, keys in missing.items():
+        for key in keys:
+            print(f"missing index on {name}: {key}")
+    if not missing:
+        print("All declared indexes exist")
+
+    dupes = await duplicates(database)
+    for field, rows in dupes.items():
+        print(f"duplicate values for unique {field}: {rows}")
+    if dupes:
+        print("Resolve the duplicates above before building unique indexes")
+        return 1
+
+    await backfill_locations(database, check_only)
+    await mark_rolled_up(database, check_only)
+    await fold_stitch_frames(database, check_only)
+
+    if not check_only and missing:
+        # init_beanie creates every declared index that is not there yet
+        print("Building indexes...")
+        await init_beanie(database=database, document_models=DOCUMENT_MODELS)
+        still_missing = await missing_indexes(database)
+        if still_missing:
+            print(f"Indexes still missing after build: {still_missing}")
+            return 1
+        print("Indexes built")
+
+    if not (await missing_indexes(database)):
+        await drop_retired(database, check_only)
+
+    print("Query plans:")
+    await explain_hot_queries(database)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="report only, build nothing")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.check)))
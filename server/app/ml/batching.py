@@ -0,0 +1,113 @@
+"""
+Dynamic micro-batching in front of the inference pool.
+
+Requests that arrive within `window_ms` of each other (up to `max_batch_size`)
+are sent to a worker as one batched `predict` call, and each caller gets its
+own Detections back. With max_batch_size=1 requests go straight to the pool.
+Dispatch tasks are kept referenced until they finish, since the event loop
+holds tasks only weakly and a collected one would leave its callers waiting.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Dict, List, Set, Tuple
+
+from config import settings
+from services.pool import WorkerPool, summarize_latencies
+from ml.inference import Detections, inference_pool, predict_batch, predict_image
+
+
+class MicroBatcher:
+    def __init__(self, pool: WorkerPool, max_batch_size: int, window_ms: float, history: int = 512):
+        self.pool = pool
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = max(0.0, window_ms) / 1000.0
+
+        # One open batch per (conf, iou) - only identical settings can share a predict call
+        self._open: Dict[Tuple[float, float], List[Tuple[bytes, asyncio.Future, float]]] = {}
+        self._timers: Dict[Tuple[float, float], asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+        self._batches = 0
+        self._images = 0
+        self._batch_sizes = deque(maxlen=history)
+        self._window_waits = deque(maxlen=history)
+
+    async def predict(self, contents: bytes, conf: float = 0.2, iou: float = 0.3) -> Detections:
+        if self.max_batch_size == 1:
+            self._record([time.monotonic()])
+            return await self.pool.run(predict_image, contents, conf, iou)
+
+        loop = asyncio.get_running_loop()
+        key = (conf, iou)
+        future = loop.create_future()
+        batch = self._open.setdefault(key, [])
+        batch.append((contents, future, time.monotonic()))
+
+        if len(batch) >= self.max_batch_size:
+            self._flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+
+        return await future
+
+    def _flush(self, key: Tuple[float, float]) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._open.pop(key, None)
+        if batch:
+            task = asyncio.ensure_future(self._dispatch(key, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def stop(self) -> None:
+        """Send the open batches and wait for every batch in flight"""
+        for key in list(self._open):
+            self._flush(key)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _dispatch(self, key: Tuple[float, float], batch) -> None:
+        self._record([queued_at for _, _, queued_at in batch])
+        conf, iou = key
+        try:
+            results = await self.pool.run(predict_batch, [contents for contents, _, _ in batch], conf, iou)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        # An undecodable image fails only its own request
+        for (_, future, _), detections in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(detections, Exception):
+                future.set_exception(detections)
+            else:
+                future.set_result(detections)
+
+    def _record(self, queued_at: List[float]) -> None:
+        now = time.monotonic()
+        self._batches += 1
+        self._images += len(queued_at)
+        self._batch_sizes.append(len(queued_at))
+        self._window_waits.extend(now - t for t in queued_at)
+
+    def stats(self) -> Dict:
+        sizes = list(self._batch_sizes)
+        return {
+            "max_batch_size": self.max_batch_size,
+            "window_ms": round(self.window * 1000, 2),
+            "batches": self._batches,
+            "images": self._images,
+            "avg_batch_size": round(sum(sizes) / len(sizes), 2) if sizes else 0.0,
+            "window_wait_ms": summarize_latencies(self._window_waits)
+        }
+
+
+yolo_batcher = MicroBatcher(
+    inference_pool,
+    max_batch_size=settings.BATCH_MAX_SIZE,
+    window_ms=settings.BATCH_WINDOW_MS
+)
@@ -0,0 +1,121 @@
+"""
+Export best.pt to ONNX for the CPU runtime, optionally with static INT8
+quantization calibrated on real shelf photos. Needs the export extras:
+
+    pip install -r server/requirements-export.txt
+    cd server/app
+    python -m ml.export                                   # ml/models/best.onnx
+    python -m ml.export --int8 --calibration-dir shelves/  # + ml/models/best.int8.onnx
+
+Then set MODEL_BACKEND=onnx or MODEL_BACKEND=onnx-int8.
+"""
+import argparse
+import glob
+import os
+import shutil
+
+import numpy as np
+from PIL import Image
+
+from ml.inference import MODEL_FILES, models_dir
+
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png")
+
+
+def export_onnx(weights: str, output: str, imgsz: int, opset: int) -> str:
+    from ultralytics import YOLO
+
+    # Dynamic axes so the micro-batcher and sliced inference can send batches
+    exported = YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True, opset=opset)
+    if os.path.abspath(exported) != os.path.abspath(output):
+        shutil.move(exported, output)
+    return output
+
+
+def letterbox(image: Image.Image, size: int) -> np.ndarray:
+    """Resize + pad the way ultralytics preprocesses, as a (1, 3, size, size) float32 tensor"""
+    scale = min(size / image.width, size / image.height)
+    resized = image.resize((round(image.width * scale), round(image.height * scale)), Image.BILINEAR)
+    canvas = Image.new("RGB", (size, size), (114, 114, 114))
+    canvas.paste(resized, ((size - resized.width) // 2, (size - resized.height) // 2))
+    return (np.asarray(canvas, dtype=np.float32) / 255.0).transpose(2, 0, 1)[None]
+
+
+class ShelfCalibrationReader:
+    """Feeds calibration images to onnxruntime's static quantizer"""
+
+    def __init__(self, input_name: str, paths, imgsz: int):
+        self.input_name = input_name
+        self.paths = iter(paths)
+        self.imgsz = imgsz
+
+    def get_next(self):
+        path = next(self.paths, None)
+        if path is None:
+            return None
+        return {self.input_name: letterbox(Image.open(path).convert("RGB"), self.imgsz)}
+
+
+def quantize_int8(fp32_path: str, output: str, calibration_dir: str, imgsz: int, limit: int) -> str:
+    import onnx
+    import onnxruntime
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+    paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(calibration_dir, pattern)))
+    if not paths:
+        raise SystemExit(f"No calibration images found in {calibration_dir}")
+    paths = paths[:limit]
+
+    session = onnxruntime.InferenceSession(fp32_path, providers=["CPUExecutionProvider"])
+    reader = ShelfCalibrationReader(session.get_inputs()[0].name, paths, imgsz)
+
+    quantize_static(
+        fp32_path,
+        output,
+        reader,
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        calibrate_method=CalibrationMethod.MinMax
+    )
+
+    # ultralytics reads class names, stride and imgsz from the model metadata
+    fp32 = onnx.load(fp32_path, load_external_data=False)
+    int8 = onnx.load(output)
+    del int8.metadata_props[:]
+    int8.metadata_props.extend(fp32.metadata_props)
+    onnx.save(int8, output)
+
+    print(f"Calibrated on {len(paths)} image(s)")
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default=os.path.join(models_dir, MODEL_FILES["pytorch"]))
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--int8", action="store_true", help="also write a statically quantized INT8 model")
+    parser.add_argument("--calibration-dir", help="folder of representative shelf photos for --int8")
+    parser.add_argument("--calibration-limit", type=int, default=200)
+    args = parser.parse_args()
+
+    fp32_path = export_onnx(args.weights, os.path.join(models_dir, MODEL_FILES["onnx"]), args.imgsz, args.opset)
+    print(f"ONNX FP32 model: {fp32_path}")
+
+    if args.int8:
+        if not args.calibration_dir:
+            parser.error("--int8 needs --calibration-dir")
+        int8_path = quantize_int8(
+            fp32_path,
+            os.path.join(models_dir, MODEL_FILES["onnx-int8"]),
+            args.calibration_dir,
+            args.imgsz,
+            args.calibration_limit
+        )
+        print(f"ONNX INT8 model: {int8_path}")
+
+
+if __name__ == "__main__":
+    main()
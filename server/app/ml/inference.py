@@ -0,0 +1,205 @@
+"""
+YOLO inference that runs inside the worker processes of `inference_pool`.
+
+Each worker loads best.pt once (via the pool initializer) and returns plain
+numpy detections so results can be pickled back to the API process.
+"""
+import hashlib
+import io
+import os
+from dataclasses import dataclass
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from config import settings
+from ml.tiling import nms, tile_grid
+from services.pool import WorkerPool
+
+# Get the current file's directory and construct the model paths
+current_dir = os.path.dirname(os.path.abspath(__file__))
+models_dir = os.path.join(current_dir, "models")
+
+# MODEL_BACKEND -> weights file; the ONNX files are produced by `python -m ml.export`
+MODEL_FILES = {
+    "pytorch": "best.pt",
+    "onnx": "best.onnx",
+    "onnx-int8": "best.int8.onnx"
+}
+
+if settings.MODEL_BACKEND not in MODEL_FILES:
+    raise ValueError(f"Unknown MODEL_BACKEND: {settings.MODEL_BACKEND}")
+model_path = os.path.join(models_dir, MODEL_FILES[settings.MODEL_BACKEND])
+
+# Loaded once per worker process - LAZY LOADING
+yolo_model = None
+_model_version = None
+
+
+@dataclass
+class Detections:
+    """Detections for one image, detached from torch so they can cross processes"""
+    xyxy: np.ndarray  # (N, 4) float32, pixel coordinates
+    conf: np.ndarray  # (N,) float32
+    cls: np.ndarray  # (N,) int32
+    names: Dict[int, str]
+    shape: Tuple[int, int]  # (height, width) of the source image
+    tiling: Optional[Dict[str, Any]] = None  # per-tile report for sliced inference
+
+    def __len__(self) -> int:
+        return len(self.xyxy)
+
+
+def get_yolo_model():
+    global yolo_model
+    if yolo_model is None:
+        from ultralytics import YOLO
+        # task is stored in .pt checkpoints but has to be given for ONNX files
+        yolo_model = YOLO(model_path, task="detect")
+    return yolo_model
+
+
+def model_version() -> str:
+    """Identifies the weights in cache keys so a model update invalidates old results"""
+    global _model_version
+    if _model_version is None:
+        if settings.MODEL_VERSION:
+            _model_version = settings.MODEL_VERSION
+        elif os.path.exists(model_path):
+            digest = hashlib.sha256()
+            with open(model_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            _model_version = f"{settings.MODEL_BACKEND}-{digest.hexdigest()[:12]}"
+        else:
+            _model_version = f"{settings.MODEL_BACKEND}-unknown"
+    return _model_version
+
+
+def load_model() -> None:
+    """Pool initializer: pay the model load once per worker, not per request"""
+    get_yolo_model()
+
+
+def decode_image(contents: bytes) -> np.ndarray:
+    """RGB pixels; raises ValueError if the bytes are not an image"""
+    try:
+        return np.array(Image.open(io.BytesIO(contents)).convert("RGB"))
+    except Exception:
+        raise ValueError("Could not decode image")
+
+
+def to_detections(result) -> Detections:
+    boxes = result.boxes
+    return Detections(
+        xyxy=boxes.xyxy.cpu().numpy().astype(np.float32),
+        conf=boxes.conf.cpu().numpy().astype(np.float32),
+        cls=boxes.cls.cpu().numpy().astype(np.int32),
+        names=dict(result.names),
+        shape=tuple(result.orig_shape[:2])
+    )
+
+
+def predict_batch(
+    contents_list: List[bytes], conf: float = 0.2, iou: float = 0.3
+) -> List[Union[Detections, ValueError]]:
+    """
+    Decode and detect a batch of images in one predict call (runs in a worker
+    process). An image that does not decode gets its ValueError in its own
+    slot; the rest of the batch is still detected.
+    """
+    outputs: List[Union[Detections, ValueError]] = []
+    images = []
+    for contents in contents_list:
+        try:
+            images.append(decode_image(contents))
+            outputs.append(None)
+        except ValueError as e:
+            outputs.append(e)
+    if images:
+        results = iter(get_yolo_model().predict(images, conf=conf, iou=iou, verbose=False))
+        outputs = [to_detections(next(results)) if output is None else output for output in outputs]
+    return outputs
+
+
+def predict_image(contents: bytes, conf: float = 0.2, iou: float = 0.3) -> Detections:
+    """Single-image path, used when batching is disabled; raises ValueError for non-images"""
+    output = predict_batch([contents], conf, iou)[0]
+    if isinstance(output, ValueError):
+        raise output
+    return output
+
+
+def predict_sliced(
+    contents: bytes,
+    conf: float = 0.2,
+    iou: float = 0.3,
+    tile_size: int = 640,
+    overlap: float = 0.2,
+    merge_threshold: float = 0.5
+) -> Detections:
+    """
+    Sliced inference (runs in a worker process): overlapping tiles plus the
+    full frame go through the model as one batch, tile boxes are shifted
+    back to image coordinates, and duplicates across tiles are merged with
+    class-aware NMS. The batch is timed as a whole (the model only reports
+    per-image averages for a batch), along with each tile's box count, so
+    tile settings can be tuned against CPU cost.
+    """
+    image = decode_image(contents)
+    height, width = image.shape[:2]
+    windows = tile_grid(height, width, tile_size, overlap)
+
+    # The full frame keeps facings larger than a tile intact
+    crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in windows] + [image]
+    offsets = np.vstack([windows[:, :2], [[0, 0]]])
+    predict_started = time.perf_counter()
+    results = get_yolo_model().predict(crops, conf=conf, iou=iou, verbose=False)
+    predict_ms = 1000 * (time.perf_counter() - predict_started)
+
+    merge_started = time.perf_counter()
+    parts = [to_detections(result) for result in results]
+    xyxy = np.concatenate([
+        part.xyxy + np.tile(offset, 2).astype(np.float32) for part, offset in zip(parts, offsets)
+    ]).reshape(-1, 4)
+    scores = np.concatenate([part.conf for part in parts])
+    classes = np.concatenate([part.cls for part in parts])
+    keep = nms(xyxy, scores, classes, merge_threshold)
+    merge_ms = 1000 * (time.perf_counter() - merge_started)
+
+    tiles = [
+        {"window": [int(v) for v in window], "boxes": len(part)}
+        for window, part in zip(list(windows) + [np.array([0, 0, width, height])], parts)
+    ]
+    speed = results[0].speed
+    tiling = {
+        "tile_size": tile_size,
+        "overlap": overlap,
+        "tiles": tiles,  # last entry is the full frame
+        "predict_ms": round(predict_ms, 2),
+        # Averages per crop over the batch, as the model reports them
+        "preprocess_ms_per_crop": round(speed.get("preprocess", 0.0), 2),
+        "inference_ms_per_crop": round(speed.get("inference", 0.0), 2),
+        "postprocess_ms_per_crop": round(speed.get("postprocess", 0.0), 2),
+        "boxes_before_merge": len(xyxy),
+        "merge_ms": round(merge_ms, 2)
+    }
+
+    return Detections(
+        xyxy=xyxy[keep],
+        conf=scores[keep],
+        cls=classes[keep],
+        names=parts[0].names,
+        shape=(height, width),
+        tiling=tiling
+    )
+
+
+inference_pool = WorkerPool(
+    "inference",
+    max_workers=settings.INFERENCE_WORKERS,
+    max_queue=settings.INFERENCE_QUEUE_SIZE,
+    initializer=load_model
+)
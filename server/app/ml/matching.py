@@ -0,0 +1,105 @@
+"""
+Text matching between brand search terms and OCR words.
+
+MatchEngine normalizes the search terms once, deduplicates the OCR words
+and scores every (term, unique word) pair with rapidfuzz's compiled scorers
+in a single cdist call per method, using the match threshold as a cutoff.
+"""
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+from rapidfuzz import fuzz, process
+from rapidfuzz.utils import default_process
+
+_SPECIAL_CHARS = re.compile(r'[^\w\s-]')
+_WHITESPACE = re.compile(r'\s+')
+
+# Scorers in tie-break order: the first method reaching the best score wins.
+# Like fuzzywuzzy, the token scorers also see lower-cased, punctuation-free text.
+METHODS = ['ratio', 'partial', 'token_sort', 'token_set']
+SCORERS = [fuzz.ratio, fuzz.partial_ratio, fuzz.token_sort_ratio, fuzz.token_set_ratio]
+PROCESSED = [False, False, True, True]
+SUBSTRING = len(METHODS)  # method index reported when only the substring fallback matched
+
+
+def clean_text(text):
+    """Clean and preprocess text for better matching"""
+    # Remove special characters, extra spaces, and normalize
+    text = _SPECIAL_CHARS.sub('', text)
+    text = _WHITESPACE.sub(' ', text)
+    return text.strip().upper()
+
+
+def method_name(index: int) -> str:
+    return METHODS[index] if index < len(METHODS) else "substring"
+
+
+def fuzzy_match_text(search_text, detected_text, threshold=60):
+    """
+    Advanced fuzzy matching with multiple methods
+    Returns (is_match, best_score, method_used)
+    """
+    search_clean = clean_text(search_text)
+    detected_clean = clean_text(detected_text)
+
+    scores = [
+        round(scorer(search_clean, detected_clean, processor=default_process if processed else None))
+        for scorer, processed in zip(SCORERS, PROCESSED)
+    ]
+    best = int(np.argmax(scores))
+    return scores[best] >= threshold, scores[best], METHODS[best]
+
+
+class MatchEngine:
+    """
+    Scores a fixed set of search terms against batches of OCR words.
+
+    `match` returns (is_match, best_score, method_index) arrays of shape
+    (len(search_texts), len(words)) with the same semantics as calling
+    fuzzy_match_text plus the substring fallback for every pair, except that
+    scores below the threshold are cut off and reported as 0.
+    """
+
+    def __init__(self, search_texts: List[str], threshold: int = 60):
+        self.search_texts = list(search_texts)
+        self.threshold = threshold
+        self._queries = [clean_text(text) for text in self.search_texts]
+        self._processed_queries = [default_process(query) for query in self._queries]
+        self._upper = [text.upper() for text in self.search_texts]
+
+    def match(self, words: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        shape = (len(self.search_texts), len(words))
+        if not shape[0] or not shape[1]:
+            return np.zeros(shape, dtype=bool), np.zeros(shape, dtype=np.int32), np.zeros(shape, dtype=np.int32)
+
+        # Shelf OCR repeats the same few brand words many times; score each once
+        unique: Dict[str, int] = {}
+        inverse = np.array([unique.setdefault(word, len(unique)) for word in words], dtype=np.int64)
+        unique_words = list(unique)
+        choices = [clean_text(word) for word in unique_words]
+        processed_choices = [default_process(choice) for choice in choices]
+
+        scores = np.stack([
+            process.cdist(
+                self._processed_queries if processed else self._queries,
+                processed_choices if processed else choices,
+                # Half a point below so scores that round up to the threshold still count
+                scorer=scorer, dtype=np.int32, score_cutoff=self.threshold - 0.5, workers=1
+            )
+            for scorer, processed in zip(SCORERS, PROCESSED)
+        ])
+        method_index = scores.argmax(axis=0).astype(np.int32)
+        best_score = scores.max(axis=0)
+        is_match = best_score >= self.threshold
+
+        # Fallback: simple substring matching as backup
+        upper_words = [word.upper() for word in unique_words]
+        substring = np.array(
+            [[search in word for word in upper_words] for search in self._upper],
+            dtype=bool
+        )
+        method_index[substring & ~is_match] = SUBSTRING
+        is_match |= substring
+
+        return is_match[:, inverse], best_score[:, inverse], method_index[:, inverse]
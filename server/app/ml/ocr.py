@@ -0,0 +1,172 @@
+"""
+OCR backends for shelf images.
+
+All backends take the raw uploaded bytes and return the words they read, so
+OCR can run alongside YOLO instead of waiting for it. Pick one with
+OCR_BACKEND: "textract" (AWS, paid per call), "easyocr" (local CPU) or
+"static" (deterministic stand-in for tests and offline development).
+"""
+import io
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from config import settings
+
+
+class OCRError(Exception):
+    """Raised when a backend fails to read an image"""
+
+
+@dataclass
+class OCRWord:
+    text: str
+    confidence: float  # 0-100
+    bbox: Optional[Tuple[float, float, float, float]] = None  # xyxy, normalized to 0-1
+
+
+class OCRBackend(ABC):
+    name = "base"
+
+    def __init__(self, min_confidence: float = 50):
+        self.min_confidence = min_confidence
+
+    @abstractmethod
+    def extract(self, image_bytes: bytes) -> List[OCRWord]:
+        """Blocking; call from a thread, not the event loop"""
+
+
+class TextractOCR(OCRBackend):
+    name = "textract"
+
+    def __init__(self, region_name: str, min_confidence: float = 50):
+        super().__init__(min_confidence)
+        self.region_name = region_name
+        self._client = None
+
+    def get_client(self):
+        if self._client is None:
+            import boto3
+            # AWS credentials should be set via environment variables:
+            # AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY
+            self._client = boto3.client(
+                'textract',
+                region_name=self.region_name,
+                aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
+                aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY')
+            )
+        return self._client
+
+    def extract(self, image_bytes: bytes) -> List[OCRWord]:
+        try:
+            response = self.get_client().detect_document_text(
+                Document={'Bytes': image_bytes}
+            )
+        except Exception as e:
+            raise OCRError(f"Textract error: {str(e)}")
+
+        words = []
+        for item in response['Blocks']:
+            if item['BlockType'] != 'WORD' or item['Confidence'] <= self.min_confidence:
+                continue
+            box = item['Geometry']['BoundingBox']
+            words.append(OCRWord(
+                text=item['Text'],
+                confidence=item['Confidence'],
+                bbox=(box['Left'], box['Top'], box['Left'] + box['Width'], box['Top'] + box['Height'])
+            ))
+        return words
+
+
+class EasyOCRBackend(OCRBackend):
+    name = "easyocr"
+
+    def __init__(self, languages: List[str], min_confidence: float = 50):
+        super().__init__(min_confidence)
+        self.languages = languages
+        self._reader = None
+
+    def get_reader(self):
+        if self._reader is None:
+            import easyocr
+            self._reader = easyocr.Reader(self.languages, gpu=False)
+        return self._reader
+
+    def extract(self, image_bytes: bytes) -> List[OCRWord]:
+        try:
+            image = np.array(Image.open(io.BytesIO(image_bytes)).convert("RGB"))
+            detections = self.get_reader().readtext(image)
+        except Exception as e:
+            raise OCRError(f"EasyOCR error: {str(e)}")
+
+        height, width = image.shape[:2]
+        words = []
+        for points, text, confidence in detections:
+            confidence = float(confidence) * 100
+            if confidence <= self.min_confidence:
+                continue
+            xs = [p[0] / width for p in points]
+            ys = [p[1] / height for p in points]
+            words.extend(split_line(text, confidence, (min(xs), min(ys), max(xs), max(ys))))
+        return words
+
+
+def split_line(text: str, confidence: float, bbox: Tuple[float, float, float, float]) -> List[OCRWord]:
+    """
+    easyocr returns text lines; split them into words like Textract's, giving
+    each word the slice of the line box proportional to its character span
+    """
+    x1, y1, x2, y2 = bbox
+    per_char = (x2 - x1) / max(len(text), 1)
+    words = []
+    position = 0
+    for token in text.split():
+        start = text.index(token, position)
+        position = start + len(token)
+        words.append(OCRWord(
+            text=token,
+            confidence=confidence,
+            bbox=(x1 + start * per_char, y1, x1 + position * per_char, y2)
+        ))
+    return words
+
+
+class StaticOCR(OCRBackend):
+    """
+    Returns the same words for every image, laid out left to right across
+    the middle of the frame so word-to-box association is deterministic too
+    """
+    name = "static"
+
+    def __init__(self, words: List[str]):
+        super().__init__(min_confidence=0)
+        self.words = words
+
+    def extract(self, image_bytes: bytes) -> List[OCRWord]:
+        step = 1.0 / max(len(self.words), 1)
+        return [
+            OCRWord(text=word, confidence=100.0, bbox=(i * step, 0.45, (i + 1) * step, 0.55))
+            for i, word in enumerate(self.words)
+        ]
+
+
+_backend: Optional[OCRBackend] = None
+
+
+def get_ocr_backend() -> OCRBackend:
+    global _backend
+    if _backend is None:
+        name = settings.OCR_BACKEND
+        if name == "textract":
+            _backend = TextractOCR(settings.AWS_REGION, settings.OCR_MIN_CONFIDENCE)
+        elif name == "easyocr":
+            _backend = EasyOCRBackend(settings.OCR_LANGUAGES, settings.OCR_MIN_CONFIDENCE)
+        elif name == "static":
+            _backend = StaticOCR(settings.OCR_STATIC_WORDS)
+        else:
+            raise ValueError(f"Unknown OCR_BACKEND: {name}")
+    return _backend
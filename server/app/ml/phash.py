@@ -0,0 +1,37 @@
+"""
+Perceptual hashes of shelf photos.
+
+The photo is decoded at reduced scale (JPEG draft mode), shrunk to 32x32
+grey levels and transformed with a 2-D DCT; the 8x8 lowest frequencies,
+compared with their median, give a 64-bit hash. Two shots of the same
+shelf from nearly the same spot differ in only a few bits, while byte
+hashes of them have nothing in common.
+"""
+from typing import BinaryIO
+
+import numpy as np
+from PIL import Image
+from scipy.fft import dctn
+
+HASH_SIZE = 8
+SAMPLE_SIZE = 4 * HASH_SIZE
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+
+def perceptual_hash(fp: BinaryIO) -> int:
+    """64-bit pHash of an image file; raises ValueError if it isn't an image"""
+    try:
+        with Image.open(fp) as image:
+            image.draft("L", (SAMPLE_SIZE * 2, SAMPLE_SIZE * 2))
+            pixels = np.asarray(image.convert("L").resize((SAMPLE_SIZE, SAMPLE_SIZE), Image.BILINEAR), dtype=np.float64)
+    except Exception:
+        raise ValueError("Could not decode image")
+
+    low = dctn(pixels, norm="ortho")[:HASH_SIZE, :HASH_SIZE].ravel()
+    # The DC term is overall brightness; leave it out of the threshold
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
@@ -0,0 +1,129 @@
+"""
+Planogram compliance by optimal assignment.
+
+A planogram is compiled once into flat arrays with one row per expected
+facing: its slot, its expected place on the photo and its SKU. Detected
+boxes are placed in the same unit square (relative to the extent of all
+boxes, so framing and distance to the shelf do not matter). The cost of
+filling facing i with box j adds the offset between expected and observed
+place to how badly the box text reads as the facing's SKU, for all pairs
+at once. linear_sum_assignment then pairs facings with boxes; every facing
+may instead take a "missing" column, so no pair costs more than MISSING_COST.
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from ml.matching import MatchEngine
+
+SHELF_WEIGHT = 2.0  # a shelf off weighs more than the same distance along the shelf
+SKU_MISMATCH_COST = 1.0
+UNREADABLE_COST = 0.5  # a box without text may still be the right product
+MISSING_COST = 1.5
+
+
+class CompiledPlanogram:
+    def __init__(self, planogram_id: str, slots: Sequence, min_compliance: float, threshold: int = 60):
+        """`slots` have shelf, position, sku and facings; raises ValueError on an unusable grid"""
+        self.planogram_id = planogram_id
+        self.min_compliance = min_compliance
+        self.slots = sorted(slots, key=lambda slot: (slot.shelf, slot.position))
+        if not self.slots:
+            raise ValueError("Planogram has no slots")
+        seen = set()
+        for slot in self.slots:
+            if (slot.shelf, slot.position) in seen:
+                raise ValueError(f"Duplicate slot: shelf {slot.shelf}, position {slot.position}")
+            seen.add((slot.shelf, slot.position))
+
+        # Shelf numbers may skip (e.g. an empty bottom shelf); only their order counts
+        shelves = sorted({slot.shelf for slot in self.slots})
+        shelf_rank = {shelf: rank for rank, shelf in enumerate(shelves)}
+        self.skus = sorted({slot.sku for slot in self.slots})
+        sku_index = {sku: i for i, sku in enumerate(self.skus)}
+
+        unit_slot, unit_x, unit_y, unit_sku = [], [], [], []
+        for shelf in shelves:
+            on_shelf = [i for i, slot in enumerate(self.slots) if slot.shelf == shelf]
+            width = sum(self.slots[i].facings for i in on_shelf)
+            offset = 0
+            for i in on_shelf:
+                slot = self.slots[i]
+                for facing in range(slot.facings):
+                    unit_slot.append(i)
+                    unit_x.append((offset + facing + 0.5) / width)
+                    unit_y.append((shelf_rank[shelf] + 0.5) / len(shelves))
+                    unit_sku.append(sku_index[slot.sku])
+                offset += slot.facings
+
+        self.unit_slot = np.array(unit_slot, dtype=np.int64)
+        self.unit_x = np.array(unit_x, dtype=np.float64)
+        self.unit_y = np.array(unit_y, dtype=np.float64)
+        self.unit_sku = np.array(unit_sku, dtype=np.int64)
+        self.engine = MatchEngine(self.skus, threshold)
+
+    @property
+    def facings(self) -> int:
+        return len(self.unit_slot)
+
+    def cost_matrix(self, boxes: np.ndarray, texts: List[Optional[str]]):
+        """(facings x boxes) costs and the per-pair verdict: 1 right SKU, 0 unreadable, -1 wrong"""
+        x_lo, y_lo = boxes[:, 0].min(), boxes[:, 1].min()
+        x_span = max(boxes[:, 2].max() - x_lo, 1e-6)
+        y_span = max(boxes[:, 3].max() - y_lo, 1e-6)
+        cx = ((boxes[:, 0] + boxes[:, 2]) / 2 - x_lo) / x_span
+        cy = ((boxes[:, 1] + boxes[:, 3]) / 2 - y_lo) / y_span
+
+        is_match, scores, _ = self.engine.match([text or "" for text in texts])
+        # Substring-only matches carry no fuzzy score; count them as just reaching the threshold
+        similarity = np.where(is_match, np.maximum(scores, self.engine.threshold) / 100.0, 0.0)
+        readable = np.array([bool(text) for text in texts])
+
+        box_similarity = similarity[self.unit_sku]  # (facings, boxes)
+        sku_cost = np.where(readable, SKU_MISMATCH_COST * (1.0 - box_similarity), UNREADABLE_COST)
+        place_cost = np.abs(self.unit_x[:, None] - cx) + SHELF_WEIGHT * np.abs(self.unit_y[:, None] - cy)
+        verdict = np.where(readable, np.where(box_similarity > 0, 1, -1), 0)
+        return place_cost + sku_cost, verdict
+
+    def check(self, boxes: np.ndarray, texts: List[Optional[str]]) -> Dict[str, Any]:
+        """Compliance of one photo; `texts` is the brand label or OCR text of each box"""
+        facings = self.facings
+        unit_state = np.full(facings, -2, dtype=np.int64)  # -2 missing, else the pair verdict
+        placed = 0
+        if len(boxes):
+            costs, verdict = self.cost_matrix(boxes.reshape(-1, 4).astype(np.float64), texts)
+            padded = np.hstack([costs, np.full((facings, facings), MISSING_COST)])
+            rows, cols = linear_sum_assignment(padded)
+            filled = cols < len(boxes)
+            unit_state[rows[filled]] = verdict[rows[filled], cols[filled]]
+            placed = int(filled.sum())
+
+        slot_count = len(self.slots)
+        counts = {
+            state: np.bincount(self.unit_slot[unit_state == value], minlength=slot_count)
+            for state, value in (("found", 1), ("unreadable", 0), ("wrong", -1), ("missing", -2))
+        }
+        found = int(counts["found"].sum())
+        compliance = found / facings
+        return {
+            "planogram_id": self.planogram_id,
+            "compliance": round(compliance, 3),
+            "compliant": compliance >= self.min_compliance,
+            "expected_facings": facings,
+            "found": found,
+            "wrong": int(counts["wrong"].sum()),
+            "unreadable": int(counts["unreadable"].sum()),
+            "missing": int(counts["missing"].sum()),
+            "extra_boxes": len(boxes) - placed,
+            "slots": [
+                {
+                    "shelf": slot.shelf,
+                    "position": slot.position,
+                    "sku": slot.sku,
+                    "facings": slot.facings,
+                    **{state: int(counts[state][i]) for state in counts}
+                }
+                for i, slot in enumerate(self.slots)
+            ]
+        }
@@ -0,0 +1,103 @@
+"""
+Shelf rows from detection boxes.
+
+Box centers are sorted top to bottom and a new row starts wherever
+the step between neighbouring centers exceeds half the smaller of the two
+box heights (products on one shelf share a baseline; the next shelf is at
+least a product height away). Within a row, boxes are ordered left to right
+and any space wider than GAP_FACTOR typical facings, between neighbours or
+to the common left/right edge of all rows, is reported as an empty span.
+Everything is array arithmetic over all boxes; only the report is built
+per row.
+"""
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+ROW_SPLIT = 0.5  # share of the smaller box height two centers may differ by within a row
+GAP_FACTOR = 0.8  # empty space of at least this many facing widths counts as a gap
+
+
+def assign_rows(boxes: np.ndarray) -> np.ndarray:
+    """Row index (0 = top) of every box"""
+    if not len(boxes):
+        return np.zeros(0, dtype=np.int64)
+    centers = (boxes[:, 1] + boxes[:, 3]) / 2
+    heights = boxes[:, 3] - boxes[:, 1]
+    order = np.argsort(centers, kind="stable")
+    steps = np.diff(centers[order])
+    limits = ROW_SPLIT * np.minimum(heights[order][:-1], heights[order][1:])
+    rows = np.empty(len(boxes), dtype=np.int64)
+    rows[order] = np.concatenate([[0], np.cumsum(steps > limits)])
+    return rows
+
+
+def segment_shelves(boxes: np.ndarray, labels: np.ndarray, label_names: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Per-row facings, brand share and empty spans. `labels` holds the index
+    into label_names of the brand matched in each box, or -1.
+    """
+    boxes = boxes.reshape(-1, 4).astype(np.float64)
+    if not len(boxes):
+        return []
+    rows = assign_rows(boxes)
+    row_count = int(rows.max()) + 1
+    left, right = boxes[:, 0].min(), boxes[:, 2].max()
+
+    # Left-to-right within each row; rows[order] is then grouped and sorted
+    order = np.lexsort((boxes[:, 0], rows))
+    sorted_rows = rows[order]
+    starts = np.searchsorted(sorted_rows, np.arange(row_count))
+    ends = np.append(starts[1:], len(order))
+
+    facings = np.bincount(rows, minlength=row_count)
+    widths = boxes[:, 2] - boxes[:, 0]
+    row_width = np.array([np.median(widths[order[s:e]]) for s, e in zip(starts, ends)])
+    row_top = np.full(row_count, np.inf)
+    row_bottom = np.full(row_count, -np.inf)
+    np.minimum.at(row_top, rows, boxes[:, 1])
+    np.maximum.at(row_bottom, rows, boxes[:, 3])
+
+    # Space before each box: to the furthest right edge so far in its row (a wide
+    # box can overhang a narrower neighbour), or to the common left edge.
+    # Offsetting each row past the previous ones turns one cumulative max into a per-row one.
+    x1 = boxes[order, 0]
+    offset = sorted_rows * (right - left + 1)
+    reach = np.maximum.accumulate(boxes[order, 2] - left + offset) - offset + left
+    previous_end = np.concatenate([[left], reach[:-1]])
+    previous_end[starts] = left
+    gap_start = np.concatenate([previous_end, reach[ends - 1]])
+    gap_end = np.concatenate([x1, np.full(row_count, right)])
+    gap_row = np.concatenate([sorted_rows, np.arange(row_count)])
+    gap_width = gap_end - gap_start
+    is_gap = gap_width >= GAP_FACTOR * row_width[gap_row]
+    gap_facings = np.maximum(1, np.round(gap_width / row_width[gap_row])).astype(np.int64)
+
+    brand_counts = np.zeros((row_count, len(label_names)), dtype=np.int64)
+    labeled = labels >= 0
+    np.add.at(brand_counts, (rows[labeled], labels[labeled]), 1)
+
+    shelves = []
+    for row in range(row_count):
+        in_row = np.flatnonzero(is_gap & (gap_row == row))
+        in_row = in_row[np.argsort(gap_start[in_row], kind="stable")]
+        shelves.append({
+            "shelf": row + 1,
+            "y1": round(float(row_top[row]), 1),
+            "y2": round(float(row_bottom[row]), 1),
+            "facings": int(facings[row]),
+            "brand_share": {
+                label_names[i]: round(int(brand_counts[row, i]) / int(facings[row]), 3)
+                for i in np.flatnonzero(brand_counts[row])
+            },
+            "gaps": [
+                {
+                    "x1": round(float(gap_start[i]), 1),
+                    "x2": round(float(gap_end[i]), 1),
+                    "facings": int(gap_facings[i])
+                }
+                for i in in_row
+            ],
+            "gap_facings": int(gap_facings[in_row].sum())
+        })
+    return shelves
@@ -0,0 +1,116 @@
+"""
+Vectorized word-to-box association.
+
+OCR words are assigned to at most one detection box using a uniform grid
+over the boxes to find candidate pairs, then containment (share of the word
+inside the box) and IoU computed in NumPy. Words that fall outside every box
+stay unassigned.
+"""
+import numpy as np
+
+
+def box_area(boxes: np.ndarray) -> np.ndarray:
+    return np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+
+
+def pairwise_overlap(a: np.ndarray, b: np.ndarray):
+    """Intersection areas and IoU for aligned pairs a[i] <-> b[i]"""
+    x1 = np.maximum(a[:, 0], b[:, 0])
+    y1 = np.maximum(a[:, 1], b[:, 1])
+    x2 = np.minimum(a[:, 2], b[:, 2])
+    y2 = np.minimum(a[:, 3], b[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    union = box_area(a) + box_area(b) - inter
+    iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+    return inter, iou
+
+
+def candidate_pairs(words: np.ndarray, boxes: np.ndarray, cell_size: float):
+    """
+    (word_idx, box_idx) pairs whose word center falls in a grid cell the box
+    covers. Each box is registered in every cell it overlaps; lookup is a
+    sort + searchsorted join on cell ids.
+    """
+    cols = int(np.ceil(max(boxes[:, 2].max(), words[:, 2].max()) / cell_size)) + 1
+
+    # Cells covered by each box
+    bx0 = np.floor(boxes[:, 0] / cell_size).astype(np.int64)
+    by0 = np.floor(boxes[:, 1] / cell_size).astype(np.int64)
+    bx1 = np.floor(boxes[:, 2] / cell_size).astype(np.int64)
+    by1 = np.floor(boxes[:, 3] / cell_size).astype(np.int64)
+    widths = bx1 - bx0 + 1
+    heights = by1 - by0 + 1
+    counts = widths * heights
+
+    box_ids = np.repeat(np.arange(len(boxes)), counts)
+    # Offset of each registration within its box's cell block
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cell_x = np.repeat(bx0, counts) + offsets % np.repeat(widths, counts)
+    cell_y = np.repeat(by0, counts) + offsets // np.repeat(widths, counts)
+    box_cells = cell_y * cols + cell_x
+
+    order = np.argsort(box_cells, kind="stable")
+    box_cells = box_cells[order]
+    box_ids = box_ids[order]
+
+    # Cell of each word center
+    cx = (words[:, 0] + words[:, 2]) / 2
+    cy = (words[:, 1] + words[:, 3]) / 2
+    word_cells = np.floor(cy / cell_size).astype(np.int64) * cols + np.floor(cx / cell_size).astype(np.int64)
+
+    lo = np.searchsorted(box_cells, word_cells, side="left")
+    hi = np.searchsorted(box_cells, word_cells, side="right")
+    per_word = hi - lo
+
+    word_idx = np.repeat(np.arange(len(words)), per_word)
+    starts = np.repeat(lo, per_word)
+    within = np.arange(per_word.sum()) - np.repeat(np.cumsum(per_word) - per_word, per_word)
+    return word_idx, box_ids[starts + within]
+
+
+def assign_words_to_boxes(
+    word_boxes: np.ndarray,
+    det_boxes: np.ndarray,
+    min_containment: float = 0.5
+) -> np.ndarray:
+    """
+    Index of the box each word belongs to, or -1.
+
+    Both inputs are (N, 4) xyxy in the same coordinate space. A word is
+    assigned to the box containing the largest share of its area (ties
+    broken by IoU), provided that share is at least `min_containment`.
+    Candidates are found via the word's center, which is exact for any
+    min_containment >= 0.5.
+    """
+    assignment = np.full(len(word_boxes), -1, dtype=np.int64)
+    if len(word_boxes) == 0 or len(det_boxes) == 0:
+        return assignment
+
+    # Grid cells are indexed from the origin, so keep everything non-negative
+    word_boxes = np.clip(np.asarray(word_boxes, dtype=np.float64), 0, None)
+    det_boxes = np.clip(np.asarray(det_boxes, dtype=np.float64), 0, None)
+
+    # Cells roughly the size of a typical box keep candidate lists short
+    sizes = np.concatenate([det_boxes[:, 2] - det_boxes[:, 0], det_boxes[:, 3] - det_boxes[:, 1]])
+    cell_size = max(float(np.median(sizes)), 1.0)
+
+    word_idx, box_idx = candidate_pairs(word_boxes, det_boxes, cell_size)
+    if len(word_idx) == 0:
+        return assignment
+
+    inter, iou = pairwise_overlap(word_boxes[word_idx], det_boxes[box_idx])
+    word_area = box_area(word_boxes)[word_idx]
+    containment = np.divide(inter, word_area, out=np.zeros_like(inter), where=word_area > 0)
+
+    keep = containment >= min_containment
+    word_idx, box_idx, containment, iou = word_idx[keep], box_idx[keep], containment[keep], iou[keep]
+    if len(word_idx) == 0:
+        return assignment
+
+    # Best pair per word: sort by word, then containment desc, then IoU desc
+    order = np.lexsort((-iou, -containment, word_idx))
+    word_idx, box_idx = word_idx[order], box_idx[order]
+    first = np.ones(len(word_idx), dtype=bool)
+    first[1:] = word_idx[1:] != word_idx[:-1]
+    assignment[word_idx[first]] = box_idx[first]
+    return assignment
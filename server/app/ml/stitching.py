@@ -0,0 +1,143 @@
+"""
+Panorama stitching for multi-photo shelf captures.
+
+Photos are expected in capture order (left to right or right to left) with
+overlap between neighbours. Features are matched on downscaled copies,
+the homographies are lifted back to full resolution, and the frames are
+warped onto one canvas with feathered blending. Runs inside `stitch_pool`
+worker processes because every step is CPU-bound.
+"""
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+from config import settings
+from services.pool import WorkerPool
+
+
+class StitchError(Exception):
+    """Raised when the photos can't be registered into one panorama"""
+
+
+def decode(contents: bytes) -> np.ndarray:
+    image = cv2.imdecode(np.frombuffer(contents, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise StitchError("Could not decode one of the images")
+    return image
+
+
+def scale_matrix(scale: float) -> np.ndarray:
+    return np.diag([scale, scale, 1.0])
+
+
+def pair_homography(features, src: int, dst: int, min_matches: int) -> np.ndarray:
+    """Homography mapping frame `src` onto frame `dst`, in matching-resolution coordinates"""
+    (kp_src, desc_src), (kp_dst, desc_dst) = features[src], features[dst]
+    if desc_src is None or desc_dst is None:
+        raise StitchError(f"No features found in image {src + 1} or {dst + 1}")
+
+    matcher = cv2.BFMatcher(cv2.NORM_L2)
+    good = []
+    for pair in matcher.knnMatch(desc_src, desc_dst, k=2):
+        # Lowe's ratio test
+        if len(pair) == 2 and pair[0].distance < 0.75 * pair[1].distance:
+            good.append(pair[0])
+    if len(good) < min_matches:
+        raise StitchError(f"Images {src + 1} and {dst + 1} do not overlap enough ({len(good)} matches)")
+
+    src_pts = np.float32([kp_src[m.queryIdx].pt for m in good]).reshape(-1, 1, 2)
+    dst_pts = np.float32([kp_dst[m.trainIdx].pt for m in good]).reshape(-1, 1, 2)
+    homography, inliers = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 4.0)
+    if homography is None or inliers.sum() < min_matches:
+        raise StitchError(f"Could not register image {src + 1} onto image {dst + 1}")
+    return homography
+
+
+def feather_mask(height: int, width: int) -> np.ndarray:
+    """Weights that fall off towards the frame edges, so seams blend smoothly"""
+    mask = np.zeros((height, width), dtype=np.uint8)
+    mask[1:-1, 1:-1] = 255
+    weights = cv2.distanceTransform(mask, cv2.DIST_L2, 3)
+    return weights / max(float(weights.max()), 1.0)
+
+
+def stitch_panorama(
+    images: List[bytes],
+    match_width: int = 1000,
+    max_pixels: int = 40_000_000,
+    min_matches: int = 20
+) -> Tuple[bytes, int, int]:
+    """Stitch the photos into one panorama; returns (jpeg_bytes, width, height)"""
+    frames = [decode(contents) for contents in images]
+    if len(frames) == 1:
+        height, width = frames[0].shape[:2]
+        return cv2.imencode(".jpg", frames[0], [cv2.IMWRITE_JPEG_QUALITY, 92])[1].tobytes(), width, height
+
+    # Match on downscaled copies: feature detection cost grows with pixel count
+    sift = cv2.SIFT_create(nfeatures=4000)
+    scales, features = [], []
+    for frame in frames:
+        scale = min(1.0, match_width / frame.shape[1])
+        small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        scales.append(scale)
+        features.append(sift.detectAndCompute(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), None))
+
+    # Chain neighbour homographies onto the middle frame to spread distortion
+    reference = len(frames) // 2
+    to_reference = [None] * len(frames)
+    to_reference[reference] = np.eye(3)
+    for i in range(reference - 1, -1, -1):
+        h_small = pair_homography(features, i, i + 1, min_matches)
+        h_full = np.linalg.inv(scale_matrix(scales[i + 1])) @ h_small @ scale_matrix(scales[i])
+        to_reference[i] = to_reference[i + 1] @ h_full
+    for i in range(reference + 1, len(frames)):
+        h_small = pair_homography(features, i, i - 1, min_matches)
+        h_full = np.linalg.inv(scale_matrix(scales[i - 1])) @ h_small @ scale_matrix(scales[i])
+        to_reference[i] = to_reference[i - 1] @ h_full
+
+    # Canvas bounds from the warped frame corners
+    corners = []
+    for frame, homography in zip(frames, to_reference):
+        h, w = frame.shape[:2]
+        pts = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
+        corners.append(cv2.perspectiveTransform(pts, homography))
+    corners = np.concatenate(corners).reshape(-1, 2)
+    x_min, y_min = np.floor(corners.min(axis=0))
+    x_max, y_max = np.ceil(corners.max(axis=0))
+    canvas_w, canvas_h = int(x_max - x_min), int(y_max - y_min)
+
+    source_pixels = sum(frame.shape[0] * frame.shape[1] for frame in frames)
+    if canvas_w * canvas_h > 4 * source_pixels:
+        raise StitchError("Registration is degenerate (panorama would be far larger than its inputs)")
+
+    # Composite at full resolution unless that exceeds the pixel budget
+    composite_scale = min(1.0, (max_pixels / float(canvas_w * canvas_h)) ** 0.5)
+    canvas_w = max(1, int(canvas_w * composite_scale))
+    canvas_h = max(1, int(canvas_h * composite_scale))
+    offset = scale_matrix(composite_scale) @ np.array([[1, 0, -x_min], [0, 1, -y_min], [0, 0, 1]])
+
+    accumulator = np.zeros((canvas_h, canvas_w, 3), dtype=np.float32)
+    total_weight = np.zeros((canvas_h, canvas_w), dtype=np.float32)
+    for frame, homography in zip(frames, to_reference):
+        warp = offset @ homography
+        weights = feather_mask(*frame.shape[:2]).astype(np.float32)
+        warped = cv2.warpPerspective(frame, warp, (canvas_w, canvas_h), flags=cv2.INTER_LINEAR)
+        warped_weights = cv2.warpPerspective(weights, warp, (canvas_w, canvas_h), flags=cv2.INTER_LINEAR)
+        accumulator += warped.astype(np.float32) * warped_weights[..., None]
+        total_weight += warped_weights
+
+    panorama = accumulator / np.maximum(total_weight, 1e-6)[..., None]
+    panorama = np.clip(panorama, 0, 255).astype(np.uint8)
+
+    ok, encoded = cv2.imencode(".jpg", panorama, [cv2.IMWRITE_JPEG_QUALITY, 92])
+    if not ok:
+        raise StitchError("Could not encode the panorama")
+    return encoded.tobytes(), canvas_w, canvas_h
+
+
+stitch_pool = WorkerPool(
+    "stitch",
+    max_workers=settings.STITCH_WORKERS,
+    max_queue=settings.STITCH_QUEUE_SIZE
+)
@@ -0,0 +1,39 @@
+from beanie import Document, PydanticObjectId
+from pydantic import Field
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from enum import Enum
+from typing import Optional, List, Dict, Any
+from datetime import datetime
+
+class JobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
+class AnalysisJob(Document):
+    id: Optional[PydanticObjectId] = Field(default=None, alias="_id")
+    image_id: str
+    store_id: str
+    user_id: str
+    targets: List[Dict[str, Any]]  # [{"search_text", "expected"}, ...]
+    sliced: bool = False
+    status: JobStatus = JobStatus.queued
+    attempts: int = 0
+    error: Optional[str] = None
+    analysis_id: Optional[str] = None  # ShelfAnalysis written on completion
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Settings:
+        name = "analysis_jobs"
+        indexes = [
+            IndexModel([("status", ASCENDING), ("created_at", ASCENDING)]),
+            IndexModel([("image_id", ASCENDING), ("created_at", DESCENDING)])
+        ]
+        
+    class Config:
+        json_encoders = {
+            datetime: lambda v: v.isoformat()
+        }
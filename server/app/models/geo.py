@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field
+from typing import List, Literal
+from decimal import Decimal
+
+class GeoPoint(BaseModel):
+    """GeoJSON Point, as required by 2dsphere indexes (note: longitude first)"""
+    type: Literal["Point"] = "Point"
+    coordinates: List[float] = Field(min_length=2, max_length=2)  # [longitude, latitude]
+
+    @classmethod
+    def from_lat_lng(cls, latitude: Decimal, longitude: Decimal) -> "GeoPoint":
+        return cls(coordinates=[float(longitude), float(latitude)])
@@ -1,21 +1,70 @@
-from beanie import Document, PydanticObjectId
+from beanie import Document, Insert, PydanticObjectId, Replace, Save, SaveChanges, before_event
 from pydantic import Field
-from typing import Optional
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+from typing import List, Optional
 from datetime import datetime
 from decimal import Decimal
+from models.geo import GeoPoint
 
 class Image(Document):
     id: Optional[PydanticObjectId] = Field(default=None, alias="_id")
     user_id: str  
     store_id: str  
     image_url: str  
+    blob_key: Optional[str] = None  # key in the blob store; shared by identical uploads
+    content_hash: Optional[str] = None  # SHA-256 of the stored bytes
+    phash: Optional[str] = None  # perceptual hash (hex) of analyzed uploads
+    duplicate_of: Optional[str] = None  # recent near-identical upload of the same store
+    analysis_reused: bool = False  # serves duplicate_of's analysis instead of its own
     latitude: Decimal  
     longitude: Decimal  
+    location: Optional[GeoPoint] = None  # same coordinates as GeoJSON, for the 2dsphere index
     upload_time: datetime = Field(default_factory=datetime.utcnow)
     is_deleted: bool = Field(default=False)  
+    deleted_at: Optional[datetime] = None  # start of the restore window; purged by the reaper after it
+    purge_started_at: Optional[datetime] = None  # claimed by the reaper; no longer restorable
+    source_blob_keys: List[str] = Field(default_factory=list)  # blobs of the frames a panorama was stitched from
+    
+    @before_event(Insert, Replace, Save, SaveChanges)
+    def sync_location(self):
+        self.location = GeoPoint.from_lat_lng(self.latitude, self.longitude)
     
     class Settings:
         name = "images"  
+        # History and store listings: equality on the tenant, newest first, live images only.
+        # _id breaks upload_time ties so keyset pages are stable.
+        indexes = [
+            IndexModel(
+                [("user_id", ASCENDING), ("upload_time", DESCENDING), ("_id", DESCENDING)],
+                name="user_id_upload_time_id_live",
+                partialFilterExpression={"is_deleted": False}
+            ),
+            IndexModel(
+                [("store_id", ASCENDING), ("upload_time", DESCENDING), ("_id", DESCENDING)],
+                name="store_id_upload_time_id_live",
+                partialFilterExpression={"is_deleted": False}
+            ),
+            # Reaper: expired soft deletes, and blobs still referenced after a purge
+            IndexModel(
+                [("deleted_at", ASCENDING)],
+                name="deleted_at_deleted",
+                partialFilterExpression={"is_deleted": True}
+            ),
+            IndexModel(
+                [("purge_started_at", ASCENDING)],
+                name="purge_started_at_deleted",
+                partialFilterExpression={"is_deleted": True}
+            ),
+            IndexModel([("blob_key", ASCENDING)]),
+            IndexModel([("source_blob_keys", ASCENDING)]),
+            # Uploads serving another image's analysis, re-homed when that image is purged
+            IndexModel(
+                [("duplicate_of", ASCENDING)],
+                name="duplicate_of_reused",
+                partialFilterExpression={"analysis_reused": True}
+            ),
+            IndexModel([("location", GEOSPHERE)])
+        ]
         
     class Config:
         json_encoders = {
@@ -1,20 +1,32 @@
 from beanie import Document, PydanticObjectId
-from pydantic import Field
-from typing import Optional
+from pydantic import BaseModel, Field
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from typing import List, Optional
 from datetime import datetime
 
+class PlanogramSlot(BaseModel):
+    shelf: int = Field(ge=1)  # 1 = top shelf
+    position: int = Field(ge=1)  # 1 = leftmost slot on the shelf
+    sku: str  # brand/SKU text as printed on the pack
+    facings: int = Field(default=1, ge=1)
+
 class Planogram(Document):
     id: Optional[PydanticObjectId] = Field(default=None, alias="_id")
     store_id: str  
     planogram_name: str  
-    layout_image: str  
+    layout_image: Optional[str] = None  
+    slots: List[PlanogramSlot] = Field(default_factory=list)  # the latest planogram with slots is the store's
     created_by: str  
     created_at: datetime = Field(default_factory=datetime.utcnow)
     
     class Settings:
         name = "planograms"  
+        indexes = [
+            # Current planogram of a store
+            IndexModel([("store_id", ASCENDING), ("created_at", DESCENDING)])
+        ]
         
     class Config:
         json_encoders = {
             datetime: lambda v: v.isoformat()
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,31 @@
+from beanie import Document, PydanticObjectId
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+from typing import Optional
+from datetime import datetime
+
+class DailyRollup(Document):
+    """Running totals of one brand in one store on one day (UTC), updated on every analysis"""
+    id: Optional[PydanticObjectId] = Field(default=None, alias="_id")
+    store_id: str
+    brand: str  # target search_text, upper-cased
+    day: datetime  # midnight UTC
+    city: Optional[str] = None  # lower-cased, from the Store document when it exists
+    analyses: int = 0
+    osa_sum: float = 0.0  # sums of per-analysis OSA / SOS fractions; divide by analyses
+    sos_sum: float = 0.0
+    found_sum: int = 0
+    expected_sum: int = 0
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    class Settings:
+        name = "daily_rollups"
+        indexes = [
+            IndexModel([("store_id", ASCENDING), ("brand", ASCENDING), ("day", ASCENDING)], unique=True),
+            IndexModel([("brand", ASCENDING), ("city", ASCENDING), ("day", ASCENDING)])
+        ]
+        
+    class Config:
+        json_encoders = {
+            datetime: lambda v: v.isoformat()
+        }
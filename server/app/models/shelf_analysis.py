@@ -1,19 +1,34 @@
 from beanie import Document, PydanticObjectId
 from pydantic import Field
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from typing import Optional, Dict, Any
 from datetime import datetime
 
 class ShelfAnalysis(Document):
     id: Optional[PydanticObjectId] = Field(default=None, alias="_id")
-    image_id: str  
+    image_id: Optional[str] = None  # unset for ad-hoc /api/analytics/analyze results
+    cache_key: Optional[str] = None  # content hash used by the result cache
     osa_percent: float  
     sos_percent: float  
     planogram_match: bool  
     analysis_time: datetime = Field(default_factory=datetime.utcnow)
     raw_output_json: Dict[str, Any]  
+    rolled_up_at: Optional[datetime] = None  # metrics added to the daily rollups; cleared when taken back out
+    rollup_removed_by: Optional[str] = None  # purge pass that took them back out
     
     class Settings:
         name = "shelf_analysis"  
+        indexes = [
+            IndexModel([("cache_key", ASCENDING)], sparse=True),
+            # Latest analysis of an image
+            IndexModel([("image_id", ASCENDING), ("analysis_time", DESCENDING)]),
+            # Analyses a purge pass took out of the rollups
+            IndexModel(
+                [("rollup_removed_by", ASCENDING)],
+                name="rollup_removed_by_set",
+                partialFilterExpression={"rollup_removed_by": {"$type": "string"}}
+            )
+        ]
         
     class Config:
         json_encoders = {
@@ -1,22 +1,32 @@
-from beanie import Document, PydanticObjectId
+from beanie import Document, Indexed, Insert, PydanticObjectId, Replace, Save, SaveChanges, before_event
 from pydantic import Field
+from pymongo import GEOSPHERE, IndexModel
 from typing import Optional
 from datetime import datetime
 from decimal import Decimal
+from models.geo import GeoPoint
 
 class Store(Document):
     id: Optional[PydanticObjectId] = Field(default=None, alias="_id")
     name: str
-    store_code: str = Field(unique=True)
+    store_code: Indexed(str, unique=True)
     address: str
     city: str
     state: str
     latitude: Decimal
     longitude: Decimal
+    location: Optional[GeoPoint] = None  # kept in sync with latitude/longitude for the 2dsphere index
     created_at: datetime = Field(default_factory=datetime.utcnow)
     
+    @before_event(Insert, Replace, Save, SaveChanges)
+    def sync_location(self):
+        self.location = GeoPoint.from_lat_lng(self.latitude, self.longitude)
+    
     class Settings:
         name = "stores"  # MongoDB collection name
+        indexes = [
+            IndexModel([("location", GEOSPHERE)])
+        ]
         
     class Config:
         json_encoders = {
@@ -1,4 +1,4 @@
-from beanie import Document, PydanticObjectId
+from beanie import Document, Indexed, PydanticObjectId
 from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
 from enum import Enum
@@ -11,7 +11,7 @@ class UserRole(str, Enum):
 class User(Document):
     id: Optional[PydanticObjectId] = Field(alias="_id", default=None)
     name: str
-    email: EmailStr = Field(..., unique=True)
+    email: Indexed(EmailStr, unique=True)
     password_hash: str
     role: UserRole = UserRole.field_user
     created_at: datetime = Field(default_factory=datetime.utcnow)
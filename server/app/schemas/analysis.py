@@ -0,0 +1,74 @@
+from pydantic import BaseModel
+from typing import Optional, Dict, Any, List
+import json
+from schemas.panogram import PlanogramCompliance
+
+class BoxDetection(BaseModel):
+    x1: float
+    y1: float
+    x2: float
+    y2: float
+    confidence: float
+    class_id: int
+    class_name: str
+    label: Optional[str] = None  # brand matched inside this box
+    text: Optional[str] = None  # OCR words assigned to this box
+
+class TargetSpec(BaseModel):
+    search_text: str
+    expected: int
+
+class TargetResult(BaseModel):
+    search_text: str
+    OSA: float
+    SOS: float
+    found: int
+    expected: int
+
+class GapSpan(BaseModel):
+    x1: float
+    x2: float
+    facings: int  # about how many facings would fit
+
+class ShelfRow(BaseModel):
+    shelf: int  # 1 = top shelf in the photo
+    y1: float
+    y2: float
+    facings: int
+    brand_share: Dict[str, float] = {}  # target -> share of this shelf's facings
+    gaps: List[GapSpan] = []
+    gap_facings: int = 0
+
+class SKUResponse(BaseModel):
+    # Top-level metrics are those of the first target
+    OSA: float
+    SOS: float
+    found: int
+    expected: int
+    total_boxes: int
+    targets: List[TargetResult] = []
+    detections: List[BoxDetection] = []
+    shelves: List[ShelfRow] = []  # detections grouped into shelf rows, top to bottom
+    artifact_id: Optional[str] = None  # fetch the annotated image at /artifacts/{artifact_id}/image
+    tiling: Optional[Dict[str, Any]] = None  # tiles and batch timings when sliced=true
+    planogram: Optional[PlanogramCompliance] = None  # when the store has a planogram
+    cached: bool = False
+
+def parse_targets(targets: Optional[str], expected: Optional[int], search_text: str) -> List[TargetSpec]:
+    """
+    `targets` is a JSON list of {"search_text", "expected"}; without it the
+    single search_text/expected form fields are used. Raises ValueError.
+    """
+    if targets:
+        try:
+            parsed = [TargetSpec(**item) for item in json.loads(targets)]
+        except Exception as e:
+            raise ValueError(f"Invalid targets: {str(e)}")
+    elif expected is not None:
+        parsed = [TargetSpec(search_text=search_text, expected=expected)]
+    else:
+        raise ValueError("Either targets or expected is required")
+
+    if not parsed:
+        raise ValueError("At least one target is required")
+    return parsed
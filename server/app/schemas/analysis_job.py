@@ -0,0 +1,21 @@
+from pydantic import BaseModel
+from typing import Optional, Dict, Any
+from datetime import datetime
+
+class AnalysisStatusResponse(BaseModel):
+    image_id: str
+    status: str  # queued | running | completed | failed
+    job_id: Optional[str] = None
+    error: Optional[str] = None
+    analysis_id: Optional[str] = None
+    reused_from: Optional[str] = None  # near-duplicate image whose analysis this is
+    osa_percent: Optional[float] = None
+    sos_percent: Optional[float] = None
+    planogram_compliance: Optional[bool] = None
+    analysis_time: Optional[datetime] = None
+    result: Optional[Dict[str, Any]] = None  # full SKUResponse once completed
+    
+    class Config:
+        json_encoders = {
+            datetime: lambda v: v.isoformat()
+        }
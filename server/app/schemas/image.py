@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import Optional
+from beanie import PydanticObjectId
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from datetime import datetime
 from decimal import Decimal
 
@@ -25,10 +26,45 @@ class ImageResponse(BaseModel):
     longitude: Decimal
     upload_time: datetime
     is_deleted: bool
+    source_blob_keys: List[str] = []  # stitched panoramas: the stored source frames
+    analysis_job_id: Optional[str] = None  # set when the upload queued an analysis
+    store_resolved: bool = False  # store_id was filled in from the upload coordinates
+    store_distance_m: Optional[float] = None  # upload coordinates to the store, when the store is registered
+    duplicate_of: Optional[str] = None  # near-identical recent upload of the same store
+    analysis_reused: bool = False  # analysis_job_id is duplicate_of's job
     
     class Config:
         from_attributes = True
         json_encoders = {
             datetime: lambda v: v.isoformat(),
             Decimal: lambda v: float(v)
-        }
\ No newline at end of file
+        }
+
+class ImageSummary(BaseModel):
+    """Listing view: only these fields are projected out of Mongo"""
+    id: PydanticObjectId = Field(validation_alias="_id")
+    user_id: str
+    store_id: str
+    image_url: str
+    upload_time: datetime
+    source_blob_keys: List[str] = []
+    
+    class Settings:
+        projection = {
+            "_id": 1,
+            "user_id": 1,
+            "store_id": 1,
+            "image_url": 1,
+            "upload_time": 1,
+            "source_blob_keys": 1
+        }
+    
+    class Config:
+        json_encoders = {
+            datetime: lambda v: v.isoformat()
+        }
+
+class ImagePage(BaseModel):
+    images: List[ImageSummary]
+    total: int  # images in this page
+    next_cursor: Optional[str] = None  # pass as ?cursor= for the next page; null on the last page
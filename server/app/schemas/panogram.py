@@ -1,22 +1,26 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
+from models.panogram import PlanogramSlot
 
 class PlanogramCreate(BaseModel):
     store_id: str
     planogram_name: str
-    layout_image: str
+    layout_image: Optional[str] = None
+    slots: List[PlanogramSlot] = []
     created_by: str
 
 class PlanogramUpdate(BaseModel):
     planogram_name: Optional[str] = None
     layout_image: Optional[str] = None
+    slots: Optional[List[PlanogramSlot]] = None
 
 class PlanogramResponse(BaseModel):
     id: str
     store_id: str
     planogram_name: str
-    layout_image: str
+    layout_image: Optional[str] = None
+    slots: List[PlanogramSlot] = []
     created_by: str
     created_at: datetime
     
@@ -24,4 +28,26 @@ class PlanogramResponse(BaseModel):
         from_attributes = True
         json_encoders = {
             datetime: lambda v: v.isoformat()
-        }
\ No newline at end of file
+        }
+
+class SlotCompliance(BaseModel):
+    shelf: int
+    position: int
+    sku: str
+    facings: int
+    found: int  # facings filled by a box reading as this SKU
+    wrong: int  # filled by a box reading as something else
+    unreadable: int  # filled by a box without legible text
+    missing: int
+
+class PlanogramCompliance(BaseModel):
+    planogram_id: str
+    compliance: float  # found / expected facings
+    compliant: bool
+    expected_facings: int
+    found: int
+    wrong: int
+    unreadable: int
+    missing: int
+    extra_boxes: int  # detections not placed in any slot
+    slots: List[SlotCompliance] = []
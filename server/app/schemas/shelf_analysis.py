@@ -3,7 +3,7 @@ from typing import Optional, Dict, Any
 from datetime import datetime
 
 class ShelfAnalysisCreate(BaseModel):
-    image_id: str
+    image_id: Optional[str] = None
     osa_percent: float
     sos_percent: float
     planogram_match: bool
@@ -17,7 +17,7 @@ class ShelfAnalysisUpdate(BaseModel):
 
 class ShelfAnalysisResponse(BaseModel):
     id: str
-    image_id: str
+    image_id: Optional[str] = None
     osa_percent: float
     sos_percent: float
     planogram_match: bool
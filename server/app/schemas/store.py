@@ -36,4 +36,7 @@ class StoreResponse(BaseModel):
         json_encoders = {
             datetime: lambda v: v.isoformat(),
             Decimal: lambda v: float(v)
-        }
\ No newline at end of file
+        }
+
+class StoreNearby(StoreResponse):
+    distance_m: float
@@ -0,0 +1,205 @@
+"""
+The shelf analysis pipeline shared by the synchronous /api/analytics/analyze
+endpoint and the background analysis jobs.
+
+YOLO and OCR run concurrently on the raw bytes, OCR words are joined to the
+detection boxes they fall in, and every target brand is scored against the
+boxed words at once. Results are cached by content + parameters + model.
+"""
+import asyncio
+import io
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image
+
+from config import settings
+from ml.inference import inference_pool, model_version, predict_sliced
+from ml.batching import yolo_batcher
+from ml.ocr import get_ocr_backend
+from ml.matching import MatchEngine
+from ml.shelves import segment_shelves
+from ml.spatial import assign_words_to_boxes
+from schemas.analysis import BoxDetection, ShelfRow, SKUResponse, TargetResult, TargetSpec
+from services.planogram import planogram_cache
+from services.result_cache import cache_key, result_cache
+
+# Bump when scoring changes so cached results from older logic are not reused
+ANALYSIS_VERSION = 4
+
+# Progress callback: on_event(stage, data) with stage one of
+# decoded | cached | detection | ocr | matched | planogram
+EventCallback = Callable[[str, Dict[str, Any]], None]
+
+
+def image_size(contents: bytes) -> Tuple[int, int]:
+    """(width, height) from the image header; raises ValueError if it isn't an image"""
+    try:
+        with Image.open(io.BytesIO(contents)) as image:
+            return image.size
+    except Exception:
+        raise ValueError("Could not decode image")
+
+
+def to_box_detections(detections, labels, box_words):
+    return [
+        BoxDetection(
+            x1=round(float(x1), 1),
+            y1=round(float(y1), 1),
+            x2=round(float(x2), 1),
+            y2=round(float(y2), 1),
+            confidence=round(float(conf), 3),
+            class_id=int(cls),
+            class_name=detections.names.get(int(cls), str(int(cls))),
+            label=label,
+            text=" ".join(texts) or None
+        )
+        for (x1, y1, x2, y2), conf, cls, label, texts in zip(
+            detections.xyxy, detections.conf, detections.cls, labels, box_words
+        )
+    ]
+
+
+async def analyze(
+    contents: bytes,
+    target_specs: List[TargetSpec],
+    sliced: bool = False,
+    tile_size: int = settings.TILE_SIZE,
+    tile_overlap: float = settings.TILE_OVERLAP,
+    persist: bool = True,
+    on_event: Optional[EventCallback] = None,
+    store_id: Optional[str] = None
+) -> Tuple[SKUResponse, str]:
+    """
+    Run (or fetch from cache) the analysis of one photo; returns the response
+    and its cache key. `persist=False` leaves writing the ShelfAnalysis
+    document to the caller; `on_event` is told as each stage finishes.
+    With a store_id the detections are also checked against the store's
+    planogram (outside the cache, since the photo alone does not decide it).
+    Raises PoolBusyError, OCRError and ValueError for undecodable images.
+    """
+    def emit(stage: str, **data) -> None:
+        if on_event is not None:
+            on_event(stage, data)
+
+    async def check_planogram(response: SKUResponse) -> None:
+        response.planogram = await planogram_cache.check(store_id, response.detections)
+        if response.planogram is not None:
+            emit("planogram", compliance=response.planogram.compliance, compliant=response.planogram.compliant)
+
+    ocr = get_ocr_backend()
+    # Reject non-images before they reach OCR or a shared YOLO batch
+    width, height = await run_in_threadpool(image_size, contents)
+    emit("decoded", width=width, height=height, bytes=len(contents))
+
+    # Identical photo + parameters + model => identical result; skip inference entirely
+    params = {
+        "targets": [t.model_dump() for t in target_specs],
+        "ocr": ocr.name,
+        "tiling": [tile_size, tile_overlap] if sliced else None,
+        "version": ANALYSIS_VERSION
+    }
+    key = await run_in_threadpool(lambda: cache_key(contents, params, model_version()))
+    cached = await result_cache.get(key)
+    if cached is not None:
+        response = SKUResponse(**cached, cached=True)
+        emit("cached", boxes=response.total_boxes)
+        emit("matched", found=response.found, OSA=response.OSA, SOS=response.SOS)
+        await check_planogram(response)
+        return response, key
+
+    # Stage 1 + 2: YOLO and OCR only need the raw bytes, so run them concurrently
+    async def detect():
+        started = time.perf_counter()
+        if sliced:
+            # Tiles of one image already form a batch; no need to wait for other requests
+            result = await inference_pool.run(
+                predict_sliced, contents, 0.2, 0.3, tile_size, tile_overlap, settings.TILE_MERGE_THRESHOLD
+            )
+        else:
+            result = await yolo_batcher.predict(contents, conf=0.2, iou=0.3)
+        elapsed = time.perf_counter() - started
+        emit("detection", boxes=len(result), ms=round(1000 * elapsed, 1))
+        return result, elapsed
+
+    async def read_text():
+        started = time.perf_counter()
+        result = await run_in_threadpool(ocr.extract, contents)
+        elapsed = time.perf_counter() - started
+        emit("ocr", words=len(result), ms=round(1000 * elapsed, 1))
+        return result, elapsed
+
+    started = time.perf_counter()
+    (detections, yolo_time), (words, ocr_time) = await asyncio.gather(detect(), read_text())
+    print(
+        f"Stage timings: yolo {1000 * yolo_time:.0f}ms, {ocr.name} {1000 * ocr_time:.0f}ms, "
+        f"wall {1000 * (time.perf_counter() - started):.0f}ms"
+    )
+
+    num_boxes = len(detections)
+    print(f"{ocr.name} detected {len(words)} text elements:", [word.text for word in words])
+
+    # Spatial join: each word belongs to at most one detection box
+    height, width = detections.shape
+    located = [i for i, word in enumerate(words) if word.bbox is not None]
+    word_boxes = np.array([words[i].bbox for i in located], dtype=np.float64).reshape(-1, 4)
+    word_boxes *= np.array([width, height, width, height], dtype=np.float64)
+    assignment = np.full(len(words), -1, dtype=np.int64)
+    assignment[located] = assign_words_to_boxes(word_boxes, detections.xyxy)
+
+    box_words = [[] for _ in range(num_boxes)]
+    for word, box in zip(words, assignment):
+        if box >= 0:
+            box_words[box].append(word.text)
+
+    # Score all targets against all boxed words at once
+    threshold = 60  # Lowered from 80 to 60
+    inside = np.flatnonzero(assignment >= 0)
+    engine = MatchEngine([t.search_text for t in target_specs], threshold)
+    is_match, scores, _ = engine.match([words[i].text for i in inside])
+
+    # Best matching target per box: a box is one facing of at most one brand,
+    # no matter how many times a brand is printed on it
+    box_scores = np.full((len(target_specs), num_boxes), -1, dtype=np.int32)
+    target_idx, word_idx = np.nonzero(is_match)
+    np.maximum.at(box_scores, (target_idx, assignment[inside][word_idx]), scores[target_idx, word_idx])
+    box_target = np.where(box_scores.max(axis=0, initial=-1) >= 0, box_scores.argmax(axis=0), -1)
+    found = np.bincount(box_target[box_target >= 0], minlength=len(target_specs))
+    box_labels = [target_specs[t].search_text if t >= 0 else None for t in box_target]
+
+    results = []
+    for spec, count in zip(target_specs, found.tolist()):
+        osa = count / spec.expected if spec.expected > 0 else 0.0
+        sos = count / num_boxes if num_boxes > 0 else 0.0
+        print(f"Target '{spec.search_text}': {count} facings (OSA {osa:.3f}, SOS {sos:.3f})")
+        results.append(TargetResult(
+            search_text=spec.search_text,
+            OSA=round(osa, 3),
+            SOS=round(sos, 3),
+            found=count,
+            expected=spec.expected
+        ))
+
+    # Shelf rows come from the same boxes; no extra model pass
+    shelves = segment_shelves(detections.xyxy, box_target, [t.search_text for t in target_specs])
+
+    primary = results[0]
+    emit("matched", found=primary.found, OSA=primary.OSA, SOS=primary.SOS)
+    response = SKUResponse(
+        OSA=primary.OSA,
+        SOS=primary.SOS,
+        found=primary.found,
+        expected=primary.expected,
+        total_boxes=num_boxes,
+        targets=results,
+        detections=to_box_detections(detections, box_labels, box_words),
+        shelves=[ShelfRow(**shelf) for shelf in shelves],
+        tiling=detections.tiling
+    )
+    await result_cache.put(
+        key, response.model_dump(exclude={"cached", "artifact_id"}), primary.OSA, primary.SOS, persist=persist
+    )
+    await check_planogram(response)
+    return response, key
@@ -0,0 +1,102 @@
+"""
+Per-analysis output artifacts.
+
+Each analysis stores its source image and detections under an artifact id.
+The annotated image is only drawn when a client asks for it, at the
+requested width and format, and rendered variants are cached separately.
+Both caches evict least-recently-used entries and expire after a TTL.
+"""
+import io
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+from config import settings
+from services.result_cache import LRUCache
+
+FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+    "webp": ("WEBP", "image/webp")
+}
+
+MATCHED_COLOR = (46, 204, 113)
+OTHER_COLOR = (255, 112, 67)
+
+
+@dataclass
+class Artifact:
+    contents: bytes
+    detections: List[Dict[str, Any]]  # BoxDetection dicts, pixel coordinates
+
+
+class ArtifactStore:
+    def __init__(self, max_items: int, max_renders: int, ttl_seconds: float):
+        self.artifacts = LRUCache(max_items, ttl_seconds)
+        self.renders = LRUCache(max_renders, ttl_seconds)
+        self.render_hits = 0
+        self.render_misses = 0
+
+    def create(self, contents: bytes, detections: List[Dict[str, Any]]) -> str:
+        artifact_id = uuid.uuid4().hex
+        self.artifacts.put(artifact_id, Artifact(contents=contents, detections=detections))
+        return artifact_id
+
+    def get(self, artifact_id: str) -> Optional[Artifact]:
+        return self.artifacts.get(artifact_id)
+
+    def cached_render(self, artifact_id: str, width: Optional[int], fmt: str) -> Optional[bytes]:
+        rendered = self.renders.get((artifact_id, width, fmt))
+        if rendered is None:
+            self.render_misses += 1
+        else:
+            self.render_hits += 1
+        return rendered
+
+    def store_render(self, artifact_id: str, width: Optional[int], fmt: str, rendered: bytes) -> None:
+        self.renders.put((artifact_id, width, fmt), rendered)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "artifacts": len(self.artifacts),
+            "renders": len(self.renders),
+            "render_hits": self.render_hits,
+            "render_misses": self.render_misses
+        }
+
+
+def render_annotated(artifact: Artifact, width: Optional[int], fmt: str) -> Tuple[bytes, str]:
+    """Draw the detections on the source image (blocking; run in a thread)"""
+    pil_format, media_type = FORMATS[fmt]
+    image = Image.open(io.BytesIO(artifact.contents)).convert("RGB")
+
+    scale = 1.0
+    if width and width < image.width:
+        scale = width / image.width
+        image = image.resize((width, max(1, round(image.height * scale))), Image.BILINEAR)
+
+    draw = ImageDraw.Draw(image)
+    line_width = max(1, round(max(image.size) / 400))
+    for box in artifact.detections:
+        xyxy = [box["x1"] * scale, box["y1"] * scale, box["x2"] * scale, box["y2"] * scale]
+        label = box.get("label")
+        color = MATCHED_COLOR if label else OTHER_COLOR
+        draw.rectangle(xyxy, outline=color, width=line_width)
+        caption = f"{label or box['class_name']} {box['confidence']:.2f}"
+        text_box = draw.textbbox((xyxy[0], xyxy[1]), caption)
+        top = max(0, xyxy[1] - (text_box[3] - text_box[1]) - 2)
+        draw.rectangle([xyxy[0], top, xyxy[0] + text_box[2] - text_box[0] + 4, xyxy[1]], fill=color)
+        draw.text((xyxy[0] + 2, top), caption, fill=(255, 255, 255))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=pil_format)
+    return buffer.getvalue(), media_type
+
+
+artifact_store = ArtifactStore(
+    max_items=settings.ARTIFACT_CACHE_SIZE,
+    max_renders=settings.ARTIFACT_RENDER_CACHE_SIZE,
+    ttl_seconds=settings.ARTIFACT_TTL_SECONDS
+)
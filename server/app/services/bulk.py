@@ -0,0 +1,160 @@
+"""
+Bulk analysis of many photos in one request, streamed back as NDJSON.
+
+Images come from a multipart list or a zip archive; both are read lazily,
+one image at a time, from the spooled upload. At most `max_in_flight`
+images are held in memory and in the pipeline at once, so decode, YOLO
+batching and OCR overlap across images while memory stays bounded no
+matter how many photos are sent. Each result line is written as soon as
+its image finishes, so lines can arrive out of upload order; every line
+carries the image's index and filename.
+"""
+import asyncio
+import json
+import os
+import zipfile
+from typing import AsyncIterator, Awaitable, Callable, Iterator, List, Optional, Tuple
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from ml.ocr import OCRError
+from schemas.analysis import TargetSpec
+from services.analysis import analyze
+from services.artifacts import artifact_store
+from services.pool import PoolBusyError
+from services.scheduler import BULK, scheduler
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+Source = Tuple[str, Callable[[], Awaitable[bytes]]]
+
+
+def is_image_name(name: str) -> bool:
+    base = os.path.basename(name)
+    return not base.startswith(".") and base.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def multipart_sources(files: List[UploadFile], max_image_bytes: int) -> Iterator[Source]:
+    for file in files:
+        if not file.filename:
+            continue
+
+        async def read(file=file) -> bytes:
+            # Reading one byte past the limit catches parts whose size was not declared
+            if file.size is not None and file.size > max_image_bytes:
+                raise ValueError(f"Image is larger than {max_image_bytes} bytes")
+            contents = await file.read(max_image_bytes + 1)
+            if len(contents) > max_image_bytes:
+                raise ValueError(f"Image is larger than {max_image_bytes} bytes")
+            return contents
+
+        yield file.filename, read
+
+
+def zip_sources(archive: zipfile.ZipFile, max_image_bytes: int) -> Iterator[Source]:
+    for info in archive.infolist():
+        if info.is_dir() or not is_image_name(info.filename):
+            continue
+
+        async def read(info=info) -> bytes:
+            # Declared size is checked before inflating anything
+            if info.file_size > max_image_bytes:
+                raise ValueError(f"Image is larger than {max_image_bytes} bytes")
+            return await run_in_threadpool(archive.read, info)
+
+        yield info.filename, read
+
+
+async def open_zip(archive: UploadFile) -> zipfile.ZipFile:
+    """Raises ValueError if the upload is not a zip archive"""
+    try:
+        return await run_in_threadpool(zipfile.ZipFile, archive.file)
+    except zipfile.BadZipFile:
+        raise ValueError("archive is not a valid zip file")
+
+
+async def analyze_one(
+    index: int,
+    name: str,
+    read: Callable[[], Awaitable[bytes]],
+    targets: List[TargetSpec],
+    sliced: bool,
+    tile_size: int,
+    tile_overlap: float,
+    store_id: Optional[str],
+    user_id: Optional[str]
+) -> dict:
+    line = {"index": index, "filename": name}
+    try:
+        # Bytes are read only once the image is admitted to the pipeline
+        async with scheduler.slot(store_id, user_id, BULK):
+            contents = await read()
+            response, _ = await analyze(contents, targets, sliced, tile_size, tile_overlap, store_id=store_id)
+    except (PoolBusyError, OCRError, ValueError) as e:
+        line.update(status="failed", error=str(e))
+        return line
+    except Exception as e:
+        print(f"Bulk analysis of {name} failed: {str(e)}")
+        line.update(status="failed", error=f"Analysis failed: {str(e)}")
+        return line
+
+    response.artifact_id = artifact_store.create(contents, [box.model_dump() for box in response.detections])
+    line.update(status="completed", result=response.model_dump())
+    return line
+
+
+async def stream_results(
+    sources: Iterator[Source],
+    targets: List[TargetSpec],
+    sliced: bool,
+    tile_size: int,
+    tile_overlap: float,
+    store_id: Optional[str],
+    user_id: Optional[str],
+    max_in_flight: int,
+    max_images: int
+) -> AsyncIterator[str]:
+    """Yields one JSON line per image as it completes, then a summary line"""
+    pending = set()
+    completed = failed = submitted = 0
+
+    def emit(done) -> List[str]:
+        nonlocal completed, failed
+        lines = []
+        for task in done:
+            line = task.result()
+            if line["status"] == "completed":
+                completed += 1
+            else:
+                failed += 1
+            lines.append(json.dumps(line, default=str) + "\n")
+        return lines
+
+    try:
+        for index, (name, read) in enumerate(sources):
+            if index >= max_images:
+                yield json.dumps({"status": "truncated", "error": f"Only the first {max_images} images are analyzed"}) + "\n"
+                break
+
+            # Bounded window: wait for a slot before reading the next image
+            while len(pending) >= max_in_flight:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for line in emit(done):
+                    yield line
+
+            pending.add(asyncio.create_task(analyze_one(
+                index, name, read, targets, sliced, tile_size, tile_overlap, store_id, user_id
+            )))
+            submitted += 1
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for line in emit(done):
+                yield line
+
+        yield json.dumps({"status": "done", "images": submitted, "completed": completed, "failed": failed}) + "\n"
+    finally:
+        # Client went away: stop the work that is still in flight
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,196 @@
+"""
+Store resolution from upload coordinates.
+
+Store locations are few and change rarely, so they are held in memory
+(reloaded every STORE_CACHE_TTL_SECONDS) and each upload is matched
+against all of them in one vectorized haversine pass, without a database
+round trip. "Stores near me" goes to the 2dsphere index on
+stores.location through $geoNear, which also returns the distances.
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from beanie import PydanticObjectId
+from pydantic import BaseModel, Field
+
+from config import settings
+from models.geo import GeoPoint
+from models.store import Store
+
+EARTH_RADIUS_M = 6_371_008.8
+
+
+class StoreResolutionError(Exception):
+    """Upload coordinates do not match a store (none nearby, or not the given one)"""
+
+
+class StoreLocation(BaseModel):
+    id: PydanticObjectId = Field(validation_alias="_id")
+    store_code: str
+    name: str
+    city: str
+    location: GeoPoint
+
+    class Settings:
+        projection = {"_id": 1, "store_code": 1, "name": 1, "city": 1, "location": 1}
+
+
+class StoreMatch(BaseModel):
+    store_id: str
+    store_code: str
+    name: str
+    distance_m: float
+
+
+def valid_coordinates(latitude: float, longitude: float) -> bool:
+    return -90 <= latitude <= 90 and -180 <= longitude <= 180
+
+
+class StoreLocator:
+    def __init__(self, ttl_seconds: float, match_radius_m: float, enforce: bool):
+        self.ttl = ttl_seconds
+        self.match_radius_m = match_radius_m
+        self.enforce = enforce
+        self._lock = asyncio.Lock()
+        self._loaded_at: Optional[float] = None
+
+        self._stores: List[StoreLocation] = []
+        self._rows: Dict[str, int] = {}  # id and store_code -> position in the arrays
+        self._lat = np.empty(0)
+        self._lng = np.empty(0)
+        self._cos_lat = np.empty(0)
+
+        self.reloads = 0
+        self.resolved = 0
+        self.validated = 0
+        self.mismatches = 0
+        self.unmatched = 0
+
+    async def reload(self) -> None:
+        stores = await Store.find(Store.location != None).project(StoreLocation).to_list()
+        coordinates = np.array([store.location.coordinates for store in stores], dtype=np.float64).reshape(-1, 2)
+        self._stores = stores
+        self._rows = {}
+        for row, store in enumerate(stores):
+            self._rows[str(store.id)] = row
+            self._rows[store.store_code] = row
+        self._lng = np.radians(coordinates[:, 0])
+        self._lat = np.radians(coordinates[:, 1])
+        self._cos_lat = np.cos(self._lat)
+        self._loaded_at = time.monotonic()
+        self.reloads += 1
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    async def _fresh(self) -> None:
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return
+        async with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl:
+                await self.reload()
+
+    def _distances(self, latitude: float, longitude: float, rows=slice(None)) -> np.ndarray:
+        """Haversine distance in metres from the point to the cached stores"""
+        lat, lng = np.radians(latitude), np.radians(longitude)
+        a = (
+            np.sin((self._lat[rows] - lat) / 2) ** 2
+            + np.cos(lat) * self._cos_lat[rows] * np.sin((self._lng[rows] - lng) / 2) ** 2
+        )
+        return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def _match(self, row: int, distance: float) -> StoreMatch:
+        store = self._stores[row]
+        return StoreMatch(
+            store_id=str(store.id),
+            store_code=store.store_code,
+            name=store.name,
+            distance_m=round(float(distance), 1)
+        )
+
+    async def nearest(self, latitude: float, longitude: float) -> Optional[StoreMatch]:
+        await self._fresh()
+        if not self._stores:
+            return None
+        distances = self._distances(latitude, longitude)
+        row = int(np.argmin(distances))
+        return self._match(row, distances[row])
+
+    async def resolve(
+        self,
+        store_id: Optional[str],
+        latitude: float,
+        longitude: float
+    ) -> Tuple[str, Optional[StoreMatch]]:
+        """
+        Store an upload belongs to. Without store_id the nearest store within
+        the match radius is used; a given store_id is checked against the
+        coordinates (rejected when STORE_MATCH_ENFORCE is on). Ids of stores
+        that are not registered are passed through unchecked.
+        """
+        if not store_id:
+            match = await self.nearest(latitude, longitude)
+            if match is None or match.distance_m > self.match_radius_m:
+                self.unmatched += 1
+                raise StoreResolutionError(
+                    f"No store within {self.match_radius_m:g} m of ({latitude}, {longitude}); pass store_id"
+                )
+            self.resolved += 1
+            return match.store_id, match
+
+        await self._fresh()
+        row = self._rows.get(store_id)
+        if row is None:
+            return store_id, None
+        self.validated += 1
+        match = self._match(row, self._distances(latitude, longitude, [row])[0])
+        if match.distance_m > self.match_radius_m:
+            self.mismatches += 1
+            if self.enforce:
+                raise StoreResolutionError(
+                    f"Store {store_id} is {match.distance_m:g} m from the upload coordinates "
+                    f"(limit {self.match_radius_m:g} m)"
+                )
+            print(f"Upload for store {store_id} taken {match.distance_m:g} m away")
+        return store_id, match
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "stores": len(self._stores),
+            "ttl_seconds": self.ttl,
+            "match_radius_m": self.match_radius_m,
+            "enforce": self.enforce,
+            "reloads": self.reloads,
+            "resolved": self.resolved,
+            "validated": self.validated,
+            "mismatches": self.mismatches,
+            "unmatched": self.unmatched
+        }
+
+
+async def stores_near(latitude: float, longitude: float, radius_m: float, limit: int) -> List[Dict[str, Any]]:
+    """Stores within radius_m, nearest first, from the 2dsphere index"""
+    pipeline = [
+        {
+            "$geoNear": {
+                "near": GeoPoint(coordinates=[longitude, latitude]).model_dump(),
+                "key": "location",
+                "distanceField": "distance_m",
+                "maxDistance": radius_m,
+                "spherical": True
+            }
+        },
+        {"$limit": limit},
+        # Coordinates are stored as Decimal128; hand them back as plain numbers
+        {"$set": {"latitude": {"$toDouble": "$latitude"}, "longitude": {"$toDouble": "$longitude"}}}
+    ]
+    return await Store.aggregate(pipeline).to_list()
+
+
+store_locator = StoreLocator(
+    ttl_seconds=settings.STORE_CACHE_TTL_SECONDS,
+    match_radius_m=settings.STORE_MATCH_RADIUS_METERS,
+    enforce=settings.STORE_MATCH_ENFORCE
+)
@@ -0,0 +1,188 @@
+"""
+Background analysis jobs for uploaded images.
+
+Uploads only store the photo and enqueue a job, so they return in
+milliseconds. Each job waits in its tenant's bulk lane of the fair
+scheduler; once granted a slot it fetches the blob, runs the shared
+analysis pipeline (YOLO itself runs in the inference worker processes) and
+writes the ShelfAnalysis document. Job state lives in the analysis_jobs
+collection, so queued work survives a restart. A job is claimed with one
+conditional update, so when several processes share the collection each
+job still runs once; on startup only running jobs older than
+JOB_STALE_SECONDS (their process presumably died) are requeued.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from beanie import PydanticObjectId, UpdateResponse
+from beanie.operators import Inc, Set
+from pymongo.errors import DuplicateKeyError
+
+from config import settings
+from models.analysis_job import AnalysisJob, JobStatus
+from models.image import Image
+from models.shelf_analysis import ShelfAnalysis
+from schemas.analysis import TargetSpec
+from services.analysis import analyze
+from services.pool import PoolBusyError
+from services.rollups import record_analysis
+from services.scheduler import BULK, scheduler
+from services.storage import get_blob_store
+
+
+class AnalysisJobQueue:
+    def __init__(self, retry_delay_seconds: float, stale_seconds: float):
+        self.retry_delay = retry_delay_seconds
+        self.stale_after = timedelta(seconds=stale_seconds)
+        self.tasks = set()  # one per queued or running job
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+
+    async def start(self) -> None:
+        # Jobs left running by a process that died are picked up again; recent ones
+        # may belong to another live process and are left alone
+        await AnalysisJob.find(
+            AnalysisJob.status == JobStatus.running,
+            {"$or": [
+                {"started_at": None},
+                {"started_at": {"$lt": datetime.utcnow() - self.stale_after}}
+            ]}
+        ).update(Set({AnalysisJob.status: JobStatus.queued}))
+        pending = await AnalysisJob.find(AnalysisJob.status == JobStatus.queued).sort(+AnalysisJob.created_at).to_list()
+        for job in pending:
+            self._submit(job)
+        if pending:
+            print(f"Recovered {len(pending)} queued analysis job(s)")
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks.clear()
+
+    async def enqueue(self, image: Image, targets: List[TargetSpec], sliced: bool = False) -> AnalysisJob:
+        job = AnalysisJob(
+            image_id=str(image.id),
+            store_id=image.store_id,
+            user_id=image.user_id,
+            targets=[t.model_dump() for t in targets],
+            sliced=sliced
+        )
+        await job.insert()
+        self._submit(job)
+        return job
+
+    def _submit(self, job: AnalysisJob) -> None:
+        task = asyncio.create_task(self._schedule(job.id, job.store_id, job.user_id))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _schedule(self, job_id: PydanticObjectId, store_id: str, user_id: str) -> None:
+        # Waiting tasks hold only the job id; the image is read once a slot is granted
+        while True:
+            self.waiting += 1
+            try:
+                lane = await scheduler.acquire(store_id, user_id, BULK)
+            finally:
+                self.waiting -= 1
+
+            self.running += 1
+            try:
+                retry = await self._run(job_id)
+            except Exception as e:
+                print(f"Analysis job {job_id} crashed: {str(e)}")
+                retry = False
+            finally:
+                self.running -= 1
+                scheduler.release(lane, BULK)
+
+            if not retry:
+                return
+            await asyncio.sleep(self.retry_delay)
+
+    async def _run(self, job_id: PydanticObjectId) -> bool:
+        """Run one job; returns True if it should be retried later"""
+        # Claim atomically: another process may hold a task for the same job
+        job = await AnalysisJob.find_one(
+            AnalysisJob.id == job_id,
+            AnalysisJob.status == JobStatus.queued
+        ).update(
+            Set({AnalysisJob.status: JobStatus.running, AnalysisJob.started_at: datetime.utcnow()}),
+            Inc({AnalysisJob.attempts: 1}),
+            response_type=UpdateResponse.NEW_DOCUMENT
+        )
+        if job is None:
+            return False
+
+        try:
+            image = await Image.get(PydanticObjectId(job.image_id))
+            if image is None or not image.blob_key:
+                raise ValueError("Image or its stored file no longer exists")
+            contents = await get_blob_store().get_bytes(image.blob_key)
+            response, key = await analyze(
+                contents,
+                [TargetSpec(**target) for target in job.targets],
+                sliced=job.sliced,
+                persist=False,
+                store_id=job.store_id
+            )
+        except PoolBusyError:
+            # The inference pool is saturated; back off
+            job.status = JobStatus.queued
+            await job.save()
+            self.retried += 1
+            return True
+        except Exception as e:
+            job.status = JobStatus.failed
+            job.error = str(e)
+            job.finished_at = datetime.utcnow()
+            await job.save()
+            self.failed += 1
+            print(f"Analysis job {job.id} for image {job.image_id} failed: {str(e)}")
+            return False
+
+        # Keyed by the job, so a rerun after a crash finds the analysis it already stored
+        analysis = ShelfAnalysis(
+            id=job.id,
+            image_id=job.image_id,
+            cache_key=key,
+            osa_percent=round(response.OSA * 100, 2),
+            sos_percent=round(response.SOS * 100, 2),
+            planogram_match=response.planogram is not None and response.planogram.compliant,
+            raw_output_json=response.model_dump(exclude={"cached", "artifact_id"})
+        )
+        try:
+            await analysis.insert()
+        except DuplicateKeyError:
+            analysis = await ShelfAnalysis.get(job.id)
+        try:
+            await record_analysis(job.store_id, analysis)
+        except Exception as e:
+            # The analysis itself is stored; rollups can be rebuilt from it
+            print(f"Could not update rollups for image {job.image_id}: {str(e)}")
+
+        job.status = JobStatus.completed
+        job.analysis_id = str(analysis.id)
+        job.finished_at = datetime.utcnow()
+        await job.save()
+        self.completed += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried
+        }
+
+
+job_queue = AnalysisJobQueue(
+    retry_delay_seconds=settings.JOB_RETRY_DELAY_SECONDS,
+    stale_seconds=settings.JOB_STALE_SECONDS
+)
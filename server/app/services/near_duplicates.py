@@ -0,0 +1,212 @@
+"""
+Near-duplicate detection for analyzed uploads.
+
+Reps often shoot the same shelf several times within a minute. Each
+analyzed upload's perceptual hash is kept per store_id for
+NEAR_DUPLICATE_WINDOW_SECONDS in a multi-index hash table: the 64 bits are
+cut into PHASH_MAX_DISTANCE + 1 segments with one table each, so any hash
+within that Hamming distance shares at least one segment exactly and a
+lookup only compares the few hashes found under its own segments. A match
+with the same targets either reuses the earlier analysis job or is only
+flagged (NEAR_DUPLICATE_ACTION). The index is in-process and starts empty.
+"""
+import json
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from beanie import PydanticObjectId
+from pydantic import BaseModel
+
+from config import settings
+from ml.phash import HASH_BITS, hamming
+from models.analysis_job import AnalysisJob, JobStatus
+from models.image import Image
+from schemas.analysis import TargetSpec
+
+REUSE = "reuse"
+FLAG = "flag"
+OFF = "off"
+
+
+class HashEntry(BaseModel):
+    image_id: str
+    job_id: str
+    phash: int
+    params: str
+    added_at: float
+
+
+class NearDuplicate(BaseModel):
+    image_id: str
+    job_id: str
+    distance: int
+
+
+def analysis_params(targets: List[TargetSpec], sliced: bool) -> str:
+    return json.dumps({"targets": [t.model_dump() for t in targets], "sliced": sliced}, sort_keys=True)
+
+
+def segment_bounds(max_distance: int) -> List[Tuple[int, int]]:
+    """(shift, mask) of each segment, as evenly sized as the bits allow"""
+    count = max(1, min(max_distance + 1, HASH_BITS))
+    edges = [round(i * HASH_BITS / count) for i in range(count + 1)]
+    return [(lo, (1 << (hi - lo)) - 1) for lo, hi in zip(edges, edges[1:])]
+
+
+class StoreHashes:
+    def __init__(self, segments: List[Tuple[int, int]]):
+        self.segments = segments
+        self.entries: Deque[Tuple[int, HashEntry]] = deque()
+        self.tables: List[Dict[int, Set[int]]] = [{} for _ in segments]
+        self.by_seq: Dict[int, HashEntry] = {}
+
+    def keys(self, phash: int):
+        return [(phash >> shift) & mask for shift, mask in self.segments]
+
+    def add(self, seq: int, entry: HashEntry) -> None:
+        self.entries.append((seq, entry))
+        self.by_seq[seq] = entry
+        for table, key in zip(self.tables, self.keys(entry.phash)):
+            table.setdefault(key, set()).add(seq)
+
+    def remove(self, seq: int) -> Optional[HashEntry]:
+        """Drop an entry from the tables; its slot in `entries` is skipped on eviction"""
+        entry = self.by_seq.pop(seq, None)
+        if entry is None:
+            return None
+        for table, key in zip(self.tables, self.keys(entry.phash)):
+            bucket = table[key]
+            bucket.discard(seq)
+            if not bucket:
+                del table[key]
+        return entry
+
+    def evict_oldest(self) -> Optional[HashEntry]:
+        seq, _ = self.entries.popleft()
+        return self.remove(seq)
+
+    def __len__(self) -> int:
+        return len(self.by_seq)
+
+    def candidates(self, phash: int) -> Set[int]:
+        found: Set[int] = set()
+        for table, key in zip(self.tables, self.keys(phash)):
+            found |= table.get(key, set())
+        return found
+
+
+class NearDuplicateIndex:
+    def __init__(self, action: str, max_distance: int, window_seconds: float, max_per_store: int):
+        self.action = action if action in (REUSE, FLAG) else OFF
+        self.max_distance = max_distance
+        self.window = window_seconds
+        self.max_per_store = max(1, max_per_store)
+        self.segments = segment_bounds(max_distance)
+        self._stores: Dict[str, StoreHashes] = {}
+        self._images: Dict[str, Tuple[str, int]] = {}  # image_id -> (store_id, seq)
+        self._seq = 0
+
+        self.lookups = 0
+        self.compared = 0
+        self.reused = 0
+        self.flagged = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.action != OFF
+
+    def _expire(self, store_id: str) -> Optional[StoreHashes]:
+        hashes = self._stores.get(store_id)
+        if hashes is None:
+            return None
+        cutoff = time.monotonic() - self.window
+        while hashes.entries and (hashes.entries[0][1].added_at < cutoff or len(hashes.entries) > self.max_per_store):
+            evicted = hashes.evict_oldest()
+            if evicted is not None:
+                self._images.pop(evicted.image_id, None)
+        if not hashes.entries:
+            del self._stores[store_id]
+            return None
+        return hashes
+
+    def add(self, store_id: str, image_id: str, job_id: str, phash: int, params: str) -> None:
+        hashes = self._stores.get(store_id)
+        if hashes is None:
+            hashes = self._stores[store_id] = StoreHashes(self.segments)
+        self._seq += 1
+        hashes.add(self._seq, HashEntry(
+            image_id=image_id, job_id=job_id, phash=phash, params=params, added_at=time.monotonic()
+        ))
+        self._images[image_id] = (store_id, self._seq)
+        self._expire(store_id)
+
+    def discard(self, image_ids: List[str]) -> None:
+        """Forget images that may no longer be reused (e.g. purged by the reaper)"""
+        for image_id in image_ids:
+            location = self._images.pop(image_id, None)
+            if location is None:
+                continue
+            store_id, seq = location
+            hashes = self._stores.get(store_id)
+            if hashes is not None:
+                hashes.remove(seq)
+
+    def nearest(self, store_id: str, phash: int, params: str) -> List[NearDuplicate]:
+        """Recent uploads of the store with the same analysis parameters, closest (then newest) first"""
+        self.lookups += 1
+        hashes = self._expire(store_id)
+        if hashes is None:
+            return []
+        found = []
+        for seq in hashes.candidates(phash):
+            entry = hashes.by_seq[seq]
+            if entry.params != params:
+                continue
+            self.compared += 1
+            distance = hamming(phash, entry.phash)
+            if distance <= self.max_distance:
+                found.append(((distance, -seq), NearDuplicate(image_id=entry.image_id, job_id=entry.job_id, distance=distance)))
+        return [match for _, match in sorted(found, key=lambda item: item[0])]
+
+    async def find(self, store_id: str, phash: int, targets: List[TargetSpec], sliced: bool) -> Optional[NearDuplicate]:
+        """
+        A near duplicate whose analysis can stand in for this upload's: its
+        image is still live and its job has not failed. Stale entries are dropped.
+        """
+        for match in self.nearest(store_id, phash, analysis_params(targets, sliced)):
+            image = await Image.get(PydanticObjectId(match.image_id))
+            if image is None or image.is_deleted:
+                self.discard([match.image_id])
+                continue
+            job = await AnalysisJob.get(PydanticObjectId(match.job_id))
+            if job is None or job.status == JobStatus.failed:
+                continue
+            if self.action == REUSE:
+                self.reused += 1
+            else:
+                self.flagged += 1
+            return match
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "action": self.action,
+            "max_distance": self.max_distance,
+            "segments": len(self.segments),
+            "window_seconds": self.window,
+            "stores": len(self._stores),
+            "hashes": sum(len(hashes) for hashes in self._stores.values()),
+            "lookups": self.lookups,
+            "compared": self.compared,
+            "reused": self.reused,
+            "flagged": self.flagged
+        }
+
+
+near_duplicates = NearDuplicateIndex(
+    action=settings.NEAR_DUPLICATE_ACTION,
+    max_distance=settings.PHASH_MAX_DISTANCE,
+    window_seconds=settings.NEAR_DUPLICATE_WINDOW_SECONDS,
+    max_per_store=settings.NEAR_DUPLICATE_MAX_PER_STORE
+)
@@ -0,0 +1,70 @@
+"""
+Keyset (cursor) pagination for image listings.
+
+Pages are ordered by (upload_time, _id) descending and each page resumes
+strictly after the last row of the previous one, so every page costs one
+index seek plus `limit` rows no matter how deep it is, and concurrent
+inserts never shift or duplicate rows. The continuation token is opaque to
+clients: URL-safe base64 of the last row's sort key, bound to the listing
+it came from.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from beanie import PydanticObjectId
+from pymongo import DESCENDING
+
+from models.image import Image
+from schemas.image import ImageSummary
+
+
+def encode_cursor(scope: str, upload_time: datetime, image_id: PydanticObjectId) -> str:
+    payload = json.dumps({"s": scope, "t": upload_time.isoformat(), "i": str(image_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, scope: str) -> Tuple[datetime, PydanticObjectId]:
+    """Raises ValueError for malformed tokens or tokens from another listing"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        upload_time = datetime.fromisoformat(payload["t"])
+        image_id = PydanticObjectId(payload["i"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if payload.get("s") != scope:
+        raise ValueError("Cursor belongs to a different listing")
+    return upload_time, image_id
+
+
+async def image_page(
+    field: str,
+    value: str,
+    limit: int,
+    cursor: Optional[str] = None
+) -> Tuple[List[ImageSummary], Optional[str]]:
+    """
+    One page of live images where `field == value`, newest first, and the
+    token for the next page (None on the last page)
+    """
+    scope = f"{field}:{value}"
+    query = {field: value, "is_deleted": False}
+    if cursor:
+        upload_time, image_id = decode_cursor(cursor, scope)
+        query["$or"] = [
+            {"upload_time": {"$lt": upload_time}},
+            {"upload_time": upload_time, "_id": {"$lt": image_id}}
+        ]
+
+    # One extra row tells whether another page exists without a count
+    rows = await Image.find(query).sort(
+        [("upload_time", DESCENDING), ("_id", DESCENDING)]
+    ).limit(limit + 1).project(ImageSummary).to_list()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(scope, rows[-1].upload_time, rows[-1].id)
+    return rows, next_cursor
@@ -0,0 +1,90 @@
+"""
+Planogram compliance of analyses.
+
+A store's planogram (its most recent one with slots) is compiled once and
+kept per store_id, so checking a photo costs one cost matrix and one
+assignment, without a database read. Editing a planogram drops the
+store's entry; otherwise entries expire after PLANOGRAM_CACHE_TTL_SECONDS.
+"""
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from config import settings
+from ml.planogram import CompiledPlanogram
+from models.panogram import Planogram
+from schemas.analysis import BoxDetection
+from schemas.panogram import PlanogramCompliance
+from services.pool import summarize_latencies
+from services.result_cache import LRUCache
+
+# Cached for stores without a planogram, so they are not looked up on every analysis
+NO_PLANOGRAM = False
+
+
+async def current_planogram(store_id: str) -> Optional[Planogram]:
+    return await Planogram.find(
+        Planogram.store_id == store_id,
+        {"slots.0": {"$exists": True}}
+    ).sort(-Planogram.created_at).first_or_none()
+
+
+class PlanogramCache:
+    def __init__(self, max_size: int, ttl_seconds: float, history: int = 512):
+        self.compiled = LRUCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+        self.checks = 0
+        self._check_times = deque(maxlen=history)
+
+    async def get(self, store_id: str) -> Optional[CompiledPlanogram]:
+        compiled = self.compiled.get(store_id)
+        if compiled is not None:
+            self.hits += 1
+            return compiled or None
+
+        self.misses += 1
+        planogram = await current_planogram(store_id)
+        compiled = NO_PLANOGRAM
+        if planogram is not None:
+            try:
+                compiled = CompiledPlanogram(str(planogram.id), planogram.slots, settings.PLANOGRAM_MIN_COMPLIANCE)
+            except ValueError as e:
+                print(f"Planogram {planogram.id} of store {store_id} is unusable: {str(e)}")
+        self.compiled.put(store_id, compiled)
+        return compiled or None
+
+    def invalidate(self, store_id: str) -> None:
+        self.compiled.pop(store_id)
+
+    async def check(self, store_id: Optional[str], detections: List[BoxDetection]) -> Optional[PlanogramCompliance]:
+        """Compliance of the detections with the store's planogram; None if it has none"""
+        if not store_id:
+            return None
+        compiled = await self.get(store_id)
+        if compiled is None:
+            return None
+
+        started = time.perf_counter()
+        boxes = np.array([[box.x1, box.y1, box.x2, box.y2] for box in detections], dtype=np.float64)
+        result = compiled.check(boxes, [box.label or box.text for box in detections])
+        self._check_times.append(time.perf_counter() - started)
+        self.checks += 1
+        return PlanogramCompliance(**result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cached_stores": len(self.compiled),
+            "hits": self.hits,
+            "misses": self.misses,
+            "checks": self.checks,
+            "check_ms": summarize_latencies(self._check_times)
+        }
+
+
+planogram_cache = PlanogramCache(
+    max_size=settings.PLANOGRAM_CACHE_SIZE,
+    ttl_seconds=settings.PLANOGRAM_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,123 @@
+import asyncio
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class PoolBusyError(Exception):
+    """Raised when a pool's queue is full and the job is rejected"""
+
+
+def _timed_call(fn: Callable, *args) -> Tuple[Any, float, float]:
+    """Runs inside the worker process; returns the result with start/end timestamps"""
+    started_at = time.time()
+    result = fn(*args)
+    return result, started_at, time.time()
+
+
+class WorkerPool:
+    """
+    Process pool with a bounded queue and wait-time metrics.
+
+    At most `max_workers` jobs run at once and at most `max_queue` more wait
+    for a free worker; anything beyond that is rejected with PoolBusyError
+    so callers can shed load instead of piling up requests.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int,
+        max_queue: int,
+        initializer: Optional[Callable] = None,
+        initargs: Tuple = (),
+        history: int = 512
+    ):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._initializer = initializer
+        self._initargs = initargs
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+        self._pending = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_times = deque(maxlen=history)
+        self._run_times = deque(maxlen=history)
+
+    def start(self) -> None:
+        if self._executor is None:
+            # spawn, not fork: the API process holds event-loop and Mongo threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self._initializer,
+                initargs=self._initargs
+            )
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._pending - self.max_workers)
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run `fn(*args)` in a worker process and await its result"""
+        if self._pending >= self.max_workers + self.max_queue:
+            self._rejected += 1
+            raise PoolBusyError(f"{self.name} pool is full ({self._pending} jobs pending)")
+
+        self.start()
+        self._pending += 1
+        submitted_at = time.time()
+        try:
+            future = self._executor.submit(_timed_call, fn, *args)
+            result, started_at, finished_at = await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); replace the pool so later jobs can run
+            self._failed += 1
+            self.shutdown()
+            raise
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            self._pending -= 1
+
+        self._completed += 1
+        self._wait_times.append(max(0.0, started_at - submitted_at))
+        self._run_times.append(finished_at - started_at)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            "queue_depth": self.queue_depth,
+            "completed": self._completed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "wait_ms": summarize_latencies(self._wait_times),
+            "run_ms": summarize_latencies(self._run_times)
+        }
+
+
+def summarize_latencies(samples) -> Dict[str, float]:
+    if not samples:
+        return {"avg": 0.0, "p95": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return {
+        "avg": round(1000 * sum(ordered) / len(ordered), 2),
+        "p95": round(1000 * p95, 2),
+        "max": round(1000 * ordered[-1], 2)
+    }
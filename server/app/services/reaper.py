@@ -0,0 +1,225 @@
+"""
+Background purge of soft-deleted images once their restore window closes.
+
+A soft delete stamps `deleted_at`; after IMAGE_RESTORE_WINDOW_MINUTES the
+reaper claims the image (it can no longer be restored). Once the claim is
+BLOB_DELETE_GRACE_SECONDS old, the reaper drops the image from the
+near-duplicate index, gives uploads that were reusing its analysis a job
+of their own, removes its ShelfAnalysis and AnalysisJob documents and its
+blob, and deletes the image last, in batches of bulk deletes; a sweep that
+dies part-way is finished by the next one. Blobs are content-addressed and
+shared by identical uploads, so a blob is only removed once no remaining
+Image references it: an upload that reused the blob has its row written
+(behind the write batcher) well within the grace period, references are
+checked again just before each blob is deleted, and an upload that finds
+its reused blob gone once its row is written stores it again. A TTL index
+is not used because it cannot cascade.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from beanie import PydanticObjectId
+from beanie.operators import In, Set
+from pydantic import BaseModel, Field
+
+from config import settings
+from models.analysis_job import AnalysisJob
+from models.image import Image
+from models.shelf_analysis import ShelfAnalysis
+from schemas.analysis import TargetSpec
+from services.jobs import job_queue
+from services.near_duplicates import near_duplicates
+from services.rollups import remove_analyses
+from services.storage import get_blob_store
+
+RESTORE_WINDOW = timedelta(minutes=settings.IMAGE_RESTORE_WINDOW_MINUTES)
+BLOB_DELETE_GRACE = timedelta(seconds=settings.BLOB_DELETE_GRACE_SECONDS)
+
+
+class PurgeCandidate(BaseModel):
+    id: PydanticObjectId = Field(validation_alias="_id")
+    store_id: str
+    blob_key: Optional[str] = None
+    source_blob_keys: List[str] = []
+
+    class Settings:
+        projection = {"_id": 1, "store_id": 1, "blob_key": 1, "source_blob_keys": 1}
+
+
+class PurgedAnalysis(BaseModel):
+    id: PydanticObjectId = Field(validation_alias="_id")
+    image_id: str
+    analysis_time: datetime
+    targets: List[Dict[str, Any]] = []
+
+    class Settings:
+        projection = {"_id": 1, "image_id": 1, "analysis_time": 1, "targets": "$raw_output_json.targets"}
+
+
+def restore_deadline(image: Image) -> Optional[datetime]:
+    """When a soft-deleted image stops being restorable (None if not deleted)"""
+    if not image.is_deleted or image.deleted_at is None:
+        return None
+    return image.deleted_at + RESTORE_WINDOW
+
+
+class ImageReaper:
+    def __init__(self, interval_seconds: float, batch_size: int):
+        self.interval = interval_seconds
+        self.batch_size = max(1, batch_size)
+        self.task: Optional[asyncio.Task] = None
+
+        self.sweeps = 0
+        self.images_purged = 0
+        self.analyses_purged = 0
+        self.blobs_purged = 0
+        self.borrowers_rehomed = 0
+        self.last_sweep: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Image reaper sweep failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def sweep(self) -> int:
+        """Purge every image whose restore window has closed; returns how many"""
+        # Rows soft-deleted before deleted_at existed get a full window from now
+        await Image.find(Image.is_deleted == True, Image.deleted_at == None).update(
+            Set({Image.deleted_at: datetime.utcnow()})
+        )
+
+        # Claim (guarded by the same filter, in case an image was restored since); restores
+        # are refused from here on
+        await Image.find(
+            Image.is_deleted == True,
+            Image.deleted_at < datetime.utcnow() - RESTORE_WINDOW,
+            Image.purge_started_at == None
+        ).update(Set({Image.purge_started_at: datetime.utcnow()}))
+
+        purged = 0
+        while True:
+            batch = await Image.find(
+                Image.is_deleted == True,
+                Image.purge_started_at < datetime.utcnow() - BLOB_DELETE_GRACE
+            ).limit(self.batch_size).project(PurgeCandidate).to_list()
+            if not batch:
+                break
+            purged += await self._purge(batch)
+
+        self.sweeps += 1
+        self.last_sweep = datetime.utcnow()
+        return purged
+
+    async def _purge(self, claimed: List[PurgeCandidate]) -> int:
+        # Images go last, so a sweep that fails part-way leaves them claimed and the
+        # next sweep finishes the dependents
+        claimed_ids = [candidate.id for candidate in claimed]
+        id_strings = [str(candidate.id) for candidate in claimed]
+
+        # Take the purged analyses back out of the daily rollups before deleting them
+        store_ids = {str(candidate.id): candidate.store_id for candidate in claimed}
+        rolled_up = await ShelfAnalysis.find(In(ShelfAnalysis.image_id, id_strings)).project(PurgedAnalysis).to_list()
+        await remove_analyses([
+            (store_ids[analysis.image_id], str(analysis.id), analysis.analysis_time, analysis.targets)
+            for analysis in rolled_up
+        ])
+
+        near_duplicates.discard(id_strings)
+        await self._rehome_borrowers(claimed_ids, id_strings)
+
+        analyses = await ShelfAnalysis.find(In(ShelfAnalysis.image_id, id_strings)).delete()
+        await AnalysisJob.find(In(AnalysisJob.image_id, id_strings)).delete()
+
+        # A blob goes only when no other Image (e.g. a re-upload of the same photo, or a
+        # panorama stitched from it) points at it
+        keys = {candidate.blob_key for candidate in claimed if candidate.blob_key}
+        keys.update(key for candidate in claimed for key in candidate.source_blob_keys)
+        if keys:
+            still_used = set()
+            for field in ("blob_key", "source_blob_keys"):
+                still_used.update(await Image.distinct(
+                    field,
+                    {field: {"$in": list(keys)}, "_id": {"$nin": claimed_ids}}
+                ))
+            blob_store = get_blob_store()
+            for key in keys - still_used:
+                # Checked again right before deleting, for uploads that landed since
+                if await Image.find_one({
+                    "$or": [{"blob_key": key}, {"source_blob_keys": key}],
+                    "_id": {"$nin": claimed_ids}
+                }).project(PurgeCandidate):
+                    continue
+                await blob_store.delete(key)
+                self.blobs_purged += 1
+
+        images = await Image.find(In(Image.id, claimed_ids), Image.purge_started_at != None).delete()
+
+        purged = images.deleted_count if images else 0
+        self.images_purged += purged
+        self.analyses_purged += analyses.deleted_count if analyses else 0
+        return purged
+
+    async def _rehome_borrowers(self, claimed_ids: List[PydanticObjectId], id_strings: List[str]) -> None:
+        """Near-duplicate uploads serving a purged image's analysis get a job of their own"""
+        borrowers = await Image.find(
+            In(Image.duplicate_of, id_strings),
+            Image.analysis_reused == True,
+            {"_id": {"$nin": claimed_ids}}
+        ).to_list()
+        if not borrowers:
+            return
+
+        sources = {}
+        # Soft-deleted borrowers too: they may still be restored
+        for image in borrowers:
+            if image.duplicate_of not in sources:
+                sources[image.duplicate_of] = await AnalysisJob.find(
+                    AnalysisJob.image_id == image.duplicate_of
+                ).sort(-AnalysisJob.created_at).first_or_none()
+            source_job = sources[image.duplicate_of]
+            if source_job is not None:
+                targets = [TargetSpec(**target) for target in source_job.targets]
+                await job_queue.enqueue(image, targets, source_job.sliced)
+                self.borrowers_rehomed += 1
+
+        await Image.find(In(Image.id, [image.id for image in borrowers])).update(
+            Set({Image.analysis_reused: False})
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "restore_window_minutes": settings.IMAGE_RESTORE_WINDOW_MINUTES,
+            "blob_delete_grace_seconds": settings.BLOB_DELETE_GRACE_SECONDS,
+            "interval_seconds": self.interval,
+            "sweeps": self.sweeps,
+            "images_purged": self.images_purged,
+            "analyses_purged": self.analyses_purged,
+            "blobs_purged": self.blobs_purged,
+            "borrowers_rehomed": self.borrowers_rehomed,
+            "last_sweep": self.last_sweep,
+            "last_error": self.last_error
+        }
+
+
+image_reaper = ImageReaper(
+    interval_seconds=settings.REAPER_INTERVAL_SECONDS,
+    batch_size=settings.REAPER_BATCH_SIZE
+)
@@ -0,0 +1,115 @@
+"""
+Content-addressed cache for shelf analysis results.
+
+Keys hash the uploaded bytes together with the analysis parameters and the
+model version, so a resubmitted photo is answered without running YOLO or
+paying for OCR again. Lookups hit an in-process LRU first and fall back to
+the ShelfAnalysis collection, which also survives restarts.
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from config import settings
+from models.shelf_analysis import ShelfAnalysis
+
+
+class LRUCache:
+    """Size- and TTL-bounded LRU (not thread safe; used from the event loop only)"""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_size <= 0:
+            return
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._items.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+def cache_key(contents: bytes, params: Dict[str, Any], model_version: str) -> str:
+    digest = hashlib.sha256(contents)
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    digest.update(model_version.encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.memory = LRUCache(max_size, ttl_seconds)
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        payload = self.memory.get(key)
+        if payload is not None:
+            self.memory_hits += 1
+            return payload
+
+        analysis = await ShelfAnalysis.find_one(ShelfAnalysis.cache_key == key)
+        if analysis is not None:
+            self.db_hits += 1
+            self.memory.put(key, analysis.raw_output_json)
+            return analysis.raw_output_json
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, payload: Dict[str, Any], osa: float, sos: float, persist: bool = True) -> None:
+        self.memory.put(key, payload)
+        if not persist:
+            # Caller writes its own ShelfAnalysis (with image_id) carrying this cache_key
+            return
+        try:
+            await ShelfAnalysis(
+                cache_key=key,
+                osa_percent=round(osa * 100, 2),
+                sos_percent=round(sos * 100, 2),
+                planogram_match=False,
+                raw_output_json=payload
+            ).insert()
+        except Exception as e:
+            # The in-process tier still serves the hit; persistence is best effort
+            print(f"Could not persist cached analysis: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "size": len(self.memory),
+            "max_size": self.memory.max_size,
+            "ttl_seconds": self.memory.ttl,
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.db_hits) / lookups, 3) if lookups else 0.0
+        }
+
+
+result_cache = ResultCache(
+    max_size=settings.RESULT_CACHE_SIZE,
+    ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,254 @@
+"""
+Daily OSA/SOS rollups per store, brand and day.
+
+Every analysis of a stored image adds its per-target metrics to one
+DailyRollup bucket per brand with a single bulk upsert of $inc updates,
+and purging an image subtracts them again. Both directions first flip
+`rolled_up_at` on the ShelfAnalysis with one conditional update and only
+apply the metrics they flipped, so a replayed job or a retried purge never
+counts an analysis twice; a crash between the flip and the bulk write
+leaves that one analysis out, which a rebuild puts right. Trend and leaderboard reads then group a
+handful of buckets (stores x days) instead of scanning raw ShelfAnalysis
+documents. Interactive /api/analytics/analyze calls are not tied to a
+stored image and are left out of the rollups, even when they name a
+store_id. Rebuild from scratch with:
+
+    cd server/app && python -m services.rollups --rebuild
+"""
+import argparse
+import asyncio
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from beanie import PydanticObjectId
+from beanie.operators import In, Set
+from pymongo import UpdateOne
+
+from models.rollup import DailyRollup
+from models.shelf_analysis import ShelfAnalysis
+from models.store import Store
+from services.result_cache import LRUCache
+
+# store_id -> lower-cased city ("" when the store is unknown)
+_cities = LRUCache(max_size=4096, ttl_seconds=3600)
+
+
+def normalize_brand(text: str) -> str:
+    return text.strip().upper()
+
+
+def day_bucket(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, moment.day)
+
+
+async def store_city(store_id: str) -> Optional[str]:
+    """City of a store referenced by id or store_code"""
+    city = _cities.get(store_id)
+    if city is None:
+        store = None
+        try:
+            store = await Store.get(PydanticObjectId(store_id))
+        except Exception:
+            pass
+        if store is None:
+            store = await Store.find_one(Store.store_code == store_id)
+        city = store.city.strip().lower() if store else ""
+        _cities.put(store_id, city)
+    return city or None
+
+
+def metric_deltas(targets: List[Dict[str, Any]], sign: int) -> Dict[str, Dict[str, float]]:
+    """brand -> $inc document; targets that normalize to the same brand are summed"""
+    deltas: Dict[str, Dict[str, float]] = {}
+    for target in targets:
+        inc = deltas.setdefault(normalize_brand(target["search_text"]), {
+            "analyses": 0, "osa_sum": 0.0, "sos_sum": 0.0, "found_sum": 0, "expected_sum": 0
+        })
+        inc["analyses"] += sign
+        inc["osa_sum"] += sign * float(target["OSA"])
+        inc["sos_sum"] += sign * float(target["SOS"])
+        inc["found_sum"] += sign * int(target["found"])
+        inc["expected_sum"] += sign * int(target["expected"])
+    return deltas
+
+
+async def record_analysis(store_id: str, analysis: ShelfAnalysis) -> None:
+    """Add one analysis' per-target metrics, unless they already are"""
+    targets = analysis.raw_output_json.get("targets", [])
+    if not targets:
+        return
+    applied = await ShelfAnalysis.find_one(
+        ShelfAnalysis.id == analysis.id,
+        ShelfAnalysis.rolled_up_at == None
+    ).update(Set({ShelfAnalysis.rolled_up_at: datetime.utcnow()}))
+    if not applied.modified_count:
+        return
+    analysis_time = analysis.analysis_time
+    city = await store_city(store_id)
+    day = day_bucket(analysis_time)
+    now = datetime.utcnow()
+    updates = [
+        UpdateOne(
+            {"store_id": store_id, "brand": brand, "day": day},
+            {"$inc": inc, "$set": {"updated_at": now}, "$setOnInsert": {"city": city}},
+            upsert=True
+        )
+        for brand, inc in metric_deltas(targets, 1).items()
+    ]
+    await DailyRollup.get_motor_collection().bulk_write(updates, ordered=False)
+
+
+async def remove_analyses(analyses: List[Tuple[str, str, datetime, List[Dict[str, Any]]]]) -> None:
+    """
+    Subtract purged analyses, given as (store_id, analysis_id, analysis_time,
+    targets), in one bulk write. Only analyses this call takes out of the
+    rollups (rolled_up_at set, then cleared under its own token) are
+    subtracted, so retries and concurrent purges never subtract one twice.
+    """
+    if not analyses:
+        return
+    token = uuid.uuid4().hex
+    await ShelfAnalysis.find(
+        In(ShelfAnalysis.id, [PydanticObjectId(analysis_id) for _, analysis_id, _, _ in analyses]),
+        ShelfAnalysis.rolled_up_at != None
+    ).update(Set({ShelfAnalysis.rolled_up_at: None, ShelfAnalysis.rollup_removed_by: token}))
+    released = {str(analysis_id) for analysis_id in await ShelfAnalysis.distinct("_id", {"rollup_removed_by": token})}
+
+    now = datetime.utcnow()
+    updates = [
+        UpdateOne(
+            {"store_id": store_id, "brand": brand, "day": day_bucket(analysis_time)},
+            {"$inc": inc, "$set": {"updated_at": now}}
+        )
+        for store_id, analysis_id, analysis_time, targets in analyses
+        if analysis_id in released
+        for brand, inc in metric_deltas(targets, -1).items()
+    ]
+    if updates:
+        await DailyRollup.get_motor_collection().bulk_write(updates, ordered=False)
+
+
+def day_range(start: Optional[date], end: Optional[date], default_days: int = 7):
+    """[start, end] inclusive dates as a half-open datetime range; defaults to the last week"""
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=default_days - 1)
+    if start > end:
+        raise ValueError("start must not be after end")
+    return datetime(start.year, start.month, start.day), datetime(end.year, end.month, end.day) + timedelta(days=1)
+
+
+def bucket_match(brand: str, start: datetime, end: datetime, city: Optional[str], store_id: Optional[str]) -> Dict:
+    match = {"brand": normalize_brand(brand), "day": {"$gte": start, "$lt": end}}
+    if city:
+        match["city"] = city.strip().lower()
+    if store_id:
+        match["store_id"] = store_id
+    return match
+
+
+TOTALS = {
+    "analyses": {"$sum": "$analyses"},
+    "osa_sum": {"$sum": "$osa_sum"},
+    "sos_sum": {"$sum": "$sos_sum"},
+    "found": {"$sum": "$found_sum"},
+    "expected": {"$sum": "$expected_sum"}
+}
+
+
+def summarize(row: Dict[str, Any]) -> Dict[str, Any]:
+    analyses = row["analyses"]
+    return {
+        "analyses": analyses,
+        "osa_percent": round(100 * row["osa_sum"] / analyses, 2),
+        "sos_percent": round(100 * row["sos_sum"] / analyses, 2),
+        "found": row["found"],
+        "expected": row["expected"]
+    }
+
+
+async def trend(
+    brand: str,
+    start: datetime,
+    end: datetime,
+    city: Optional[str] = None,
+    store_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Average OSA/SOS per day across the matching stores"""
+    pipeline = [
+        {"$match": bucket_match(brand, start, end, city, store_id)},
+        {"$group": {"_id": "$day", "stores": {"$addToSet": "$store_id"}, **TOTALS}},
+        {"$match": {"analyses": {"$gt": 0}}},
+        {"$sort": {"_id": 1}}
+    ]
+    rows = await DailyRollup.aggregate(pipeline).to_list()
+    return [
+        {"day": row["_id"].date().isoformat(), "stores": len(row["stores"]), **summarize(row)}
+        for row in rows
+    ]
+
+
+async def leaderboard(
+    brand: str,
+    start: datetime,
+    end: datetime,
+    city: Optional[str] = None,
+    metric: str = "osa",
+    limit: int = 10
+) -> List[Dict[str, Any]]:
+    """Stores ranked by average OSA or SOS over the period"""
+    pipeline = [
+        {"$match": bucket_match(brand, start, end, city, None)},
+        {"$group": {"_id": "$store_id", "city": {"$first": "$city"}, **TOTALS}},
+        {"$match": {"analyses": {"$gt": 0}}},
+        {"$addFields": {"score": {"$divide": [f"${metric}_sum", "$analyses"]}}},
+        {"$sort": {"score": -1, "_id": 1}},
+        {"$limit": limit}
+    ]
+    rows = await DailyRollup.aggregate(pipeline).to_list()
+    return [
+        {"rank": rank, "store_id": row["_id"], "city": row.get("city"), **summarize(row)}
+        for rank, row in enumerate(rows, start=1)
+    ]
+
+
+async def rebuild(batch_size: int = 1000) -> int:
+    """Recompute every bucket from the stored analyses of live and soft-deleted images"""
+    from models.image import Image
+
+    await DailyRollup.get_motor_collection().delete_many({})
+    await ShelfAnalysis.get_motor_collection().update_many(
+        {"rolled_up_at": {"$ne": None}},
+        {"$set": {"rolled_up_at": None}}
+    )
+    stores: Dict[str, Optional[str]] = {}
+    replayed = 0
+    async for analysis in ShelfAnalysis.find(ShelfAnalysis.image_id != None).batch_size(batch_size):
+        if analysis.image_id not in stores:
+            image = await Image.get(PydanticObjectId(analysis.image_id))
+            stores[analysis.image_id] = image.store_id if image else None
+        store_id = stores[analysis.image_id]
+        if store_id is None:
+            continue
+        await record_analysis(store_id, analysis)
+        replayed += 1
+    return replayed
+
+
+async def _main(args) -> None:
+    import motor.motor_asyncio
+    from beanie import init_beanie
+
+    from config import settings
+    from migrate import DOCUMENT_MODELS
+
+    client = motor.motor_asyncio.AsyncIOMotorClient(settings.MONGODB_URL)
+    await init_beanie(database=client[settings.DATABASE_NAME], document_models=DOCUMENT_MODELS)
+    if args.rebuild:
+        print(f"Replayed {await rebuild()} analyses into daily rollups")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rebuild", action="store_true", help="drop and recompute all rollups")
+    asyncio.run(_main(parser.parse_args()))
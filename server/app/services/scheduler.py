@@ -0,0 +1,215 @@
+"""
+Tenant-fair, priority-aware admission in front of the analysis pipeline.
+
+Every analysis waits for a slot here before it touches the inference pool.
+Work is queued in one lane per tenant (store_id + user_id), so a
+merchandiser bulk-uploading a whole store only competes with their own
+photos. When a slot frees up:
+
+- interactive requests (the Streamlit client) are served before bulk jobs,
+  and bulk work never holds the last `interactive_reserve` slots;
+- a tenant never has more than `tenant_max_concurrency` analyses running,
+  except interactive requests that name no tenant: those cannot be told
+  apart, so they share one lane without the per-tenant cap;
+- among eligible lanes the one with the lowest stride pass is served, and
+  each grant advances its pass by 1 / weight (weighted fair sharing).
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from config import settings
+from services.pool import summarize_latencies
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITIES = (INTERACTIVE, BULK)  # served in this order
+ANONYMOUS = "-"  # lane key part for callers without store_id / user_id
+
+
+class Lane:
+    def __init__(self, store_id: str, user_id: str, weight: float, history: int):
+        self.store_id = store_id
+        self.user_id = user_id
+        self.weight = weight
+        self.pass_value = 0.0
+        self.running = 0
+        self.granted = 0
+        self.waiting: Dict[str, Deque[Tuple[asyncio.Future, float]]] = {p: deque() for p in PRIORITIES}
+        self.queue_times: Dict[str, Deque[float]] = {p: deque(maxlen=history) for p in PRIORITIES}
+
+    @property
+    def anonymous(self) -> bool:
+        return self.store_id == ANONYMOUS and self.user_id == ANONYMOUS
+
+    @property
+    def idle(self) -> bool:
+        return self.running == 0 and not any(self.waiting.values())
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """"store_a=2,store_b=0.5" -> {"store_a": 2.0, "store_b": 0.5}"""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        store_id, _, weight = item.partition("=")
+        weights[store_id.strip()] = max(0.01, float(weight))
+    return weights
+
+
+class FairScheduler:
+    def __init__(
+        self,
+        capacity: int,
+        tenant_max_concurrency: int,
+        interactive_reserve: int = 0,
+        store_weights: Optional[Dict[str, float]] = None,
+        interactive_target_ms: float = 1000,
+        history: int = 256,
+        max_lanes: int = 1024
+    ):
+        self.capacity = max(1, capacity)
+        self.tenant_max_concurrency = max(1, tenant_max_concurrency)
+        self.interactive_reserve = min(max(0, interactive_reserve), self.capacity - 1)
+        self.store_weights = store_weights or {}
+        self.interactive_target = interactive_target_ms / 1000.0
+        self.history = history
+        self.max_lanes = max_lanes
+
+        self.lanes: "OrderedDict[Tuple[str, str], Lane]" = OrderedDict()
+        self.running: Dict[str, int] = {p: 0 for p in PRIORITIES}
+        self.virtual_time = 0.0
+        self.queue_times: Dict[str, Deque[float]] = {p: deque(maxlen=history) for p in PRIORITIES}
+
+    def _lane(self, store_id: str, user_id: str) -> Lane:
+        key = (store_id, user_id)
+        lane = self.lanes.get(key)
+        if lane is None:
+            lane = Lane(store_id, user_id, self.store_weights.get(store_id, 1.0), self.history)
+            self.lanes[key] = lane
+            self._prune()
+        self.lanes.move_to_end(key)
+        return lane
+
+    def _prune(self) -> None:
+        # Forget the least recently used idle lanes once there are too many tenants
+        for key in list(self.lanes):
+            if len(self.lanes) <= self.max_lanes:
+                break
+            if self.lanes[key].idle:
+                del self.lanes[key]
+
+    @asynccontextmanager
+    async def slot(self, store_id: Optional[str], user_id: Optional[str], priority: str = INTERACTIVE):
+        """Hold one analysis slot for the duration of the block"""
+        lane = await self.acquire(store_id, user_id, priority)
+        try:
+            yield
+        finally:
+            self.release(lane, priority)
+
+    async def acquire(self, store_id: Optional[str], user_id: Optional[str], priority: str = INTERACTIVE) -> Lane:
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        lane = self._lane(store_id or ANONYMOUS, user_id or ANONYMOUS)
+        if lane.idle:
+            # A lane that was idle must not bank credit and then starve the others
+            lane.pass_value = max(lane.pass_value, self.virtual_time)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, time.monotonic())
+        lane.waiting[priority].append(entry)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the caller went away; hand the slot on
+                self.release(lane, priority)
+            else:
+                try:
+                    lane.waiting[priority].remove(entry)
+                except ValueError:
+                    pass
+            raise
+        return lane
+
+    def release(self, lane: Lane, priority: str) -> None:
+        lane.running -= 1
+        self.running[priority] -= 1
+        self._dispatch()
+
+    def _pick(self) -> Tuple[Optional[Lane], Optional[str]]:
+        for priority in PRIORITIES:
+            if priority == BULK and self.running[BULK] >= self.capacity - self.interactive_reserve:
+                break
+            best = None
+            for lane in self.lanes.values():
+                if not lane.waiting[priority]:
+                    continue
+                uncapped = priority == INTERACTIVE and lane.anonymous
+                if not uncapped and lane.running >= self.tenant_max_concurrency:
+                    continue
+                if best is None or lane.pass_value < best.pass_value:
+                    best = lane
+            if best is not None:
+                return best, priority
+        return None, None
+
+    def _dispatch(self) -> None:
+        while sum(self.running.values()) < self.capacity:
+            lane, priority = self._pick()
+            if lane is None:
+                return
+            future, enqueued_at = lane.waiting[priority].popleft()
+            if future.done():
+                continue  # caller was cancelled while queued
+
+            lane.running += 1
+            lane.granted += 1
+            self.running[priority] += 1
+            self.virtual_time = lane.pass_value
+            lane.pass_value += 1.0 / lane.weight
+
+            waited = time.monotonic() - enqueued_at
+            lane.queue_times[priority].append(waited)
+            self.queue_times[priority].append(waited)
+            future.set_result(None)
+
+    def _target_rate(self, samples) -> Optional[float]:
+        if not samples:
+            return None
+        return round(sum(1 for s in samples if s <= self.interactive_target) / len(samples), 3)
+
+    def stats(self) -> Dict[str, Any]:
+        lanes = {}
+        for lane in self.lanes.values():
+            lanes[f"{lane.store_id}/{lane.user_id}"] = {
+                "weight": lane.weight,
+                "running": lane.running,
+                "waiting": {p: len(lane.waiting[p]) for p in PRIORITIES},
+                "granted": lane.granted,
+                "queue_ms": {p: summarize_latencies(lane.queue_times[p]) for p in PRIORITIES},
+                "interactive_within_target": self._target_rate(lane.queue_times[INTERACTIVE])
+            }
+        return {
+            "capacity": self.capacity,
+            "tenant_max_concurrency": self.tenant_max_concurrency,
+            "interactive_reserve": self.interactive_reserve,
+            "interactive_target_ms": round(self.interactive_target * 1000, 2),
+            "running": dict(self.running),
+            "waiting": {p: sum(len(lane.waiting[p]) for lane in self.lanes.values()) for p in PRIORITIES},
+            "queue_ms": {p: summarize_latencies(self.queue_times[p]) for p in PRIORITIES},
+            "interactive_within_target": self._target_rate(self.queue_times[INTERACTIVE]),
+            "lanes": lanes
+        }
+
+
+scheduler = FairScheduler(
+    capacity=settings.SCHEDULER_CONCURRENCY,
+    tenant_max_concurrency=settings.TENANT_MAX_CONCURRENCY,
+    interactive_reserve=settings.SCHEDULER_INTERACTIVE_RESERVE,
+    store_weights=parse_weights(settings.SCHEDULER_STORE_WEIGHTS),
+    interactive_target_ms=settings.SCHEDULER_INTERACTIVE_TARGET_MS
+)
@@ -0,0 +1,272 @@
+"""
+Content-addressed blob storage for uploaded and generated images.
+
+Uploads are streamed in chunks and hashed while they are written, so the
+request body is never held in memory. Blobs are keyed by their SHA-256,
+which makes identical uploads share one stored object. Pick a backend with
+BLOB_BACKEND: "local" (files under UPLOAD_DIR), "s3" (any S3-compatible
+store) or "memory" (stand-in for tests).
+"""
+import hashlib
+import io
+import os
+import tempfile
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from config import settings
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class StoredBlob:
+    key: str
+    url: str
+    sha256: str
+    size: int
+    deduplicated: bool  # True when identical content was already stored
+
+
+def blob_key(sha256: str) -> str:
+    # Two levels of fan-out keep directories small on the local backend
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+class BlobStore(ABC):
+    name = "base"
+
+    @abstractmethod
+    async def put_stream(self, file: UploadFile) -> StoredBlob:
+        """Stream an upload into the store in CHUNK_SIZE pieces"""
+
+    @abstractmethod
+    async def put_bytes(self, contents: bytes) -> StoredBlob:
+        """Store bytes that are already in memory (e.g. a generated panorama)"""
+
+    @abstractmethod
+    async def get_bytes(self, key: str) -> bytes:
+        """Raises KeyError if the blob does not exist"""
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Whether a blob is stored under `key`"""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Remove a blob; missing blobs are ignored"""
+
+
+class LocalBlobStore(BlobStore):
+    name = "local"
+
+    def __init__(self, root: str, url_prefix: str = "uploads"):
+        self.root = root
+        self.url_prefix = url_prefix
+        os.makedirs(os.path.join(self.root, ".tmp"), exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def _commit(self, tmp_path: str, sha256: str, size: int) -> StoredBlob:
+        key = blob_key(sha256)
+        final_path = self.path(key)
+        deduplicated = os.path.exists(final_path)
+        if deduplicated:
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+        return StoredBlob(key, f"{self.url_prefix}/{key}", sha256, size, deduplicated)
+
+    async def put_stream(self, file: UploadFile) -> StoredBlob:
+        tmp_path = os.path.join(self.root, ".tmp", uuid.uuid4().hex)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as out:
+                while True:
+                    chunk = await file.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    size += len(chunk)
+                    await run_in_threadpool(out.write, chunk)
+            return await run_in_threadpool(self._commit, tmp_path, digest.hexdigest(), size)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _write(self, contents: bytes) -> StoredBlob:
+        tmp_path = os.path.join(self.root, ".tmp", uuid.uuid4().hex)
+        with open(tmp_path, "wb") as out:
+            out.write(contents)
+        return self._commit(tmp_path, hashlib.sha256(contents).hexdigest(), len(contents))
+
+    async def put_bytes(self, contents: bytes) -> StoredBlob:
+        return await run_in_threadpool(self._write, contents)
+
+    def _read(self, key: str) -> bytes:
+        try:
+            with open(self.path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    async def get_bytes(self, key: str) -> bytes:
+        return await run_in_threadpool(self._read, key)
+
+    def _remove(self, key: str) -> None:
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    async def exists(self, key: str) -> bool:
+        return await run_in_threadpool(os.path.exists, self.path(key))
+
+    async def delete(self, key: str) -> None:
+        await run_in_threadpool(self._remove, key)
+
+
+class S3BlobStore(BlobStore):
+    """
+    S3 or any S3-compatible store (MinIO, R2, ...). Uploads are spooled to a
+    temporary file while hashing, since the key depends on the content.
+    """
+    name = "s3"
+
+    def __init__(self, bucket: str, prefix: str = "", region_name: Optional[str] = None,
+                 endpoint_url: Optional[str] = None):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.region_name = region_name
+        self.endpoint_url = endpoint_url
+        self._client = None
+
+    def get_client(self):
+        if self._client is None:
+            import boto3
+            self._client = boto3.client("s3", region_name=self.region_name, endpoint_url=self.endpoint_url)
+        return self._client
+
+    def object_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def _exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.get_client().head_object(Bucket=self.bucket, Key=self.object_key(key))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def _upload(self, fileobj, sha256: str, size: int) -> StoredBlob:
+        key = blob_key(sha256)
+        deduplicated = self._exists(key)
+        if not deduplicated:
+            fileobj.seek(0)
+            self.get_client().upload_fileobj(fileobj, self.bucket, self.object_key(key))
+        return StoredBlob(key, f"s3://{self.bucket}/{self.object_key(key)}", sha256, size, deduplicated)
+
+    async def put_stream(self, file: UploadFile) -> StoredBlob:
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE * 8) as spool:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                await run_in_threadpool(spool.write, chunk)
+            return await run_in_threadpool(self._upload, spool, digest.hexdigest(), size)
+
+    async def put_bytes(self, contents: bytes) -> StoredBlob:
+        return await run_in_threadpool(
+            self._upload, io.BytesIO(contents), hashlib.sha256(contents).hexdigest(), len(contents)
+        )
+
+    def _read(self, key: str) -> bytes:
+        from botocore.exceptions import ClientError
+        try:
+            response = self.get_client().get_object(Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                raise KeyError(key)
+            raise
+        return response["Body"].read()
+
+    async def get_bytes(self, key: str) -> bytes:
+        return await run_in_threadpool(self._read, key)
+
+    async def exists(self, key: str) -> bool:
+        return await run_in_threadpool(self._exists, key)
+
+    async def delete(self, key: str) -> None:
+        await run_in_threadpool(self.get_client().delete_object, Bucket=self.bucket, Key=self.object_key(key))
+
+
+class MemoryBlobStore(BlobStore):
+    """In-process stand-in for tests"""
+    name = "memory"
+
+    def __init__(self):
+        self.blobs: Dict[str, bytes] = {}
+
+    async def put_stream(self, file: UploadFile) -> StoredBlob:
+        digest = hashlib.sha256()
+        chunks = []
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            chunks.append(chunk)
+        return await self.put_bytes(b"".join(chunks))
+
+    async def put_bytes(self, contents: bytes) -> StoredBlob:
+        sha256 = hashlib.sha256(contents).hexdigest()
+        key = blob_key(sha256)
+        deduplicated = key in self.blobs
+        self.blobs.setdefault(key, contents)
+        return StoredBlob(key, f"memory://{key}", sha256, len(contents), deduplicated)
+
+    async def get_bytes(self, key: str) -> bytes:
+        return self.blobs[key]
+
+    async def exists(self, key: str) -> bool:
+        return key in self.blobs
+
+    async def delete(self, key: str) -> None:
+        self.blobs.pop(key, None)
+
+
+_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    global _store
+    if _store is None:
+        name = settings.BLOB_BACKEND
+        if name == "local":
+            _store = LocalBlobStore(settings.UPLOAD_DIR)
+        elif name == "s3":
+            _store = S3BlobStore(
+                settings.S3_BUCKET,
+                prefix=settings.S3_PREFIX,
+                region_name=settings.AWS_REGION,
+                endpoint_url=settings.S3_ENDPOINT_URL
+            )
+        elif name == "memory":
+            _store = MemoryBlobStore()
+        else:
+            raise ValueError(f"Unknown BLOB_BACKEND: {name}")
+    return _store
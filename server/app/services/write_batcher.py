@@ -0,0 +1,129 @@
+"""
+Write-behind batching of document inserts.
+
+Inserts that arrive within `window_ms` of each other (up to
+`max_batch_size`) are written with one unordered insert_many, and each
+caller resumes once the batch is acknowledged. Ids are assigned before
+the write, so a document that fails (e.g. a duplicate key) fails only its
+own caller while the rest of the batch is stored. Write tasks are kept
+referenced until they finish (the event loop holds tasks only weakly), and
+stop() writes the open batch and waits for every write in flight.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Set, Tuple, Type
+
+from beanie import Document, PydanticObjectId
+from pymongo.errors import BulkWriteError
+
+from config import settings
+from models.image import Image
+from services.pool import summarize_latencies
+
+
+class InsertFailed(Exception):
+    """One document of a batch was rejected by the server"""
+
+    def __init__(self, message: str, code: Optional[int] = None):
+        super().__init__(message)
+        self.code = code
+
+
+class InsertBatcher:
+    def __init__(self, model: Type[Document], max_batch_size: int, window_ms: float, history: int = 512):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = max(0.0, window_ms) / 1000.0
+
+        self._open: List[Tuple[Document, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+        self._batches = 0
+        self._documents = 0
+        self._failed = 0
+        self._batch_sizes = deque(maxlen=history)
+        self._ack_times = deque(maxlen=history)
+
+    async def insert(self, document: Document) -> Document:
+        """Insert `document` with the next batch; returns it with its id once acknowledged"""
+        if document.id is None:
+            document.id = PydanticObjectId()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._open.append((document, future, time.monotonic()))
+
+        if len(self._open) >= self.max_batch_size:
+            self._flush()
+        elif len(self._open) == 1:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        await future
+        return document
+
+    async def insert_all(self, documents: List[Document]) -> List[Document]:
+        """Insert several documents, normally in one batch; raises the first failure"""
+        return list(await asyncio.gather(*(self.insert(document) for document in documents)))
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._open = self._open, []
+        if batch:
+            task = asyncio.ensure_future(self._write(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def stop(self) -> None:
+        """Write the open batch and wait for every write in flight"""
+        self._flush()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _write(self, batch) -> None:
+        failures: Dict[int, Exception] = {}
+        try:
+            await self.model.insert_many([document for document, _, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failures[error["index"]] = InsertFailed(error.get("errmsg", "Insert failed"), error.get("code"))
+            # Without write errors the batch itself failed (e.g. write concern); fail everyone
+            if not failures:
+                failures = {i: e for i in range(len(batch))}
+        except Exception as e:
+            failures = {i: e for i in range(len(batch))}
+
+        now = time.monotonic()
+        self._batches += 1
+        self._documents += len(batch)
+        self._failed += len(failures)
+        self._batch_sizes.append(len(batch))
+        for i, (_, future, queued_at) in enumerate(batch):
+            self._ack_times.append(now - queued_at)
+            if future.done():
+                continue
+            if i in failures:
+                future.set_exception(failures[i])
+            else:
+                future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = list(self._batch_sizes)
+        return {
+            "max_batch_size": self.max_batch_size,
+            "window_ms": round(self.window * 1000, 2),
+            "batches": self._batches,
+            "documents": self._documents,
+            "failed": self._failed,
+            "avg_batch_size": round(sum(sizes) / len(sizes), 2) if sizes else 0.0,
+            "ack_ms": summarize_latencies(self._ack_times)
+        }
+
+
+image_writer = InsertBatcher(
+    Image,
+    max_batch_size=settings.IMAGE_WRITE_BATCH_SIZE,
+    window_ms=settings.IMAGE_WRITE_WINDOW_MS
+)
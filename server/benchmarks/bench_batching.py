@@ -0,0 +1,80 @@
+"""
+Throughput / tail-latency benchmark: one image per predict call vs micro-batching.
+
+Fires REQUESTS simulated analyses at a Poisson arrival rate through the same
+worker pool the API uses, once with batching disabled and once per window
+setting, and prints throughput and p50/p99 latency for each run.
+
+    cd server && python benchmarks/bench_batching.py --image shelf.jpg --rate 8 --requests 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from ml.batching import MicroBatcher  # noqa: E402
+from ml.inference import load_model  # noqa: E402
+from services.pool import WorkerPool  # noqa: E402
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def run(batcher: MicroBatcher, contents: bytes, requests: int, rate: float):
+    latencies = []
+
+    async def one():
+        start = time.perf_counter()
+        await batcher.predict(contents)
+        latencies.append(time.perf_counter() - start)
+
+    tasks = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        tasks.append(asyncio.create_task(one()))
+        await asyncio.sleep(random.expovariate(rate))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    return requests / elapsed, latencies
+
+
+async def main(args):
+    with open(args.image, "rb") as f:
+        contents = f.read()
+
+    pool = WorkerPool("bench", max_workers=args.workers, max_queue=args.requests, initializer=load_model)
+    # Warm every worker so model load time stays out of the measurement
+    await asyncio.gather(*(MicroBatcher(pool, 1, 0).predict(contents) for _ in range(args.workers)))
+
+    configs = [(1, 0.0)] + [(args.max_batch, window) for window in args.windows]
+    print(f"{'batch':>5} {'window_ms':>9} {'req/s':>8} {'p50_ms':>8} {'p99_ms':>8} {'avg_batch':>9}")
+    for max_batch, window in configs:
+        random.seed(args.seed)
+        batcher = MicroBatcher(pool, max_batch, window)
+        throughput, latencies = await run(batcher, contents, args.requests, args.rate)
+        print(
+            f"{max_batch:>5} {window:>9.1f} {throughput:>8.2f} "
+            f"{1000 * statistics.median(latencies):>8.1f} {1000 * percentile(latencies, 0.99):>8.1f} "
+            f"{batcher.stats()['avg_batch_size']:>9.2f}"
+        )
+
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", required=True, help="shelf photo to send with every request")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=8.0, help="mean arrivals per second")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--windows", type=float, nargs="+", default=[5.0, 15.0, 30.0])
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,116 @@
+"""
+Query plans and latencies of the image history / store listing queries,
+with and without the indexes declared on the Image model.
+
+Seeds a scratch database with synthetic images (1M by default; 5% soft
+deleted, skewed across users and stores), then runs the get_history and
+get_store_images query shapes before and after building the indexes.
+
+    cd server && python benchmarks/bench_indexes.py --images 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+sys.path.insert(0, APP_DIR)
+
+from config import settings  # noqa: E402
+from migrate import plan_summary  # noqa: E402
+from models.image import Image  # noqa: E402
+
+
+def seed(collection, count, users, stores, batch=10_000):
+    collection.drop()
+    now = datetime.utcnow()
+    rng = random.Random(42)
+    started = time.perf_counter()
+    for offset in range(0, count, batch):
+        docs = []
+        for _ in range(min(batch, count - offset)):
+            # Pareto-ish skew: a few busy merchandisers and stores hold most images
+            user = int(rng.paretovariate(1.2)) % users
+            store = int(rng.paretovariate(1.2)) % stores
+            docs.append({
+                "user_id": f"user-{user}",
+                "store_id": f"store-{store}",
+                "image_url": f"uploads/{offset}.jpg",
+                "latitude": 22.7196,
+                "longitude": 75.8577,
+                "upload_time": now - timedelta(seconds=rng.randrange(365 * 24 * 3600)),
+                "is_deleted": rng.random() < 0.05,
+                "source_blob_keys": []
+            })
+        collection.insert_many(docs, ordered=False)
+    print(f"Seeded {count} images in {time.perf_counter() - started:.1f}s")
+
+
+def run_queries(collection, field, values, limit, repeat):
+    latencies = []
+    for _ in range(repeat):
+        for value in values:
+            started = time.perf_counter()
+            list(collection.find({field: value, "is_deleted": False}).sort([("upload_time", -1), ("_id", -1)]).limit(limit))
+            latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    explain = collection.find({field: values[0], "is_deleted": False}).sort([("upload_time", -1), ("_id", -1)]).limit(limit).explain()
+    summary = plan_summary(explain)
+    summary["p50_ms"] = 1000 * statistics.median(latencies)
+    summary["p95_ms"] = 1000 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return summary
+
+
+def report(label, field, summary):
+    print(
+        f"{label:<10} {field:<9} {summary['plan']:<28} {str(summary['index']):<26} "
+        f"{summary['keys_examined']:>9} {summary['docs_examined']:>9} {summary['p50_ms']:>8.2f} {summary['p95_ms']:>8.2f}"
+    )
+
+
+def main(args):
+    if args.database == settings.DATABASE_NAME:
+        raise SystemExit("Refusing to seed the application database; pick another --database")
+    client = MongoClient(settings.MONGODB_URL)
+    collection = client[args.database]["images"]
+    if args.reseed or collection.estimated_document_count() != args.images:
+        seed(collection, args.images, args.users, args.stores)
+
+    # Busiest user/store is the worst case for a scan-and-sort plan
+    samples = {
+        "user_id": [f"user-{i}" for i in range(args.samples)],
+        "store_id": [f"store-{i}" for i in range(args.samples)]
+    }
+
+    print(f"{'indexes':<10} {'query':<9} {'plan':<28} {'index':<26} {'keys':>9} {'docs':>9} {'p50_ms':>8} {'p95_ms':>8}")
+    collection.drop_indexes()
+    for field, values in samples.items():
+        report("none", field, run_queries(collection, field, values, args.limit, args.repeat))
+
+    started = time.perf_counter()
+    collection.create_indexes(Image.Settings.indexes)
+    print(f"Built Image indexes in {time.perf_counter() - started:.1f}s")
+    for field, values in samples.items():
+        report("declared", field, run_queries(collection, field, values, args.limit, args.repeat))
+
+    if args.drop:
+        client.drop_database(args.database)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default=f"{settings.DATABASE_NAME}_bench", help="scratch database (never the live one)")
+    parser.add_argument("--images", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--stores", type=int, default=2_000)
+    parser.add_argument("--samples", type=int, default=20, help="distinct users/stores queried")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--reseed", action="store_true")
+    parser.add_argument("--drop", action="store_true", help="drop the scratch database afterwards")
+    main(parser.parse_args())
@@ -0,0 +1,106 @@
+"""
+Micro-benchmark: per-word fuzzywuzzy matching loop vs MatchEngine.
+
+Builds a synthetic 1,000-word OCR result (brand variants, noise words and
+the repetition typical of a dense shelf), times the previous per-word
+implementation against MatchEngine, and reports how often they agree on
+is_match. Needs fuzzywuzzy installed for the baseline.
+
+    cd server && python benchmarks/bench_matching.py --words 1000
+"""
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from fuzzywuzzy import fuzz  # noqa: E402
+
+from ml.matching import MatchEngine  # noqa: E402
+
+BRANDS = ["VI-JOHN", "GILLETTE", "NIVEA", "DETTOL", "COLGATE"]
+
+
+def legacy_clean_text(text):
+    text = re.sub(r'[^\w\s-]', '', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip().upper()
+
+
+def legacy_fuzzy_match_text(search_text, detected_text, threshold=60):
+    """The implementation analyze_sku used before MatchEngine"""
+    search_clean = legacy_clean_text(search_text)
+    detected_clean = legacy_clean_text(detected_text)
+    scores = {
+        'ratio': fuzz.ratio(search_clean, detected_clean),
+        'partial': fuzz.partial_ratio(search_clean, detected_clean),
+        'token_sort': fuzz.token_sort_ratio(search_clean, detected_clean),
+        'token_set': fuzz.token_set_ratio(search_clean, detected_clean)
+    }
+    best_method = max(scores, key=scores.get)
+    best_score = scores[best_method]
+    return best_score >= threshold, best_score, best_method
+
+
+def legacy_match(search_texts, words, threshold=60):
+    matches = []
+    for search_text in search_texts:
+        row = []
+        for text in words:
+            is_match, _, _ = legacy_fuzzy_match_text(search_text, text, threshold)
+            if not is_match and search_text.upper() in text.upper():
+                is_match = True
+            row.append(is_match)
+        matches.append(row)
+    return matches
+
+
+def synthetic_words(count, seed):
+    rng = random.Random(seed)
+    vocabulary = []
+    for brand in BRANDS:
+        vocabulary += [brand, brand.lower(), brand.replace("-", ""), brand[:-1], brand + "."]
+    vocabulary += ["".join(rng.choices(string.ascii_uppercase, k=rng.randint(2, 9))) for _ in range(150)]
+    vocabulary += ["100ML", "MRP", "RS.", "NEW", "PACK", "OF", "2", "FRESH"]
+    return [rng.choice(vocabulary) for _ in range(count)]
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(args):
+    words = synthetic_words(args.words, args.seed)
+    targets = BRANDS[:args.targets]
+
+    legacy_time, legacy = best_of(lambda: legacy_match(targets, words), args.repeat)
+    engine_time, (is_match, _, _) = best_of(lambda: MatchEngine(targets).match(words), args.repeat)
+
+    agree = sum(
+        legacy[t][w] == bool(is_match[t, w])
+        for t in range(len(targets)) for w in range(len(words))
+    ) / (len(targets) * len(words))
+
+    print(f"{len(words)} words ({len(set(words))} unique) x {len(targets)} target(s)")
+    print(f"legacy per-word loop : {1000 * legacy_time:9.2f} ms")
+    print(f"MatchEngine          : {1000 * engine_time:9.2f} ms")
+    print(f"speedup              : {legacy_time / engine_time:9.1f}x")
+    print(f"is_match agreement   : {100 * agree:9.2f} %")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=1000)
+    parser.add_argument("--targets", type=int, default=1, choices=range(1, len(BRANDS) + 1))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
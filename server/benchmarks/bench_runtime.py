@@ -0,0 +1,123 @@
+"""
+Parity and performance check for the inference runtimes:
+PyTorch FP32 (best.pt), ONNX FP32 (best.onnx) and ONNX INT8 (best.int8.onnx).
+
+Each runtime is measured in a fresh process so peak RSS is not polluted by
+the others; a runtime whose process crashes or exceeds --timeout is
+reported as failed. Reports mAP50 / mAP50-95 on a YOLO dataset yaml and their drift
+from PyTorch FP32, single-image latency on CPU, and peak RSS.
+
+    cd server && python benchmarks/bench_runtime.py --data shelves.yaml --images samples/
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import time
+from queue import Empty
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+sys.path.insert(0, APP_DIR)
+
+from ml.inference import MODEL_FILES, decode_image, models_dir  # noqa: E402
+
+
+def measure(backend, args, queue):
+    from ultralytics import YOLO
+
+    path = os.path.join(models_dir, MODEL_FILES[backend])
+    model = YOLO(path, task="detect")
+
+    metrics = model.val(data=args.data, imgsz=args.imgsz, batch=1, device="cpu", verbose=False, plots=False)
+
+    images = []
+    for pattern in ("*.jpg", "*.jpeg", "*.png"):
+        images += glob.glob(os.path.join(args.images, pattern))
+    images = [decode_image(open(p, "rb").read()) for p in sorted(images)[:args.limit]]
+
+    for image in images[:3]:  # warm-up
+        model.predict(image, imgsz=args.imgsz, conf=0.2, iou=0.3, verbose=False)
+    latencies = []
+    for _ in range(args.repeat):
+        for image in images:
+            start = time.perf_counter()
+            model.predict(image, imgsz=args.imgsz, conf=0.2, iou=0.3, verbose=False)
+            latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    queue.put({
+        "backend": backend,
+        "map50": float(metrics.box.map50),
+        "map": float(metrics.box.map),
+        "p50_ms": 1000 * statistics.median(latencies),
+        "p95_ms": 1000 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    })
+
+
+def collect(backend, process, queue, timeout):
+    """The child's result row, or a failed row if it dies or runs out of time without one"""
+    deadline = time.monotonic() + timeout
+    row = None
+    while row is None and process.is_alive() and time.monotonic() < deadline:
+        try:
+            row = queue.get(timeout=5)
+        except Empty:
+            pass
+    if row is None:
+        try:
+            row = queue.get(timeout=1)  # put just before the process exited
+        except Empty:
+            pass
+    timed_out = row is None and process.is_alive()
+    if timed_out:
+        process.terminate()
+    process.join()
+    if row is not None:
+        return row
+    if timed_out:
+        return {"backend": backend, "error": f"timed out after {timeout:.0f}s"}
+    return {"backend": backend, "error": f"process exited with code {process.exitcode}"}
+
+
+def main(args):
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    for backend in args.backends:
+        if not os.path.exists(os.path.join(models_dir, MODEL_FILES[backend])):
+            print(f"skipping {backend}: {MODEL_FILES[backend]} not found (run python -m ml.export)")
+            continue
+        queue = context.Queue()
+        process = context.Process(target=measure, args=(backend, args, queue))
+        process.start()
+        rows.append(collect(backend, process, queue, args.timeout))
+
+    measured = [row for row in rows if "error" not in row]
+    if not rows:
+        return
+    baseline = next((row for row in measured if row["backend"] == "pytorch"), measured[0] if measured else None)
+    print(f"{'backend':<10} {'mAP50':>7} {'mAP50-95':>9} {'drift':>7} {'p50_ms':>8} {'p95_ms':>8} {'rss_mb':>8}")
+    for row in rows:
+        if "error" in row:
+            print(f"{row['backend']:<10} failed: {row['error']}")
+            continue
+        drift = row["map"] - baseline["map"]
+        print(
+            f"{row['backend']:<10} {row['map50']:>7.4f} {row['map']:>9.4f} {drift:>+7.4f} "
+            f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['rss_mb']:>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", required=True, help="YOLO dataset yaml with a labelled val split")
+    parser.add_argument("--images", required=True, help="folder of shelf photos for latency runs")
+    parser.add_argument("--backends", nargs="+", default=list(MODEL_FILES), choices=list(MODEL_FILES))
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=3600, help="seconds allowed per runtime")
+    main(parser.parse_args())